@@ -0,0 +1,582 @@
+#!/usr/bin/env python3
+"""Report query and Notion sync benchmarks.
+
+weekly/daily run the per-query report path and the consolidated query side
+by side against the configured database, counting round trips and wall
+time, and check that both return the same figures.
+
+notion fetches and parses every completed page the way a dry-run sync
+does and reports pages per second. Point NOTION_BASE at notion_stub.py to
+run it locally.
+
+seed loads a local scratch database with synthetic history (N children,
+M subjects each, years of Study/Workout/Rest/Routine sessions). profile
+then times every query_* function and every generate_* call for all
+those children, records EXPLAIN (ANALYZE, BUFFERS) plans, and can save
+the results as a baseline or compare against one to flag regressions.
+
+Usage:
+    python benchmark.py weekly [--week-ending YYYY-MM-DD] [--repeat N] [--format text|json]
+    python benchmark.py daily [--date YYYY-MM-DD] [--repeat N] [--format text|json]
+    python benchmark.py all                      # weekly + daily
+    NOTION_BASE=http://127.0.0.1:8765/v1 NOTION_API_KEY=stub python benchmark.py notion [--workers N]
+
+    DB_HOST=localhost DB_NAME=bench python benchmark.py seed --children 20 --subjects 8 --years 3 --reset
+    DB_HOST=localhost DB_NAME=bench python benchmark.py profile --children 20 --save baseline.json
+    DB_HOST=localhost DB_NAME=bench python benchmark.py profile --children 20 --baseline baseline.json
+"""
+
+import argparse
+import io
+import json
+import random
+import statistics
+import sys
+import time
+import uuid
+from datetime import date, timedelta
+
+import psycopg2
+import psycopg2.extensions
+
+import notion_client
+import notion_sync
+import registry
+from config import CHILDREN, DB_CONFIG
+import daily_report
+import weekly_report
+from db import connect_kwargs
+from rollup import ensure_rollup_table, rebuild_rollup
+
+# Hosts `seed` is allowed to write to
+LOCAL_HOSTS = {"localhost", "127.0.0.1", "::1", "postgres", "db"}
+
+
+class CountingCursor(psycopg2.extensions.cursor):
+    """Cursor that counts every statement sent to the server.
+
+    While connection.plans is a list, each statement is first run under
+    EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) and its plan appended there.
+    """
+
+    def execute(self, query, vars=None):
+        if self.connection.plans is not None:
+            super().execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + query, vars)
+            self.connection.plans.append(self.fetchone()[0][0])
+        self.connection.round_trips += 1
+        return super().execute(query, vars)
+
+
+class CountingConnection(psycopg2.extensions.connection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.round_trips = 0
+        self.plans = None
+        self.cursor_factory = CountingCursor
+
+
+def measure(label, conn, fn, repeat):
+    """Run fn() `repeat` times; return round trips per run and wall times."""
+    timings = []
+    trips = 0
+    result = None
+    for _ in range(repeat):
+        conn.round_trips = 0
+        start = time.perf_counter()
+        result = fn()
+        timings.append((time.perf_counter() - start) * 1000)
+        trips = conn.round_trips
+    return {
+        "label": label,
+        "round_trips": trips,
+        "best_ms": round(min(timings), 2),
+        "median_ms": round(statistics.median(timings), 2),
+    }, result
+
+
+# ---------------------------------------------------------------------------
+# Weekly
+# ---------------------------------------------------------------------------
+
+def weekly_per_query(conn, child_ids, week_end):
+    """The original nine-queries-per-child path."""
+    figures = {}
+    for child_id in child_ids:
+        figures[child_id] = {
+            "week_cats": weekly_report.query_week_categories(conn, child_id, week_end),
+            "week_subjects": weekly_report.query_week_subjects(conn, child_id, week_end),
+            "week_workouts": weekly_report.query_week_workouts(conn, child_id, week_end),
+            "daily_breakdown": weekly_report.query_daily_breakdown(conn, child_id, week_end),
+            "days_active": weekly_report.query_days_active(conn, child_id, week_end),
+            "avg_cats": weekly_report.query_4week_avg_categories(conn, child_id, week_end),
+            "avg_subjects": weekly_report.query_4week_avg_subjects(conn, child_id, week_end),
+            "avg_workouts": weekly_report.query_4week_avg_workouts(conn, child_id, week_end),
+            "avg_days_active": weekly_report.query_4week_avg_days_active(conn, child_id, week_end),
+        }
+    return figures
+
+
+def _normalise(figures):
+    """Make figures comparable regardless of tie order in ranked lists."""
+    out = {}
+    for child_id, f in figures.items():
+        f = dict(f)
+        for key, value in f.items():
+            if isinstance(value, list):
+                f[key] = sorted(value, key=lambda item: json.dumps(item, sort_keys=True, default=str))
+        out[child_id] = f
+    return out
+
+
+def bench_weekly(conn, week_end, repeat):
+    child_ids = list(registry.load(conn).children)
+    legacy, legacy_figures = measure(
+        "weekly per-query", conn,
+        lambda: weekly_per_query(conn, child_ids, week_end), repeat)
+    single, single_figures = measure(
+        "weekly consolidated", conn,
+        lambda: weekly_report.query_week_figures(conn, child_ids, week_end), repeat)
+    return {
+        "children": len(child_ids),
+        "runs": [legacy, single],
+        "matches": _normalise(legacy_figures) == _normalise(single_figures),
+    }
+
+
+# ---------------------------------------------------------------------------
+# Daily
+# ---------------------------------------------------------------------------
+
+def daily_per_query(conn, child_ids, report_date):
+    """The original seven-queries-per-child path."""
+    figures = {}
+    for child_id in child_ids:
+        figures[child_id] = {
+            "today_cats": daily_report.query_today_categories(conn, child_id, report_date),
+            "today_subjects": daily_report.query_today_subjects(conn, child_id, report_date),
+            "today_workouts": daily_report.query_today_workouts(conn, child_id, report_date),
+            "avg_cats": daily_report.query_avg_categories(conn, child_id, report_date),
+            "avg_subjects": daily_report.query_avg_subjects(conn, child_id, report_date),
+            "avg_workouts": daily_report.query_avg_workouts(conn, child_id, report_date),
+            "history_days": daily_report.count_history_days(conn, child_id, report_date),
+        }
+    return figures
+
+
+def bench_daily(conn, report_date, repeat):
+    child_ids = list(registry.load(conn).children)
+    legacy, legacy_figures = measure(
+        "daily per-query", conn,
+        lambda: daily_per_query(conn, child_ids, report_date), repeat)
+    batched, batched_figures = measure(
+        "daily batched", conn,
+        lambda: daily_report.query_daily_figures(conn, child_ids, report_date), repeat)
+    return {
+        "children": len(child_ids),
+        "runs": [legacy, batched],
+        "matches": _normalise(legacy_figures) == _normalise(batched_figures),
+    }
+
+
+# ---------------------------------------------------------------------------
+# Notion sync
+# ---------------------------------------------------------------------------
+
+def bench_notion(workers):
+    """Fetch and parse every completed page, as notion_sync --all --dry-run does."""
+    reg = registry.load_or_config()
+
+    def fetch_and_parse(child_db):
+        child_id, db_id = child_db
+        pages = parsed = 0
+        for entry in notion_sync.query_completed_entries(db_id):
+            pages += 1
+            record, _ = notion_sync.parse_entry(entry, child_id, reg)
+            if record:
+                parsed += 1
+        return pages, parsed
+
+    notion_client.reset_stats()
+    start = time.perf_counter()
+    counts = notion_client.map_concurrently(
+        fetch_and_parse, [(child_id, (child_id, db_id))
+                          for child_id, db_id in reg.notion_db_ids.items()], workers)
+    pages = sum(p for p, _ in counts.values())
+    parsed = sum(p for _, p in counts.values())
+    elapsed = time.perf_counter() - start
+    return {
+        "base": notion_client.NOTION_BASE,
+        "pages": pages,
+        "parsed": parsed,
+        "seconds": round(elapsed, 3),
+        "pages_per_second": round(pages / elapsed, 1) if elapsed else None,
+        "notion": notion_client.stats(),
+    }
+
+
+# ---------------------------------------------------------------------------
+# Synthetic data
+# ---------------------------------------------------------------------------
+
+SYNTHETIC_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS subjects (
+        subject_id    serial  PRIMARY KEY,
+        child_id      integer NOT NULL,
+        subject_name  text    NOT NULL,
+        is_academic   boolean NOT NULL DEFAULT true
+    );
+    CREATE TABLE IF NOT EXISTS workout_types (
+        workout_id    serial  PRIMARY KEY,
+        child_id      integer,
+        workout_name  text    NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS activity_logs (
+        log_id            serial  PRIMARY KEY,
+        child_id          integer NOT NULL,
+        category          text    NOT NULL,
+        subject_id        integer REFERENCES subjects,
+        workout_id        integer REFERENCES workout_types,
+        activity_date     date    NOT NULL,
+        actual_minutes    integer NOT NULL,
+        deviation_reason  text,
+        notion_page_id    text    UNIQUE,
+        UNIQUE (notion_page_id, activity_date)
+    );
+    CREATE TABLE IF NOT EXISTS weekly_goals (
+        child_id              integer NOT NULL,
+        week_start_date       date    NOT NULL,
+        target_study_hours    numeric,
+        target_workout_count  integer,
+        PRIMARY KEY (child_id, week_start_date)
+    );
+"""
+
+
+def synthetic_sessions(rng, child_id, subject_ids, workout_ids, day):
+    """One day of sessions for a child: a few study blocks, maybe a workout,
+    meals/breaks as Rest and some Routine. About one day in twelve is empty."""
+    if rng.random() < 0.08:
+        return
+    weights = [1 / (rank + 1) for rank in range(len(subject_ids))]
+    for subject_id in rng.choices(subject_ids, weights, k=rng.randint(2, 5)):
+        yield child_id, "Study", subject_id, None, day, rng.randint(20, 120)
+    if workout_ids and rng.random() < 0.7:
+        yield child_id, "Workout", None, rng.choice(workout_ids), day, rng.randint(20, 60)
+    for _ in range(rng.randint(1, 2)):
+        yield child_id, "Rest", None, None, day, rng.randint(15, 60)
+    if rng.random() < 0.5:
+        yield child_id, "Routine", None, None, day, rng.randint(10, 30)
+
+
+def seed_synthetic(conn, children, subjects_per_child, years, end_date, seed):
+    """Fill the scratch database with synthetic history. Returns rows loaded."""
+    rng = random.Random(seed)
+    start_date = end_date - timedelta(days=int(years * 365))
+
+    with conn.cursor() as cur:
+        cur.execute(SYNTHETIC_SCHEMA)
+        ensure_rollup_table(conn)
+        cur.execute("""
+            TRUNCATE activity_logs, daily_rollup, weekly_goals, subjects, workout_types
+            RESTART IDENTITY CASCADE
+        """)
+
+        buf = io.StringIO()
+        rows = 0
+        for child_id in range(1, children + 1):
+            subject_ids = []
+            for k in range(subjects_per_child):
+                cur.execute("""
+                    INSERT INTO subjects (child_id, subject_name, is_academic)
+                    VALUES (%s, %s, %s) RETURNING subject_id
+                """, (child_id, f"Subject {k + 1}", k % 4 != 3))
+                subject_ids.append(cur.fetchone()[0])
+            workout_ids = []
+            for name in ("Jogging", "Tennis")[:rng.randint(1, 2)]:
+                cur.execute("""
+                    INSERT INTO workout_types (child_id, workout_name)
+                    VALUES (%s, %s) RETURNING workout_id
+                """, (child_id, name))
+                workout_ids.append(cur.fetchone()[0])
+
+            day = start_date
+            while day <= end_date:
+                for row in synthetic_sessions(rng, child_id, subject_ids, workout_ids, day):
+                    page_id = uuid.UUID(int=rng.getrandbits(128), version=4)
+                    buf.write("\t".join("\\N" if v is None else str(v) for v in row))
+                    buf.write(f"\t{page_id}\n")
+                    rows += 1
+                day += timedelta(days=1)
+
+        buf.seek(0)
+        cur.copy_from(buf, "activity_logs", null="\\N", columns=(
+            "child_id", "category", "subject_id", "workout_id",
+            "activity_date", "actual_minutes", "notion_page_id"))
+    rebuild_rollup(conn)
+    conn.commit()
+
+    old_isolation = conn.isolation_level
+    conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+    with conn.cursor() as cur:
+        cur.execute("ANALYZE")
+    conn.set_isolation_level(old_isolation)
+    return rows
+
+
+# ---------------------------------------------------------------------------
+# Profile
+# ---------------------------------------------------------------------------
+
+DAILY_QUERIES = [
+    daily_report.query_today_categories, daily_report.query_today_subjects,
+    daily_report.query_today_workouts, daily_report.query_avg_categories,
+    daily_report.query_avg_subjects, daily_report.query_avg_workouts,
+    daily_report.count_history_days,
+]
+WEEKLY_QUERIES = [
+    weekly_report.query_week_categories, weekly_report.query_week_subjects,
+    weekly_report.query_week_workouts, weekly_report.query_daily_breakdown,
+    weekly_report.query_days_active, weekly_report.query_4week_avg_categories,
+    weekly_report.query_4week_avg_subjects, weekly_report.query_4week_avg_workouts,
+    weekly_report.query_4week_avg_days_active, weekly_report.query_weekly_goals,
+]
+
+
+def plan_summary(plan):
+    """Top-level timing and every scan node of an EXPLAIN (FORMAT JSON) plan."""
+    scans = []
+
+    def walk(node):
+        if "Scan" in node["Node Type"]:
+            target = node.get("Index Name") or node.get("Relation Name") or ""
+            scans.append(f"{node['Node Type']} {target}".strip())
+        for child in node.get("Plans", []):
+            walk(child)
+
+    walk(plan["Plan"])
+    return {
+        "execution_ms": plan.get("Execution Time"),
+        "total_cost": plan["Plan"].get("Total Cost"),
+        "shared_hit_blocks": plan["Plan"].get("Shared Hit Blocks"),
+        "shared_read_blocks": plan["Plan"].get("Shared Read Blocks"),
+        "scans": scans,
+    }
+
+
+def profile_call(conn, label, fn, repeat):
+    """Time fn() and capture the plans of the statements it runs once."""
+    conn.plans = []
+    try:
+        fn()
+        plans = conn.plans
+    finally:
+        conn.plans = None
+    run, _ = measure(label, conn, fn, repeat)
+    run["plans"] = [plan_summary(p) for p in plans]
+    run["explain"] = plans
+    return run
+
+
+def profile_reports(conn, child_ids, report_date, week_end, repeat):
+    """Profile every report query and generator across child_ids."""
+    runs = []
+    for fn in DAILY_QUERIES:
+        runs.append(profile_call(
+            conn, f"daily_report.{fn.__name__}",
+            lambda fn=fn: [fn(conn, cid, report_date) for cid in child_ids], repeat))
+    runs.append(profile_call(
+        conn, "daily_report.query_daily_figures",
+        lambda: daily_report.query_daily_figures(conn, child_ids, report_date), repeat))
+    runs.append(profile_call(
+        conn, "daily_report.generate_daily_report",
+        lambda: [daily_report.generate_daily_report(conn, cid, f"Child {cid}", report_date)
+                 for cid in child_ids], repeat))
+
+    for fn in WEEKLY_QUERIES:
+        runs.append(profile_call(
+            conn, f"weekly_report.{fn.__name__}",
+            lambda fn=fn: [fn(conn, cid, week_end) for cid in child_ids], repeat))
+    runs.append(profile_call(
+        conn, "weekly_report.query_week_figures",
+        lambda: weekly_report.query_week_figures(conn, child_ids, week_end), repeat))
+    runs.append(profile_call(
+        conn, "weekly_report.generate_child_report",
+        lambda: [weekly_report.generate_child_report(conn, cid, f"Child {cid}", week_end)
+                 for cid in child_ids], repeat))
+
+    with conn.cursor() as cur:
+        cur.execute("SELECT COUNT(*) FROM activity_logs")
+        log_rows = cur.fetchone()[0]
+    return {
+        "children": len(child_ids),
+        "activity_logs_rows": log_rows,
+        "report_date": str(report_date),
+        "week_end": str(week_end),
+        "runs": runs,
+    }
+
+
+def compare_to_baseline(result, baseline, tolerance, min_delta_ms=1.0):
+    """Flag runs whose median grew by more than `tolerance` x (and min_delta_ms)."""
+    before = {run["label"]: run for run in baseline["runs"]}
+    rows = []
+    for run in result["runs"]:
+        old = before.get(run["label"])
+        if not old:
+            continue
+        ratio = run["median_ms"] / old["median_ms"] if old["median_ms"] else None
+        regressed = (ratio is not None and ratio > tolerance
+                     and run["median_ms"] - old["median_ms"] > min_delta_ms)
+        rows.append({"label": run["label"], "baseline_ms": old["median_ms"],
+                     "median_ms": run["median_ms"],
+                     "ratio": round(ratio, 2) if ratio else None,
+                     "regressed": regressed,
+                     "plan_changed": ([p["scans"] for p in run["plans"]]
+                                      != [p["scans"] for p in old.get("plans", [])])})
+    return rows
+
+
+# ---------------------------------------------------------------------------
+# Main
+# ---------------------------------------------------------------------------
+
+def print_profile_text(result, comparison=None):
+    print(f"profile: {result['children']} children, {result['activity_logs_rows']} "
+          f"activity_logs rows, report date {result['report_date']}, week ending {result['week_end']}")
+    for run in result["runs"]:
+        scans = ", ".join(sorted({s for p in run["plans"] for s in p["scans"]}))
+        print(f"  {run['label']:<42s} {run['round_trips']:>4d} trips  "
+              f"median {run['median_ms']:>9.2f}ms  {scans}")
+    if comparison:
+        print("vs baseline:")
+        for row in comparison:
+            flag = "REGRESSED" if row["regressed"] else ("plan changed" if row["plan_changed"] else "")
+            print(f"  {row['label']:<42s} {row['baseline_ms']:>9.2f}ms -> "
+                  f"{row['median_ms']:>9.2f}ms  x{row['ratio']}  {flag}")
+
+
+def print_notion_text(result):
+    print(f"notion: {result['pages']} pages ({result['parsed']} parsed) from {result['base']} "
+          f"in {result['seconds']}s = {result['pages_per_second']} pages/s")
+    print(f"  {json.dumps(result['notion'])}")
+
+
+def print_text(name, result):
+    print(f"{name}: {result['children']} children, figures match: {result['matches']}")
+    for run in result["runs"]:
+        print(f"  {run['label']:<24s} {run['round_trips']:>4d} round trips  "
+              f"best {run['best_ms']:>9.2f}ms  median {run['median_ms']:>9.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark report queries")
+    parser.add_argument("suite", choices=["weekly", "daily", "all", "notion", "seed", "profile"],
+                        help="Benchmark to run")
+    parser.add_argument("--week-ending", type=str, default=None,
+                        help="Week ending date for the weekly suite (YYYY-MM-DD). Defaults to today.")
+    parser.add_argument("--date", type=str, default=None,
+                        help="Report date for the daily suite (YYYY-MM-DD). Defaults to yesterday.")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="Runs per measurement. Default: 5.")
+    parser.add_argument("--workers", type=int, default=notion_client.MAX_WORKERS,
+                        help=f"Concurrent database fetches for the notion suite. "
+                             f"Default: {notion_client.MAX_WORKERS}.")
+    parser.add_argument("--children", type=int, default=len(CHILDREN),
+                        help="seed/profile: number of synthetic children (ids 1..N).")
+    parser.add_argument("--subjects", type=int, default=8,
+                        help="seed: subjects per child. Default: 8.")
+    parser.add_argument("--years", type=float, default=2,
+                        help="seed: years of history ending today. Default: 2.")
+    parser.add_argument("--seed", type=int, default=1, help="seed: random seed.")
+    parser.add_argument("--reset", action="store_true",
+                        help="seed: required; truncates the report tables first.")
+    parser.add_argument("--save", type=str, default=None,
+                        help="profile: write the results to this baseline file.")
+    parser.add_argument("--baseline", type=str, default=None,
+                        help="profile: compare against this baseline file.")
+    parser.add_argument("--tolerance", type=float, default=1.5,
+                        help="profile: slow-down factor counted as a regression. Default: 1.5.")
+    parser.add_argument("--format", dest="fmt", choices=["text", "json"], default="text",
+                        help="Output format. Default: text.")
+    args = parser.parse_args()
+
+    week_end = date.fromisoformat(args.week_ending) if args.week_ending else date.today()
+    report_date = (date.fromisoformat(args.date) if args.date
+                   else date.today() - timedelta(days=1))
+
+    if args.suite == "notion":
+        result = bench_notion(args.workers)
+        if args.fmt == "json":
+            print(json.dumps({"notion": result}))
+        else:
+            print_notion_text(result)
+        return
+
+    if args.suite == "seed":
+        host = DB_CONFIG["host"]
+        if host not in LOCAL_HOSTS and not host.startswith("/"):
+            print(f"Refusing to seed non-local database host {host!r}", file=sys.stderr)
+            sys.exit(1)
+        if not args.reset:
+            print("seed truncates activity_logs and related tables; pass --reset to confirm",
+                  file=sys.stderr)
+            sys.exit(1)
+
+    try:
+        conn = psycopg2.connect(**connect_kwargs(), connection_factory=CountingConnection)
+    except Exception as e:
+        print(f"Database connection failed: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    if args.suite == "seed":
+        try:
+            start = time.perf_counter()
+            rows = seed_synthetic(conn, args.children, args.subjects, args.years,
+                                  date.today(), args.seed)
+        finally:
+            conn.close()
+        print(json.dumps({"activity_logs_rows": rows, "children": args.children,
+                          "seconds": round(time.perf_counter() - start, 1)}))
+        return
+
+    if args.suite == "profile":
+        try:
+            result = profile_reports(conn, list(range(1, args.children + 1)),
+                                     report_date, week_end, args.repeat)
+        finally:
+            conn.close()
+        if args.save:
+            with open(args.save, "w") as f:
+                json.dump(result, f, indent=2)
+        comparison = None
+        if args.baseline:
+            with open(args.baseline, "r") as f:
+                comparison = compare_to_baseline(result, json.load(f), args.tolerance)
+        if args.fmt == "json":
+            for run in result["runs"]:
+                run.pop("explain")
+            print(json.dumps({"profile": result, "comparison": comparison}))
+        else:
+            print_profile_text(result, comparison)
+        if comparison and any(row["regressed"] for row in comparison):
+            sys.exit(1)
+        return
+
+    results = {}
+    try:
+        if args.suite in ("weekly", "all"):
+            results["weekly"] = bench_weekly(conn, week_end, args.repeat)
+        if args.suite in ("daily", "all"):
+            results["daily"] = bench_daily(conn, report_date, args.repeat)
+    finally:
+        conn.close()
+
+    if args.fmt == "json":
+        print(json.dumps(results))
+    else:
+        for name, result in results.items():
+            print_text(name, result)
+
+
+if __name__ == "__main__":
+    main()
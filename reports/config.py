@@ -8,6 +8,27 @@ DB_CONFIG = {
     "password": os.environ.get("DB_PASSWORD", ""),
 }
 
+# Connection pool settings (see db.py)
+DB_POOL = {
+    "minconn": int(os.environ.get("DB_POOL_MIN", 1)),
+    "maxconn": int(os.environ.get("DB_POOL_MAX", 4)),
+    "statement_timeout_ms": int(os.environ.get("DB_STATEMENT_TIMEOUT_MS", 120000)),
+    # Connections idle longer than this are pinged before being handed out
+    "check_idle_seconds": int(os.environ.get("DB_POOL_CHECK_IDLE", 30)),
+}
+
+# Report result cache (see report_cache.py). Empty REPORT_CACHE_DIR disables it.
+REPORT_CACHE_DIR = os.environ.get("REPORT_CACHE_DIR", "/tmp/report-cache")
+REPORT_CACHE_MAX = int(os.environ.get("REPORT_CACHE_MAX", 500))  # entries
+
+# Children, Notion databases and aliases live in the registry tables (see
+# registry.py). The values below seed them (`registry.py seed`) and are used
+# until the registry migration has been applied; subjects and workouts are
+# read from the subjects / workout_types tables. When no database is
+# reachable at all (notion_stub.py, notion_sync.py --dry-run) the whole
+# registry comes from here, including SUBJECT_IDS and WORKOUT_IDS.
+REGISTRY_CHECK_SECONDS = int(os.environ.get("REGISTRY_CHECK_SECONDS", 30))
+
 CHILDREN = {1: "Yewoo", 2: "Yeseo"}
 
 # Max duration per session (minutes) - entries exceeding this are corrupted
@@ -42,9 +63,6 @@ WORKOUT_IDS = {
     2: {"Jogging": 10},                 # Yeseo
 }
 
-# Reverse lookup: "Who" select -> child_id
-CHILD_NAME_TO_ID = {"Yewoo": 1, "Yeseo": 2}
-
 # Activity title aliases → canonical subject/workout name
 # Used when Subject select is empty and we fall back to Activity title
 ACTIVITY_ALIASES = {
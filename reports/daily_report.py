@@ -6,66 +6,23 @@ Designed to be called by n8n at 7:10am AEST daily (reporting on the previous day
 
 Usage:
     python daily_report.py [--date YYYY-MM-DD] [--child_id N] [--format text|json]
+    python daily_report.py --start YYYY-MM-DD --end YYYY-MM-DD [--child_id N] [--format text|json]
+
+--start/--end produces one report per day from a single query; --format json
+then prints one JSON object per line (NDJSON) with the date under "date".
 """
 
 import argparse
 import json
 import sys
 from datetime import date, timedelta
-from zoneinfo import ZoneInfo
-
-from config import CHILDREN, TIMEZONE
-from db import get_connection
-
-
-def trend_indicator(today_val, avg_val):
-    if avg_val == 0:
-        return "NEW" if today_val > 0 else ""
-    pct = (today_val - avg_val) / avg_val * 100
-    if pct > 10:
-        return "\u2191"
-    elif pct < -10:
-        return "\u2193"
-    else:
-        return "\u2192"
-
-
-def format_minutes(minutes):
-    if minutes is None or minutes == 0:
-        return "0m"
-    minutes = int(minutes)
-    hours = minutes // 60
-    mins = minutes % 60
-    if hours > 0 and mins > 0:
-        return f"{hours}h{mins}m"
-    elif hours > 0:
-        return f"{hours}h"
-    else:
-        return f"{mins}m"
 
-
-def make_bar(actual, average, width=10):
-    """Build a visual bar with ║ fixed at the midpoint (position width//2).
-
-    The average always maps to the midpoint. Actual fills proportionally:
-      actual=0      → no fill
-      actual=avg    → fills to ║
-      actual=2*avg  → fills entire bar (capped)
-    """
-    mid = width // 2  # ║ position (5 for width=10)
-    if average > 0:
-        fill = round((actual / average) * mid)
-    elif actual > 0:
-        fill = mid  # NEW subject: fill to midpoint
-    else:
-        fill = 0
-    fill = max(0, min(fill, width))  # clamp 0..width
-    filled = "█" * fill
-    dots = "·" * (width - fill)
-    # Insert ║ at the midpoint
-    bar = filled + dots
-    bar = bar[:mid] + "║" + bar[mid + 1:]
-    return f"[{bar}]"
+import parallel
+import registry
+import report_cache
+from db import get_connection, release_connection
+from stats import (NO_TREND, TREND_ARROWS, bar_fills, draw_bar, format_minutes, load_matrix,
+                   trend_codes)
 
 
 def query_today_categories(conn, child_id, report_date):
@@ -73,8 +30,8 @@ def query_today_categories(conn, child_id, report_date):
     sql = """
         SELECT
             CASE WHEN category = 'Routine' THEN 'Rest' ELSE category::text END as cat,
-            SUM(actual_minutes) as total_minutes
-        FROM activity_logs
+            SUM(minutes) as total_minutes
+        FROM daily_rollup
         WHERE child_id = %s AND activity_date = %s
         GROUP BY cat;
     """
@@ -86,10 +43,10 @@ def query_today_categories(conn, child_id, report_date):
 def query_today_subjects(conn, child_id, report_date):
     """Get today's study breakdown by subject."""
     sql = """
-        SELECT s.subject_name, SUM(al.actual_minutes) as minutes
-        FROM activity_logs al
-        JOIN subjects s ON al.subject_id = s.subject_id
-        WHERE al.child_id = %s AND al.activity_date = %s AND al.category = 'Study'
+        SELECT s.subject_name, SUM(r.minutes) as minutes
+        FROM daily_rollup r
+        JOIN subjects s ON r.subject_id = s.subject_id
+        WHERE r.child_id = %s AND r.activity_date = %s AND r.category = 'Study'
         GROUP BY s.subject_name
         ORDER BY minutes DESC;
     """
@@ -101,10 +58,10 @@ def query_today_subjects(conn, child_id, report_date):
 def query_today_workouts(conn, child_id, report_date):
     """Get today's workout breakdown."""
     sql = """
-        SELECT w.workout_name, SUM(al.actual_minutes) as minutes
-        FROM activity_logs al
-        JOIN workout_types w ON al.workout_id = w.workout_id
-        WHERE al.child_id = %s AND al.activity_date = %s AND al.category = 'Workout'
+        SELECT w.workout_name, SUM(r.minutes) as minutes
+        FROM daily_rollup r
+        JOIN workout_types w ON r.workout_id = w.workout_id
+        WHERE r.child_id = %s AND r.activity_date = %s AND r.category = 'Workout'
         GROUP BY w.workout_name
         ORDER BY minutes DESC;
     """
@@ -118,9 +75,9 @@ def query_avg_categories(conn, child_id, report_date):
     sql = """
         SELECT
             CASE WHEN category = 'Routine' THEN 'Rest' ELSE category::text END as cat,
-            ROUND(SUM(actual_minutes)::numeric /
+            ROUND(SUM(minutes)::numeric /
                   GREATEST(COUNT(DISTINCT activity_date), 1), 0) as avg_daily_minutes
-        FROM activity_logs
+        FROM daily_rollup
         WHERE child_id = %s
           AND activity_date BETWEEN %s - INTERVAL '7 days' AND %s - INTERVAL '1 day'
         GROUP BY cat;
@@ -134,13 +91,13 @@ def query_avg_subjects(conn, child_id, report_date):
     """Get 7-day daily average study breakdown by subject."""
     sql = """
         SELECT s.subject_name,
-               ROUND(SUM(al.actual_minutes)::numeric /
-                     GREATEST(COUNT(DISTINCT al.activity_date), 1), 0) as avg_daily_minutes
-        FROM activity_logs al
-        JOIN subjects s ON al.subject_id = s.subject_id
-        WHERE al.child_id = %s
-          AND al.activity_date BETWEEN %s - INTERVAL '7 days' AND %s - INTERVAL '1 day'
-          AND al.category = 'Study'
+               ROUND(SUM(r.minutes)::numeric /
+                     GREATEST(COUNT(DISTINCT r.activity_date), 1), 0) as avg_daily_minutes
+        FROM daily_rollup r
+        JOIN subjects s ON r.subject_id = s.subject_id
+        WHERE r.child_id = %s
+          AND r.activity_date BETWEEN %s - INTERVAL '7 days' AND %s - INTERVAL '1 day'
+          AND r.category = 'Study'
         GROUP BY s.subject_name
         ORDER BY avg_daily_minutes DESC;
     """
@@ -153,13 +110,13 @@ def query_avg_workouts(conn, child_id, report_date):
     """Get 7-day daily average workout breakdown by type."""
     sql = """
         SELECT w.workout_name,
-               ROUND(SUM(al.actual_minutes)::numeric /
-                     GREATEST(COUNT(DISTINCT al.activity_date), 1), 0) as avg_daily_minutes
-        FROM activity_logs al
-        JOIN workout_types w ON al.workout_id = w.workout_id
-        WHERE al.child_id = %s
-          AND al.activity_date BETWEEN %s - INTERVAL '7 days' AND %s - INTERVAL '1 day'
-          AND al.category = 'Workout'
+               ROUND(SUM(r.minutes)::numeric /
+                     GREATEST(COUNT(DISTINCT r.activity_date), 1), 0) as avg_daily_minutes
+        FROM daily_rollup r
+        JOIN workout_types w ON r.workout_id = w.workout_id
+        WHERE r.child_id = %s
+          AND r.activity_date BETWEEN %s - INTERVAL '7 days' AND %s - INTERVAL '1 day'
+          AND r.category = 'Workout'
         GROUP BY w.workout_name
         ORDER BY avg_daily_minutes DESC;
     """
@@ -172,7 +129,7 @@ def count_history_days(conn, child_id, report_date):
     """Count distinct days with data in the 7-day lookback window."""
     sql = """
         SELECT COUNT(DISTINCT activity_date)
-        FROM activity_logs
+        FROM daily_rollup
         WHERE child_id = %s
           AND activity_date BETWEEN %s - INTERVAL '7 days' AND %s - INTERVAL '1 day';
     """
@@ -181,9 +138,141 @@ def count_history_days(conn, child_id, report_date):
         return cur.fetchone()[0]
 
 
+# Row kinds returned by query_daily_figures, from
+# GROUPING(cat, subject_name, workout_name).
+_GROUP_CATEGORY = 3    # (cat)
+_GROUP_SUBJECT = 5     # (subject_name)
+_GROUP_WORKOUT = 6     # (workout_name)
+_GROUP_TOTAL = 7       # ()
+
+
+def query_daily_figures(conn, child_ids, report_date):
+    """Today's totals and 7-day averages for several children in one query.
+
+    Returns {child_id: figures} where figures holds the same values the
+    query_today_* / query_avg_* / count_history_days functions return.
+    """
+    sql = """
+        WITH logs AS (
+            SELECT r.child_id,
+                   r.activity_date,
+                   CASE WHEN r.activity_date = %(report_date)s THEN 'today' ELSE 'avg' END as period,
+                   CASE WHEN r.category = 'Routine' THEN 'Rest' ELSE r.category::text END as cat,
+                   s.subject_name,
+                   w.workout_name,
+                   r.minutes
+            FROM daily_rollup r
+            LEFT JOIN subjects s
+                   ON r.category = 'Study' AND r.subject_id = s.subject_id
+            LEFT JOIN workout_types w
+                   ON r.category = 'Workout' AND r.workout_id = w.workout_id
+            WHERE r.child_id = ANY(%(child_ids)s)
+              AND r.activity_date BETWEEN %(report_date)s - INTERVAL '7 days' AND %(report_date)s
+        )
+        SELECT child_id, period,
+               GROUPING(cat, subject_name, workout_name) as grp,
+               cat, subject_name, workout_name,
+               SUM(minutes) as total_minutes,
+               ROUND(SUM(minutes)::numeric /
+                     GREATEST(COUNT(DISTINCT activity_date), 1), 0) as avg_daily_minutes,
+               COUNT(DISTINCT activity_date) as days
+        FROM logs
+        GROUP BY child_id, period, GROUPING SETS (
+            (cat),
+            (subject_name),
+            (workout_name),
+            ()
+        );
+    """
+    with conn.cursor() as cur:
+        cur.execute(sql, {"child_ids": list(child_ids), "report_date": report_date})
+        rows = cur.fetchall()
+
+    figures = {
+        child_id: {
+            "today_cats": {}, "today_subjects": [], "today_workouts": [],
+            "avg_cats": {}, "avg_subjects": {}, "avg_workouts": {},
+            "history_days": 0,
+        }
+        for child_id in child_ids
+    }
+    for child_id, period, grp, cat, subject_name, workout_name, minutes, avg_minutes, days in rows:
+        f = figures[child_id]
+        if period == "today":
+            if grp == _GROUP_CATEGORY:
+                f["today_cats"][cat] = int(minutes)
+            elif grp == _GROUP_SUBJECT and subject_name is not None:
+                f["today_subjects"].append((subject_name, int(minutes)))
+            elif grp == _GROUP_WORKOUT and workout_name is not None:
+                f["today_workouts"].append((workout_name, int(minutes)))
+        else:
+            if grp == _GROUP_CATEGORY:
+                f["avg_cats"][cat] = int(avg_minutes)
+            elif grp == _GROUP_SUBJECT and subject_name is not None:
+                f["avg_subjects"][subject_name] = int(avg_minutes)
+            elif grp == _GROUP_WORKOUT and workout_name is not None:
+                f["avg_workouts"][workout_name] = int(avg_minutes)
+            elif grp == _GROUP_TOTAL:
+                f["history_days"] = int(days)
+
+    # Match the ORDER BY ... DESC of the per-query functions
+    for f in figures.values():
+        f["today_subjects"].sort(key=lambda item: item[1], reverse=True)
+        f["today_workouts"].sort(key=lambda item: item[1], reverse=True)
+        for key in ("avg_subjects", "avg_workouts"):
+            f[key] = dict(sorted(f[key].items(), key=lambda kv: kv[1], reverse=True))
+    return figures
+
+
+def iter_daily_figures(conn, child_ids, start, end):
+    """Yield (report_date, {child_id: figures}) for every date from start to end.
+
+    One ActivityMatrix covers the range plus the 7-day lead-in; the
+    rolling averages for every date come from it at once and match
+    query_daily_figures per date. So do the trend and bar of every item
+    against its average, under "trends".
+    """
+    child_ids = list(child_ids)
+    matrix = load_matrix(conn, child_ids, start - timedelta(days=7), end)
+    avg_minutes = matrix.daily_average(-7, -1)
+    avg_days = matrix.window_sum(matrix.present, -7, -1)
+    codes = trend_codes(matrix.minutes, avg_minutes)
+    fills = bar_fills(matrix.minutes, avg_minutes)
+    total = matrix.item_index[("total", None)]
+
+    def by_minutes(values):
+        return sorted(values.items(), key=lambda item: item[1], reverse=True)
+
+    report_date = start
+    while report_date <= end:
+        t = matrix.day_index(report_date)
+        figures = {}
+        for child_id in child_ids:
+            c = matrix.child_index[child_id]
+
+            def today(kind):
+                return matrix.item_values(matrix.minutes, child_id, t, kind, matrix.present)
+
+            def avg(kind):
+                return matrix.item_values(avg_minutes, child_id, t, kind, avg_days)
+
+            figures[child_id] = {
+                "today_cats": today("cat"),
+                "today_subjects": by_minutes(today("subject")),
+                "today_workouts": by_minutes(today("workout")),
+                "avg_cats": avg("cat"),
+                "avg_subjects": dict(by_minutes(avg("subject"))),
+                "avg_workouts": dict(by_minutes(avg("workout"))),
+                "history_days": int(avg_days[c, total, t]),
+                "trends": matrix.item_trends(codes, fills, child_id, t),
+            }
+        yield report_date, figures
+        report_date += timedelta(days=1)
+
+
 def format_daily_sms(name, report_date, today_cats, today_subjects,
                      today_workouts, avg_cats, avg_subjects, avg_workouts,
-                     history_days):
+                     history_days, trends):
     sep_double = "══════════════════════════════════════"
     sep_single = "──────────────────────────────────────"
     day_name = report_date.strftime("%b %d (%a)")
@@ -200,10 +289,11 @@ def format_daily_sms(name, report_date, today_cats, today_subjects,
     # --- Study section ---
     study_total = today_cats.get("Study", 0)
     study_avg = avg_cats.get("Study", 0)
-    arrow = trend_indicator(study_total, study_avg)
+    code, fill = trends.get(("cat", "Study"), NO_TREND)
+    arrow = TREND_ARROWS[code]
     avg_note = f"avg {format_minutes(study_avg)}{limited}" if study_avg > 0 else "NEW"
     lines.append("")
-    study_bar = make_bar(study_total, study_avg)
+    study_bar = draw_bar(fill)
     lines.append(f"\U0001f4da Study  {format_minutes(study_total)} {study_bar} {arrow} ({avg_note})")
     lines.append(sep_single)
 
@@ -224,9 +314,10 @@ def format_daily_sms(name, report_date, today_cats, today_subjects,
         today_val = vals.get("today", 0)
         avg_val = vals.get("avg", 0)
         time_str = format_minutes(today_val) if today_val > 0 else "\u2014"
-        bar = make_bar(today_val, avg_val)
+        code, fill = trends.get(("subject", subj), NO_TREND)
+        bar = draw_bar(fill)
         if avg_val > 0:
-            subj_arrow = trend_indicator(today_val, avg_val)
+            subj_arrow = TREND_ARROWS[code]
             avg_str = f"{subj_arrow} avg {format_minutes(avg_val)}"
         else:
             avg_str = "NEW"
@@ -235,10 +326,11 @@ def format_daily_sms(name, report_date, today_cats, today_subjects,
     # --- Workout section ---
     workout_total = today_cats.get("Workout", 0)
     workout_avg = avg_cats.get("Workout", 0)
-    arrow = trend_indicator(workout_total, workout_avg)
+    code, fill = trends.get(("cat", "Workout"), NO_TREND)
+    arrow = TREND_ARROWS[code]
     avg_note = f"avg {format_minutes(workout_avg)}{limited}" if workout_avg > 0 else "NEW"
     lines.append("")
-    workout_bar = make_bar(workout_total, workout_avg)
+    workout_bar = draw_bar(fill)
     lines.append(f"\U0001f3c3 Workout  {format_minutes(workout_total)} {workout_bar} {arrow} ({avg_note})")
     lines.append(sep_single)
 
@@ -257,9 +349,10 @@ def format_daily_sms(name, report_date, today_cats, today_subjects,
             today_val = vals.get("today", 0)
             avg_val = vals.get("avg", 0)
             time_str = format_minutes(today_val) if today_val > 0 else "\u2014"
-            bar = make_bar(today_val, avg_val)
+            code, fill = trends.get(("workout", wname), NO_TREND)
+            bar = draw_bar(fill)
             if avg_val > 0:
-                w_arrow = trend_indicator(today_val, avg_val)
+                w_arrow = TREND_ARROWS[code]
                 avg_str = f"{w_arrow} avg {format_minutes(avg_val)}"
             else:
                 avg_str = "NEW"
@@ -274,41 +367,82 @@ def format_daily_sms(name, report_date, today_cats, today_subjects,
     if rest_total == 0 and rest_avg == 0:
         lines.append("\U0001f634 Rest  not logged")
     else:
-        arrow = trend_indicator(rest_total, rest_avg)
+        arrow = TREND_ARROWS[trends.get(("cat", "Rest"), NO_TREND)[0]]
         lines.append(f"\U0001f634 Rest  {format_minutes(rest_total)} {arrow}  (avg {format_minutes(rest_avg)}{limited})")
     lines.append(sep_double)
 
     return "\n".join(lines)
 
 
-def generate_daily_report(conn, child_id, name, report_date):
-    today_cats = query_today_categories(conn, child_id, report_date)
-    today_subjects = query_today_subjects(conn, child_id, report_date)
-    today_workouts = query_today_workouts(conn, child_id, report_date)
-    avg_cats = query_avg_categories(conn, child_id, report_date)
-    avg_subjects = query_avg_subjects(conn, child_id, report_date)
-    avg_workouts = query_avg_workouts(conn, child_id, report_date)
-    history_days = count_history_days(conn, child_id, report_date)
+def generate_daily_report(conn, child_id, name, report_date, figures=None):
+    if figures is None:
+        _, by_child = next(iter_daily_figures(conn, [child_id], report_date, report_date))
+        figures = by_child[child_id]
+    today_cats = figures["today_cats"]
+    today_subjects = figures["today_subjects"]
+    today_workouts = figures["today_workouts"]
+    avg_cats = figures["avg_cats"]
+    avg_subjects = figures["avg_subjects"]
+    avg_workouts = figures["avg_workouts"]
+    history_days = figures["history_days"]
+    trends = figures["trends"]
 
     return format_daily_sms(name, report_date, today_cats, today_subjects,
                             today_workouts, avg_cats, avg_subjects,
-                            avg_workouts, history_days)
+                            avg_workouts, history_days, trends)
+
+
+def day_reports(conn, child_ids, names, report_date):
+    """{child_id: sms} for one date (a parallel task)."""
+    _, figures = next(iter_daily_figures(conn, child_ids, report_date, report_date))
+    return {child_id: generate_daily_report(conn, child_id, names[child_id], report_date,
+                                            figures[child_id])
+            for child_id in child_ids}
 
 
-def main():
+def range_day_reports(conn, child_ids, names, start, end):
+    """{child_id: [sms per date]} for a --start/--end range (a parallel task)."""
+    reports = {child_id: [] for child_id in child_ids}
+    for report_date, figures in iter_daily_figures(conn, child_ids, start, end):
+        for child_id in child_ids:
+            reports[child_id].append(generate_daily_report(conn, child_id, names[child_id],
+                                                           report_date, figures[child_id]))
+    return reports
+
+
+def main(argv=None):
     parser = argparse.ArgumentParser(description="Generate daily activity report")
     parser.add_argument("--date", type=str, default=None,
                         help="Report date (YYYY-MM-DD). Defaults to today (Melbourne time).")
+    parser.add_argument("--start", type=str, default=None,
+                        help="First report date of a range (YYYY-MM-DD). Needs --end.")
+    parser.add_argument("--end", type=str, default=None,
+                        help="Last report date of a range (YYYY-MM-DD).")
     parser.add_argument("--child_id", type=int, default=None,
                         help="Generate for specific child (1=Yewoo, 2=Yeseo). Default: both.")
     parser.add_argument("--format", dest="fmt", choices=["text", "json"], default="text",
-                        help="Output format. Default: text.")
-    args = parser.parse_args()
-
-    if args.date:
-        report_date = date.fromisoformat(args.date)
+                        help="Output format. Default: text. NDJSON in range mode.")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Recompute even if a cached report is still current.")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Processes to spread children across, each with its own "
+                             "connection. Default: 1 (in this process).")
+    args = parser.parse_args(argv)
+
+    if bool(args.start) != bool(args.end):
+        parser.error("--start and --end must be given together")
+    if args.start and args.date:
+        parser.error("--date cannot be combined with --start/--end")
+
+    if args.start:
+        start = date.fromisoformat(args.start)
+        end = date.fromisoformat(args.end)
+        if end < start:
+            parser.error("--end is before --start")
+    elif args.date:
+        start = end = date.fromisoformat(args.date)
     else:
-        report_date = date.today() - timedelta(days=1)  # report on yesterday
+        start = end = date.today() - timedelta(days=1)  # report on yesterday
 
     try:
         conn = get_connection()
@@ -316,19 +450,53 @@ def main():
         print(f"Database connection failed: {e}", file=sys.stderr)
         sys.exit(1)
 
-    results = {}
+    days = []
+    failed = {}
     try:
-        for child_id, name in CHILDREN.items():
-            if args.child_id and args.child_id != child_id:
-                continue
-            results[name.lower()] = generate_daily_report(conn, child_id, name, report_date)
+        children = {child_id: name for child_id, name in registry.load(conn).children.items()
+                    if not args.child_id or args.child_id == child_id}
+        if not children:
+            reason = (f"child_id {args.child_id} is not in the registry" if args.child_id
+                      else "the registry has no active children")
+            print(f"No children selected: {reason}", file=sys.stderr)
+            sys.exit(1)
+
+        if args.start:
+            reports, failed = parallel.run_for_children(
+                range_day_reports, list(children), (children, start, end), args.workers, conn)
+            for i in range((end - start).days + 1):
+                days.append((start + timedelta(days=i),
+                             {children[child_id].lower(): daily[i]
+                              for child_id, daily in reports.items()}))
+        else:
+            def generate(child_ids):
+                reports, errors = parallel.run_for_children(
+                    day_reports, child_ids, (children, start), args.workers, conn)
+                failed.update(errors)
+                return reports
+
+            if args.no_cache:
+                reports = generate(list(children))
+            else:
+                reports = report_cache.cached_reports(conn, "daily", list(children), start,
+                                                      start - timedelta(days=7), generate)
+            days.append((start, {name.lower(): reports[child_id]
+                                 for child_id, name in children.items()
+                                 if reports.get(child_id) is not None}))
     finally:
-        conn.close()
+        release_connection(conn)
+
+    parallel.print_errors(failed, children)
+    if len(failed) == len(children):
+        sys.exit(1)
 
-    if args.fmt == "json":
-        print(json.dumps(results, ensure_ascii=False))
+    if args.start and args.fmt == "json":
+        for report_date, results in days:
+            print(json.dumps({"date": report_date.isoformat(), **results}, ensure_ascii=False))
+    elif args.fmt == "json":
+        print(json.dumps(days[0][1], ensure_ascii=False))
     else:
-        print("\n---\n".join(results.values()))
+        print("\n---\n".join(sms for _, results in days for sms in results.values()))
 
 
 if __name__ == "__main__":
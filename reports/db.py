@@ -1,6 +1,112 @@
+"""PostgreSQL connections.
+
+Connections come from one pool per process, so a long-running process
+(or several jobs in one process) reuses warm connections instead of
+paying a TCP + TLS + auth handshake each time. Every connection has TCP
+keepalives and a statement_timeout; one that has sat idle for a while is
+pinged on checkout and replaced if it has gone away.
+
+    with connection() as conn:
+        ...
+
+or get_connection() / release_connection(conn) when the lifetime does
+not fit a with-block.
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+
 import psycopg2
-from config import DB_CONFIG
+import psycopg2.extensions
+from psycopg2.pool import ThreadedConnectionPool
+
+from config import DB_CONFIG, DB_POOL
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+_last_used = {}
+
+
+def connect_kwargs():
+    """psycopg2.connect() arguments: DB_CONFIG plus keepalives and timeouts."""
+    return {
+        **DB_CONFIG,
+        "connect_timeout": 10,
+        "keepalives": 1,
+        "keepalives_idle": 30,
+        "keepalives_interval": 10,
+        "keepalives_count": 3,
+        "options": f"-c statement_timeout={DB_POOL['statement_timeout_ms']}",
+    }
+
+
+def get_pool():
+    """Return this process's pool, creating it on first use (or after a fork)."""
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            # A pool inherited across fork shares sockets with the parent; leave it be
+            _pool = ThreadedConnectionPool(DB_POOL["minconn"], DB_POOL["maxconn"],
+                                           **connect_kwargs())
+            _pool_pid = os.getpid()
+            _last_used.clear()
+    return _pool
+
+
+def _healthy(conn):
+    if conn.closed:
+        return False
+    last_used = _last_used.get(id(conn))
+    if last_used is None or time.monotonic() - last_used < DB_POOL["check_idle_seconds"]:
+        return True  # freshly opened or recently used
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1")
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
 
 
 def get_connection():
-    return psycopg2.connect(**DB_CONFIG)
+    """Check out a pooled connection. Pair with release_connection()."""
+    pool = get_pool()
+    for _ in range(DB_POOL["maxconn"] + 1):
+        conn = pool.getconn()
+        if _healthy(conn):
+            return conn
+        _last_used.pop(id(conn), None)
+        pool.putconn(conn, close=True)
+    raise psycopg2.OperationalError("No healthy database connection available")
+
+
+def release_connection(conn):
+    """Return a connection to the pool, rolling back anything uncommitted."""
+    if not conn.closed and conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+        try:
+            conn.rollback()
+        except psycopg2.Error:
+            pass
+    _last_used[id(conn)] = time.monotonic()
+    get_pool().putconn(conn, close=bool(conn.closed))
+
+
+@contextmanager
+def connection():
+    conn = get_connection()
+    try:
+        yield conn
+    finally:
+        release_connection(conn)
+
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.closeall()
+        _pool = None
+        _last_used.clear()
@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""Versioned schema migrations and index checks.
+
+Migrations are the numbered .sql files in reports/migrations/, applied in
+order, each in its own transaction, and recorded in schema_migrations
+with a checksum so an edited migration is reported by `check`.
+
+status  lists every migration and whether it has been applied.
+up      applies pending migrations, then VACUUM (ANALYZE)s the tables they
+        index so the visibility map allows index-only scans. Applying the
+        registry migration also seeds it from config.py.
+check   fails if a migration is pending or edited, or an expected index is
+        missing or invalid.
+explain runs every report query_* function under EXPLAIN (ANALYZE) and
+        fails unless each read of activity_logs / daily_rollup is an
+        Index Only Scan. On a small database the planner prefers
+        sequential scans; --no-seqscan discourages them to show which
+        index would be used.
+
+Usage:
+    python migrate.py status
+    python migrate.py up
+    python migrate.py check
+    python migrate.py explain [--child_id N] [--date YYYY-MM-DD] [--week-ending YYYY-MM-DD] [--no-seqscan]
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import sys
+from datetime import date, timedelta
+
+import psycopg2
+
+import benchmark
+import daily_report
+import registry
+import report_cache
+import stats
+import weekly_report
+from db import connect_kwargs, get_connection, release_connection
+from rollup import ROLLUP_SOURCE
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+
+MIGRATIONS_DDL = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version     text        PRIMARY KEY,
+        name        text        NOT NULL,
+        checksum    text        NOT NULL,
+        applied_at  timestamptz NOT NULL DEFAULT now()
+    );
+"""
+
+# Seeded from config.py by `up` when applied (see registry.seed)
+REGISTRY_MIGRATION = "0005"
+
+# Indexes the report access paths rely on: index name -> table
+EXPECTED_INDEXES = {
+    "activity_logs_child_date_category": "activity_logs",
+    "activity_logs_page_date_key": "activity_logs",
+    "daily_rollup_report": "daily_rollup",
+}
+
+# Tables every report query should read through an index-only scan. Partitions
+# (activity_logs_2026_05, ... see partition.py) count as their parent.
+INDEX_ONLY_TABLES = {"activity_logs", "daily_rollup"}
+
+
+def _parent_table(relation):
+    return "activity_logs" if relation.startswith("activity_logs_") else relation
+
+
+# ---------------------------------------------------------------------------
+# Migrations
+# ---------------------------------------------------------------------------
+
+def load_migrations():
+    """[(version, name, sql, checksum)] from MIGRATIONS_DIR, in version order."""
+    migrations = []
+    for path in sorted(glob.glob(os.path.join(MIGRATIONS_DIR, "*.sql"))):
+        filename = os.path.basename(path)
+        version, _, name = filename[:-len(".sql")].partition("_")
+        with open(path, encoding="utf-8") as f:
+            sql = f.read()
+        migrations.append((version, name, sql, hashlib.sha256(sql.encode()).hexdigest()))
+    return migrations
+
+
+def applied_migrations(conn):
+    """{version: checksum} of migrations already applied."""
+    with conn.cursor() as cur:
+        cur.execute(MIGRATIONS_DDL)
+        cur.execute("SELECT version, checksum FROM schema_migrations")
+        applied = dict(cur.fetchall())
+    conn.commit()
+    return applied
+
+
+def migration_status(conn):
+    applied = applied_migrations(conn)
+    return [{"version": version, "name": name,
+             "applied": version in applied,
+             "modified": version in applied and applied[version] != checksum}
+            for version, name, _, checksum in load_migrations()]
+
+
+def migrate_up(conn):
+    """Apply pending migrations in order. Returns the versions applied."""
+    applied = applied_migrations(conn)
+    done = []
+    for version, name, sql, checksum in load_migrations():
+        if version in applied:
+            continue
+        try:
+            with conn.cursor() as cur:
+                cur.execute(sql)
+                cur.execute(
+                    "INSERT INTO schema_migrations (version, name, checksum) VALUES (%s, %s, %s)",
+                    (version, name, checksum))
+            conn.commit()
+        except psycopg2.Error:
+            conn.rollback()
+            raise
+        done.append(version)
+
+    if REGISTRY_MIGRATION in done:
+        registry.seed(conn)
+        conn.commit()
+
+    if done:
+        conn.autocommit = True
+        try:
+            with conn.cursor() as cur:
+                for table in sorted(set(EXPECTED_INDEXES.values())):
+                    cur.execute(f"VACUUM (ANALYZE) {table}")
+        finally:
+            conn.autocommit = False
+    return done
+
+
+def check_schema(conn):
+    """Problems with migrations or expected indexes, as a list of strings."""
+    problems = []
+    for m in migration_status(conn):
+        if not m["applied"]:
+            problems.append(f"migration {m['version']}_{m['name']} is pending")
+        elif m["modified"]:
+            problems.append(f"migration {m['version']}_{m['name']} changed after it was applied")
+
+    sql = """
+        SELECT c.relname, t.relname, i.indisvalid
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        JOIN pg_class t ON t.oid = i.indrelid
+        WHERE c.relname = ANY(%s)
+    """
+    with conn.cursor() as cur:
+        cur.execute(sql, (list(EXPECTED_INDEXES),))
+        found = {row[0]: (row[1], row[2]) for row in cur.fetchall()}
+        cur.execute("""
+            SELECT 1
+            FROM pg_index i
+            JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = i.indkey[0]
+            WHERE i.indrelid = to_regclass('activity_logs')
+              AND i.indisunique AND a.attname = 'notion_page_id'
+        """)
+        has_page_key = cur.fetchone() is not None
+    conn.rollback()
+
+    for index, table in EXPECTED_INDEXES.items():
+        if index not in found:
+            problems.append(f"index {index} on {table} is missing")
+        elif found[index][0] != table:
+            problems.append(f"index {index} is on {found[index][0]}, expected {table}")
+        elif not found[index][1]:
+            problems.append(f"index {index} is invalid (failed build?)")
+    if not has_page_key:
+        problems.append("activity_logs has no unique index on notion_page_id")
+    return problems
+
+
+# ---------------------------------------------------------------------------
+# EXPLAIN check
+# ---------------------------------------------------------------------------
+
+def table_scans(plan):
+    """[(node type, relation, heap fetches)] for every node that reads a table."""
+    scans = []
+
+    def walk(node):
+        if "Relation Name" in node:
+            scans.append((node["Node Type"], node["Relation Name"], node.get("Heap Fetches")))
+        for child in node.get("Plans", []):
+            walk(child)
+
+    walk(plan["Plan"])
+    return scans
+
+
+def report_queries(conn, child_id, report_date, week_end):
+    """(label, fn) for every report query, bound to one child and date."""
+    def rollup_source():
+        with conn.cursor() as cur:
+            cur.execute(ROLLUP_SOURCE.format(where="child_id = %s AND activity_date >= %s"),
+                        (child_id, week_end - timedelta(days=34)))
+            cur.fetchall()
+
+    queries = [(f"daily_report.{fn.__name__}", lambda fn=fn: fn(conn, child_id, report_date))
+               for fn in benchmark.DAILY_QUERIES]
+    queries += [(f"weekly_report.{fn.__name__}", lambda fn=fn: fn(conn, child_id, week_end))
+                for fn in benchmark.WEEKLY_QUERIES]
+    queries += [
+        ("daily_report.query_daily_figures",
+         lambda: daily_report.query_daily_figures(conn, [child_id], report_date)),
+        ("weekly_report.query_week_figures",
+         lambda: weekly_report.query_week_figures(conn, [child_id], week_end)),
+        ("stats.load_matrix",
+         lambda: stats.load_matrix(conn, [child_id], week_end - timedelta(days=34), week_end)),
+        ("report_cache.data_versions",
+         lambda: report_cache.data_versions(conn, "weekly", [child_id], week_end - timedelta(days=34), week_end)),
+        ("rollup.ROLLUP_SOURCE", rollup_source),
+    ]
+    return queries
+
+
+def explain_reports(child_id, report_date, week_end, no_seqscan=False):
+    """EXPLAIN every report query; returns [{query, scans, index_only}]."""
+    conn = psycopg2.connect(**connect_kwargs(), connection_factory=benchmark.CountingConnection)
+    results = []
+    try:
+        if no_seqscan:
+            with conn.cursor() as cur:
+                cur.execute("SET enable_seqscan = off; SET enable_bitmapscan = off")
+        for label, fn in report_queries(conn, child_id, report_date, week_end):
+            conn.plans = []
+            try:
+                fn()
+                plans = conn.plans
+            finally:
+                conn.plans = None
+            scans = [scan for plan in plans for scan in table_scans(plan)]
+            checked = [s for s in scans if _parent_table(s[1]) in INDEX_ONLY_TABLES]
+            results.append({
+                "query": label,
+                "scans": [f"{node} on {table}" + (f" (heap fetches {fetches})" if fetches else "")
+                          for node, table, fetches in scans],
+                "index_only": all(node == "Index Only Scan" for node, _, _ in checked),
+            })
+        conn.rollback()
+    finally:
+        conn.close()
+    return results
+
+
+# ---------------------------------------------------------------------------
+# Main
+# ---------------------------------------------------------------------------
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply and check schema migrations")
+    parser.add_argument("command", choices=["status", "up", "check", "explain"])
+    parser.add_argument("--child_id", type=int, default=1,
+                        help="Child to run the explain queries for. Default: 1.")
+    parser.add_argument("--date", type=str, default=None,
+                        help="Daily report date for explain (YYYY-MM-DD). Defaults to yesterday.")
+    parser.add_argument("--week-ending", type=str, default=None,
+                        help="Weekly report week ending for explain (YYYY-MM-DD). Defaults to today.")
+    parser.add_argument("--no-seqscan", action="store_true",
+                        help="Discourage sequential and bitmap scans during explain.")
+    args = parser.parse_args()
+
+    if args.command == "explain":
+        report_date = date.fromisoformat(args.date) if args.date else date.today() - timedelta(days=1)
+        week_end = date.fromisoformat(args.week_ending) if args.week_ending else date.today()
+        try:
+            results = explain_reports(args.child_id, report_date, week_end, args.no_seqscan)
+        except psycopg2.OperationalError as e:
+            print(f"Database connection failed: {e}", file=sys.stderr)
+            sys.exit(1)
+        print(json.dumps(results, indent=2))
+        if not all(r["index_only"] for r in results):
+            sys.exit(1)
+        return
+
+    try:
+        conn = get_connection()
+    except Exception as e:
+        print(f"Database connection failed: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    try:
+        if args.command == "status":
+            print(json.dumps(migration_status(conn), indent=2))
+        elif args.command == "up":
+            print(json.dumps({"applied": migrate_up(conn)}))
+        else:
+            problems = check_schema(conn)
+            print(json.dumps({"ok": not problems, "problems": problems}, indent=2))
+            if problems:
+                sys.exit(1)
+    finally:
+        release_connection(conn)
+
+
+if __name__ == "__main__":
+    main()
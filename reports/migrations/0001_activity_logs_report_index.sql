@@ -0,0 +1,6 @@
+-- Covering index for the per-child, per-date scans of activity_logs:
+-- rollup.py --rebuild and any query filtering on child_id + activity_date
+-- (+ category) can answer from the index alone.
+CREATE INDEX IF NOT EXISTS activity_logs_child_date_category
+    ON activity_logs (child_id, activity_date, category)
+    INCLUDE (actual_minutes, subject_id, workout_id);
@@ -0,0 +1,17 @@
+-- notion_sync inserts with ON CONFLICT (notion_page_id), which needs a
+-- unique index on that column alone. Only create one if none exists yet.
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1
+        FROM pg_index i
+        JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = i.indkey[0]
+        WHERE i.indrelid = 'activity_logs'::regclass
+          AND i.indisunique
+          AND i.indnkeyatts = 1
+          AND a.attname = 'notion_page_id'
+    ) THEN
+        CREATE UNIQUE INDEX activity_logs_notion_page_id_key ON activity_logs (notion_page_id);
+    END IF;
+END
+$$;
@@ -0,0 +1,19 @@
+-- The reports read daily_rollup by child_id + activity_date (+ category)
+-- and need minutes, sessions, subject_id and workout_id. daily_rollup_key
+-- uses COALESCE expressions, so it cannot return subject_id/workout_id;
+-- this index covers every report query.
+CREATE TABLE IF NOT EXISTS daily_rollup (
+    child_id       integer NOT NULL,
+    activity_date  date    NOT NULL,
+    category       text    NOT NULL,
+    subject_id     integer,
+    workout_id     integer,
+    minutes        bigint  NOT NULL DEFAULT 0,
+    sessions       integer NOT NULL DEFAULT 0
+);
+CREATE UNIQUE INDEX IF NOT EXISTS daily_rollup_key
+    ON daily_rollup (child_id, activity_date, category,
+                     COALESCE(subject_id, 0), COALESCE(workout_id, 0));
+CREATE INDEX IF NOT EXISTS daily_rollup_report
+    ON daily_rollup (child_id, activity_date, category)
+    INCLUDE (subject_id, workout_id, minutes, sessions);
@@ -0,0 +1,6 @@
+-- notion_sync deduplicates with ON CONFLICT (notion_page_id, activity_date).
+-- activity_date comes from the page's immutable Created time, so this is
+-- as strict as notion_page_id alone, and unlike it, it can also be
+-- enforced once activity_logs is partitioned by activity_date (partition.py).
+CREATE UNIQUE INDEX IF NOT EXISTS activity_logs_page_date_key
+    ON activity_logs (notion_page_id, activity_date);
@@ -0,0 +1,52 @@
+-- Child / subject registry (registry.py). Children and activity aliases
+-- move out of config.py into tables; subjects and workout_types already
+-- hold the per-child names and ids. Any change to these four tables bumps
+-- registry_version, which is how cached registries notice they are stale.
+CREATE TABLE IF NOT EXISTS child_registry (
+    child_id              integer PRIMARY KEY,
+    name                  text    NOT NULL UNIQUE,
+    name_kr               text    NOT NULL DEFAULT '',
+    notion_db_id          text    UNIQUE,
+    max_duration_minutes  integer NOT NULL DEFAULT 120,
+    active                boolean NOT NULL DEFAULT true
+);
+
+-- child_id NULL applies the alias to every child
+CREATE TABLE IF NOT EXISTS activity_aliases (
+    child_id  integer REFERENCES child_registry ON DELETE CASCADE,
+    alias     text    NOT NULL,
+    target    text    NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS activity_aliases_key
+    ON activity_aliases (COALESCE(child_id, 0), alias);
+
+-- sync_subjects inserts with ON CONFLICT (child_id, subject_name)
+CREATE UNIQUE INDEX IF NOT EXISTS subjects_child_name_key
+    ON subjects (child_id, subject_name);
+
+CREATE TABLE IF NOT EXISTS registry_version (
+    id          boolean     PRIMARY KEY DEFAULT true CHECK (id),
+    version     bigint      NOT NULL DEFAULT 1,
+    updated_at  timestamptz NOT NULL DEFAULT now()
+);
+INSERT INTO registry_version (id) VALUES (true) ON CONFLICT DO NOTHING;
+
+CREATE OR REPLACE FUNCTION bump_registry_version() RETURNS trigger AS $$
+BEGIN
+    UPDATE registry_version SET version = version + 1, updated_at = now();
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DO $$
+DECLARE
+    t text;
+BEGIN
+    FOREACH t IN ARRAY ARRAY['child_registry', 'activity_aliases', 'subjects', 'workout_types'] LOOP
+        EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', t || '_registry_version', t);
+        EXECUTE format('CREATE TRIGGER %I AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON %I '
+                       'FOR EACH STATEMENT EXECUTE FUNCTION bump_registry_version()',
+                       t || '_registry_version', t);
+    END LOOP;
+END
+$$;
@@ -0,0 +1,278 @@
+"""Shared Notion API client.
+
+All Notion calls go through one pooled requests.Session, so pages of a
+query and queries against different databases reuse keep-alive
+connections instead of opening a new TLS connection per request.
+map_concurrently walks several databases at once on a bounded thread pool;
+callers running more threads than MAX_WORKERS size the Session's
+connection pool to match with set_max_connections.
+
+Requests from every thread share one token bucket sized to Notion's limit
+(about 3 requests/second per integration). A 429 pauses the bucket for
+the Retry-After period and lowers the rate, which then climbs back up on
+success; 5xx responses and connection errors are retried with jittered
+exponential backoff. stats() returns the per-run request, throttle and
+retry counters.
+
+iter_query streams a database query one response at a time, and
+filter_properties limits the page properties Notion sends back.
+"""
+
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+NOTION_API_KEY = os.environ.get("NOTION_API_KEY", "")
+NOTION_VERSION = "2022-06-28"
+NOTION_BASE = os.environ.get("NOTION_BASE", "https://api.notion.com/v1")
+NOTION_TIMEOUT = 30  # seconds per request
+MAX_WORKERS = int(os.environ.get("NOTION_MAX_WORKERS", 4))
+RATE_LIMIT = float(os.environ.get("NOTION_RATE_LIMIT", 3))  # requests per second
+MAX_RETRIES = int(os.environ.get("NOTION_MAX_RETRIES", 5))
+BACKOFF_BASE = 1.0  # seconds
+BACKOFF_CAP = 30.0  # seconds
+
+_session = None
+_session_lock = threading.Lock()
+_max_connections = MAX_WORKERS
+
+
+class TokenBucket:
+    """Thread-safe token bucket with additive-increase/multiplicative-decrease.
+
+    Starts at max_rate tokens per second; throttled() pauses every caller
+    and cuts the rate by a quarter (once per pause, however many requests
+    were rejected), and each success adds a little back.
+    """
+
+    def __init__(self, max_rate, min_rate=0.5, recovery=0.1):
+        self.max_rate = max_rate
+        self.min_rate = min(min_rate, max_rate)
+        self.recovery = recovery
+        self.rate = max_rate
+        self.capacity = max(max_rate, 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    wait = self.paused_until - now
+                else:
+                    elapsed = max(0.0, now - self.updated)
+                    self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+                    self.updated = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def throttled(self, pause):
+        with self.lock:
+            now = time.monotonic()
+            if now >= self.paused_until:
+                self.rate = max(self.min_rate, self.rate * 0.75)
+            self.paused_until = max(self.paused_until, now + pause)
+            self.updated = self.paused_until
+            self.tokens = 0
+
+    def succeeded(self):
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + self.recovery)
+
+
+_bucket = TokenBucket(RATE_LIMIT)
+_stats = {"requests": 0, "throttled": 0, "server_errors": 0, "retries": 0}
+_stats_lock = threading.Lock()
+
+
+def _count(key):
+    with _stats_lock:
+        _stats[key] += 1
+
+
+def stats():
+    """Counters for this process since the last reset_stats()."""
+    with _stats_lock:
+        return dict(_stats)
+
+
+def reset_stats():
+    with _stats_lock:
+        for key in _stats:
+            _stats[key] = 0
+
+
+def notion_headers():
+    return {
+        "Authorization": f"Bearer {NOTION_API_KEY}",
+        "Notion-Version": NOTION_VERSION,
+        "Content-Type": "application/json",
+        "Accept-Encoding": "gzip, deflate",
+    }
+
+
+def _mount_adapter(session):
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(_max_connections, 1))
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+
+def get_session():
+    """Return the process-wide Session, creating it on first use."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            _mount_adapter(session)
+            session.headers.update(notion_headers())
+            _session = session
+    return _session
+
+
+def set_max_connections(connections):
+    """Keep up to `connections` pooled connections, one per concurrent request.
+
+    Call before starting more threads than MAX_WORKERS; otherwise the pool
+    overflows ("Connection pool is full") and the extra connections are
+    closed after each request instead of being reused.
+    """
+    global _max_connections
+    with _session_lock:
+        _max_connections = connections
+        if _session is not None:
+            _mount_adapter(_session)
+
+
+def backoff_delay(attempt):
+    """Exponential backoff with jitter: half fixed, half random."""
+    delay = min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def retry_after(resp):
+    """Seconds from a Retry-After header, or None if absent or not a number."""
+    try:
+        return max(0.0, float(resp.headers.get("Retry-After", "")))
+    except ValueError:
+        return None
+
+
+def request(method, path, body=None, params=None):
+    """Send a rate-limited Notion request and return the decoded JSON.
+
+    429s wait for Retry-After; 5xx and connection errors back off and
+    retry. Anything else, or running out of retries, raises.
+    """
+    url = f"{NOTION_BASE}{path}"
+    for attempt in range(MAX_RETRIES + 1):
+        last_attempt = attempt == MAX_RETRIES
+        _bucket.acquire()
+        _count("requests")
+        try:
+            resp = get_session().request(method, url, json=body, params=params,
+                                         timeout=NOTION_TIMEOUT)
+        except (requests.ConnectionError, requests.Timeout):
+            if last_attempt:
+                raise
+            _count("retries")
+            time.sleep(backoff_delay(attempt))
+            continue
+
+        if resp.status_code == 429:
+            _count("throttled")
+            if last_attempt:
+                resp.raise_for_status()
+            wait = retry_after(resp)
+            _bucket.throttled(wait if wait is not None else backoff_delay(attempt))
+            _count("retries")
+            continue
+
+        if resp.status_code >= 500:
+            _count("server_errors")
+            if last_attempt:
+                resp.raise_for_status()
+            _count("retries")
+            time.sleep(backoff_delay(attempt))
+            continue
+
+        resp.raise_for_status()
+        _bucket.succeeded()
+        return resp.json()
+
+
+def get(path):
+    return request("GET", path)
+
+
+def post(path, body, params=None):
+    return request("POST", path, body, params)
+
+
+def patch(path, body):
+    return request("PATCH", path, body)
+
+
+def get_database(db_id):
+    return get(f"/databases/{db_id}")
+
+
+def get_page(page_id):
+    return get(f"/pages/{page_id}")
+
+
+def update_page(page_id, properties):
+    return patch(f"/pages/{page_id}", {"properties": properties})
+
+
+def iter_query(db_id, body, filter_properties=None, start_cursor=None):
+    """Yield (results, next_cursor) for each response of a database query.
+
+    Each response is requested only when the previous one has been
+    consumed, so at most one page of results is held at a time.
+    next_cursor is None after the last response. filter_properties is a
+    list of property ids to return (all properties if empty).
+    """
+    body = dict(body)
+    params = {"filter_properties": list(filter_properties)} if filter_properties else None
+    has_more = True
+
+    while has_more:
+        if start_cursor:
+            body["start_cursor"] = start_cursor
+        data = post(f"/databases/{db_id}/query", body, params)
+        has_more = data.get("has_more", False)
+        start_cursor = data.get("next_cursor") if has_more else None
+        yield data.get("results", []), start_cursor
+
+
+def query_database(db_id, body, filter_properties=None):
+    """Return every result of a database query, following next_cursor."""
+    results = []
+    for page, _ in iter_query(db_id, body, filter_properties):
+        results.extend(page)
+    return results
+
+
+def map_concurrently(fn, items, max_workers=MAX_WORKERS):
+    """Run fn(value) for each (key, value) in items on a bounded thread pool.
+
+    Returns {key: result} in the order of items, whatever order the calls
+    finish in. The first exception raised by fn is re-raised.
+    """
+    items = list(items)
+    if not items:
+        return {}
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(items)))) as pool:
+        futures = [(key, pool.submit(fn, value)) for key, value in items]
+        return {key: future.result() for key, future in futures}
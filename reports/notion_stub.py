@@ -0,0 +1,412 @@
+#!/usr/bin/env python3
+"""Local stand-in for the Notion API endpoints the sync scripts use.
+
+Serves one timer database per child in the registry (registry.py, or
+config.py when no database is reachable), filled with synthetic pages
+(Activity, Subject, Done, Created, Finished, Notes, Synced) built from
+their subjects and workouts, or with pages recorded to a fixtures file.
+Supports:
+
+    POST /v1/databases/{id}/query   filter (and/or, checkbox, created_time,
+                                    last_edited_time), sorts (timestamps),
+                                    page_size, start_cursor,
+                                    ?filter_properties=<id>&...
+    GET  /v1/databases/{id}         property schema incl. Subject options
+    GET  /v1/pages/{id}             one page (for notion_webhook.py)
+    PATCH /v1/pages/{id}            checkbox properties (Synced write-back)
+    GET  /_stats                    requests served / throttled (not Notion)
+
+Latency and 429s can be injected to exercise the client's rate limiting.
+
+Usage:
+    python notion_stub.py --pages 2000 --latency-ms 80 --throttle 0.05
+    python notion_stub.py --pages 2000 --dump fixtures.json     # write pages and exit
+    python notion_stub.py --fixtures fixtures.json              # serve recorded pages
+
+    NOTION_BASE=http://127.0.0.1:8765/v1 NOTION_API_KEY=stub \\
+        python notion_sync.py --all --dry-run
+"""
+
+import argparse
+import json
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+import registry
+
+MAX_PAGE_SIZE = 100
+
+# Property ids as Notion would report them in the database schema
+PROPERTY_IDS = {
+    "Activity": "title",
+    "Subject": "sUbj",
+    "Done": "d%3Dn",
+    "Created": "cR%3Dt",
+    "Finished": "f1nD",
+    "Notes": "n0tS",
+    "Synced": "sYnC",
+    "Duration (min)": "dUr%3D",
+}
+
+
+def notion_time(dt):
+    return dt.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+
+def parse_time(value):
+    dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+def rich_text(text):
+    if not text:
+        return []
+    return [{"type": "text", "text": {"content": text}, "plain_text": text}]
+
+
+def make_page(rng, db_id, activity, subject, created, minutes, done=True, notes=None):
+    finished = created + timedelta(minutes=minutes)
+    return {
+        "object": "page",
+        "id": str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+        "created_time": notion_time(created),
+        "last_edited_time": notion_time(finished),
+        "parent": {"type": "database_id", "database_id": db_id},
+        "archived": False,
+        "properties": {
+            "Activity": {"id": PROPERTY_IDS["Activity"], "type": "title", "title": rich_text(activity)},
+            "Subject": {"id": PROPERTY_IDS["Subject"], "type": "select",
+                        "select": {"name": subject} if subject else None},
+            "Done": {"id": PROPERTY_IDS["Done"], "type": "checkbox", "checkbox": done},
+            "Created": {"id": PROPERTY_IDS["Created"], "type": "created_time",
+                        "created_time": notion_time(created)},
+            "Finished": {"id": PROPERTY_IDS["Finished"], "type": "last_edited_time",
+                         "last_edited_time": notion_time(finished)},
+            "Notes": {"id": PROPERTY_IDS["Notes"], "type": "rich_text", "rich_text": rich_text(notes)},
+            "Synced": {"id": PROPERTY_IDS["Synced"], "type": "checkbox", "checkbox": False},
+            "Duration (min)": {"id": PROPERTY_IDS["Duration (min)"], "type": "formula",
+                               "formula": {"type": "number", "number": minutes}},
+        },
+    }
+
+
+def generate_pages(reg, pages_per_db, days, seed):
+    """Synthetic timer pages per database: {db_id: [page, ...]} oldest first."""
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc).replace(second=0, microsecond=0)
+    databases = {}
+
+    for child_id, db_id in reg.notion_db_ids.items():
+        subjects = list(reg.subject_ids[child_id])
+        workouts = list(reg.workout_ids[child_id])
+        max_minutes = reg.max_duration[child_id]
+        pages = []
+        for _ in range(pages_per_db):
+            created = now - timedelta(days=rng.uniform(0, days))
+            kind = rng.random()
+            if kind < 0.65 and subjects:
+                activity = subject = rng.choice(subjects)
+                minutes = rng.randint(20, min(150, max_minutes))
+            elif kind < 0.8 and workouts:
+                activity = subject = rng.choice(workouts)
+                minutes = rng.randint(15, 90)
+            else:
+                # Rest entries usually only have the Activity title set
+                activity, subject = rng.choice(["Dinner", "Rest", "Break"]), None
+                minutes = rng.randint(10, 60)
+            done = rng.random() > 0.05
+            notes = "felt tired" if rng.random() < 0.1 else None
+            pages.append(make_page(rng, db_id, activity, subject, created, minutes, done, notes))
+        pages.sort(key=lambda p: p["created_time"])
+        databases[db_id] = pages
+    return databases
+
+
+def matches(page, flt):
+    """Evaluate the subset of Notion's filter language the sync uses."""
+    if not flt:
+        return True
+    if "and" in flt:
+        return all(matches(page, f) for f in flt["and"])
+    if "or" in flt:
+        return any(matches(page, f) for f in flt["or"])
+
+    if "timestamp" in flt:
+        kind = flt["timestamp"]
+        value = parse_time(page[kind])
+        cond = flt[kind]
+        checks = {
+            "on_or_after": lambda v: value >= v,
+            "after": lambda v: value > v,
+            "before": lambda v: value < v,
+            "on_or_before": lambda v: value <= v,
+            "equals": lambda v: value == v,
+        }
+        return all(checks[op](parse_time(v)) for op, v in cond.items() if op in checks)
+
+    prop = page["properties"].get(flt.get("property"), {})
+    if "checkbox" in flt:
+        return prop.get("checkbox") == flt["checkbox"].get("equals")
+    if "select" in flt:
+        sel = prop.get("select") or {}
+        return sel.get("name") == flt["select"].get("equals")
+    return True
+
+
+def project(page, property_ids):
+    """page with only the properties whose id is in property_ids (all if empty)."""
+    if not property_ids:
+        return page
+    props = {name: value for name, value in page["properties"].items()
+             if value["id"] in property_ids}
+    return {**page, "properties": props}
+
+
+def database_schema(db_id, pages):
+    options = sorted({p["properties"]["Subject"]["select"]["name"]
+                      for p in pages if p["properties"]["Subject"]["select"]})
+    props = {name: {"id": pid, "name": name} for name, pid in PROPERTY_IDS.items()}
+    props["Subject"]["type"] = "select"
+    props["Subject"]["select"] = {"options": [{"name": name} for name in options]}
+    return {"object": "database", "id": db_id, "properties": props}
+
+
+class StubState:
+    def __init__(self, databases, latency_ms, throttle, retry_after, rate_limit, seed):
+        self.databases = databases
+        self.pages = {page["id"]: page for pages in databases.values() for page in pages}
+        # Position of each page in its database; cursors resume from a position
+        self.positions = {page["id"]: i for pages in databases.values()
+                          for i, page in enumerate(pages)}
+        self.latency = latency_ms / 1000
+        self.throttle = throttle
+        self.retry_after = retry_after
+        self.rate_limit = rate_limit
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.window = []
+        self.stats = {"requests": 0, "pages_served": 0, "pages_updated": 0, "throttled": 0}
+
+    def should_throttle(self):
+        with self.lock:
+            self.stats["requests"] += 1
+            now = time.monotonic()
+            if self.rate_limit:
+                self.window = [t for t in self.window if now - t < 1.0]
+                if len(self.window) >= self.rate_limit:
+                    self.stats["throttled"] += 1
+                    return True
+                self.window.append(now)
+            if self.throttle and self.rng.random() < self.throttle:
+                self.stats["throttled"] += 1
+                return True
+            return False
+
+
+class NotionStubHandler(BaseHTTPRequestHandler):
+    state = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_error_json(self, status, code, message, headers=None):
+        self.send_json(status, {"object": "error", "status": status, "code": code,
+                                "message": message}, headers)
+
+    def read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}") if length else {}
+
+    def gate(self):
+        """Apply latency and throttling. Returns False if the request was rejected."""
+        if self.state.latency:
+            time.sleep(self.state.latency)
+        if self.state.should_throttle():
+            self.send_error_json(429, "rate_limited", "Rate limited (stub)",
+                                 {"Retry-After": str(self.state.retry_after)})
+            return False
+        return True
+
+    def find_database(self, db_id):
+        wanted = db_id.replace("-", "")
+        for key, pages in self.state.databases.items():
+            if key.replace("-", "") == wanted:
+                return key, pages
+        self.send_error_json(404, "object_not_found", f"Could not find database with ID: {db_id}.")
+        return None, None
+
+    def do_GET(self):
+        if self.path == "/_stats":
+            with self.state.lock:
+                return self.send_json(200, dict(self.state.stats))
+        m = re.fullmatch(r"/v1/(databases|pages)/([\w-]+)", self.path)
+        if not m:
+            return self.send_error_json(404, "invalid_request_url", "Invalid request URL.")
+        if not self.gate():
+            return
+        if m.group(1) == "pages":
+            page = self.state.pages.get(m.group(2))
+            if not page:
+                return self.send_error_json(404, "object_not_found",
+                                            f"Could not find page with ID: {m.group(2)}.")
+            with self.state.lock:
+                self.state.stats["pages_served"] += 1
+            return self.send_json(200, page)
+        db_id, pages = self.find_database(m.group(2))
+        if db_id:
+            self.send_json(200, database_schema(db_id, pages))
+
+    def sort_key(self, sorts):
+        """Key ordering pages by timestamp sorts, then by position in the database."""
+        fields = []
+        for sort in sorts:
+            kind = sort["timestamp"]
+            if kind not in ("created_time", "last_edited_time"):
+                raise ValueError(kind)
+            fields.append((kind, -1 if sort.get("direction") == "descending" else 1))
+
+        def key(page):
+            return tuple(sign * parse_time(page[kind]).timestamp()
+                         for kind, sign in fields) + (self.state.positions[page["id"]],)
+        return key
+
+    def do_POST(self):
+        body = self.read_body()
+        m = re.fullmatch(r"/v1/databases/([\w-]+)/query(?:\?(.*))?", self.path)
+        if not m:
+            return self.send_error_json(404, "invalid_request_url", "Invalid request URL.")
+        if not self.gate():
+            return
+        db_id, pages = self.find_database(m.group(1))
+        if not db_id:
+            return
+
+        try:
+            selected = [p for p in pages if matches(p, body.get("filter"))]
+        except (KeyError, ValueError) as e:
+            return self.send_error_json(400, "validation_error", f"Unsupported filter: {e}")
+        try:
+            sort_key = self.sort_key(body.get("sorts") or [])
+        except (KeyError, ValueError) as e:
+            return self.send_error_json(400, "validation_error", f"Unsupported sort: {e}")
+        selected.sort(key=sort_key)
+        page_size = min(int(body.get("page_size") or MAX_PAGE_SIZE), MAX_PAGE_SIZE)
+        # Like Notion, the cursor is the id of the next result, so pages that
+        # drop out of the filter behind it (e.g. marked Synced) do not shift it
+        cursor = body.get("start_cursor")
+        if cursor:
+            if cursor not in self.state.pages:
+                return self.send_error_json(400, "validation_error",
+                                            f"start_cursor {cursor} is invalid")
+            start = sort_key(self.state.pages[cursor])
+            selected = [p for p in selected if sort_key(p) >= start]
+        property_ids = set(parse_qs(m.group(2) or "").get("filter_properties", []))
+        chunk = [project(p, property_ids) for p in selected[:page_size]]
+        has_more = len(selected) > page_size
+        with self.state.lock:
+            self.state.stats["pages_served"] += len(chunk)
+        self.send_json(200, {
+            "object": "list",
+            "results": chunk,
+            "has_more": has_more,
+            "next_cursor": selected[page_size]["id"] if has_more else None,
+        })
+
+    def do_PATCH(self):
+        body = self.read_body()
+        m = re.fullmatch(r"/v1/pages/([\w-]+)", self.path)
+        if not m:
+            return self.send_error_json(404, "invalid_request_url", "Invalid request URL.")
+        if not self.gate():
+            return
+        page = self.state.pages.get(m.group(1))
+        if not page:
+            return self.send_error_json(404, "object_not_found",
+                                        f"Could not find page with ID: {m.group(1)}.")
+        updates = body.get("properties") or {}
+        for name, value in updates.items():
+            if name not in page["properties"] or "checkbox" not in value:
+                return self.send_error_json(400, "validation_error",
+                                            f"Unsupported property update: {name}")
+        with self.state.lock:
+            for name, value in updates.items():
+                page["properties"][name]["checkbox"] = bool(value["checkbox"])
+            # Like Notion, an edit moves last_edited_time (and so Finished)
+            now = notion_time(datetime.now(timezone.utc))
+            page["last_edited_time"] = now
+            page["properties"]["Finished"]["last_edited_time"] = now
+            self.state.stats["pages_updated"] += 1
+        self.send_json(200, page)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local Notion API stand-in for sync benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--pages", type=int, default=500,
+                        help="Synthetic pages per database. Default: 500.")
+    parser.add_argument("--days", type=int, default=365,
+                        help="Spread synthetic pages over this many past days. Default: 365.")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--fixtures", type=str, default=None,
+                        help="Serve pages from this JSON file ({database_id: [page, ...]})")
+    parser.add_argument("--dump", type=str, default=None,
+                        help="Write the generated pages to this JSON file and exit")
+    parser.add_argument("--latency-ms", type=float, default=0,
+                        help="Delay added to every request. Default: 0.")
+    parser.add_argument("--throttle", type=float, default=0,
+                        help="Fraction of requests answered with 429. Default: 0.")
+    parser.add_argument("--rate-limit", type=int, default=0,
+                        help="Answer 429 beyond this many requests/second (0 = off).")
+    parser.add_argument("--retry-after", type=float, default=1,
+                        help="Retry-After seconds sent with 429s. Default: 1.")
+    args = parser.parse_args()
+
+    if args.fixtures:
+        with open(args.fixtures, "r") as f:
+            databases = json.load(f)
+    else:
+        databases = generate_pages(registry.load_or_config(), args.pages, args.days, args.seed)
+
+    if args.dump:
+        with open(args.dump, "w") as f:
+            json.dump(databases, f)
+        print(json.dumps({"databases": len(databases),
+                          "pages": sum(len(p) for p in databases.values())}))
+        return
+
+    NotionStubHandler.state = StubState(databases, args.latency_ms, args.throttle,
+                                        args.retry_after, args.rate_limit, args.seed)
+    server = ThreadingHTTPServer((args.host, args.port), NotionStubHandler)
+    total = sum(len(p) for p in databases.values())
+    print(f"Notion stub serving {total} pages in {len(databases)} databases "
+          f"at http://{args.host}:{server.server_port}/v1", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(json.dumps(NotionStubHandler.state.stats), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,10 +5,47 @@ Notion Activity Timer → PostgreSQL activity_logs sync.
 Reads completed (Done=true) sessions from per-kid Notion timer databases
 and inserts them into the PostgreSQL activity_logs table.
 
-Duplicate prevention is handled via a unique notion_page_id column in the DB,
-so re-running the sync for the same date is safe.
-
-Each kid has their own Notion database (no "Who" field needed):
+Duplicate prevention is handled via a unique (notion_page_id, activity_date)
+index in the DB, so re-running the sync for the same date is safe.
+
+Only pages with Synced=false are read. After each batch commits, its pages
+get Synced=true through concurrent, rate-limited PATCHes, so every run only
+downloads new work. PATCHes that fail are kept in notion_sync_retry and
+retried at the start of the next run. Ticking Synced also moves the page's
+Finished (last_edited_time), so a page is parsed only before it is marked;
+--include-synced re-reads marked pages, but their rows already exist and
+are skipped as duplicates.
+
+Pages are streamed: each response of a database query is parsed and
+written before the next one is requested, and Notion is asked for only
+the properties parse_entry reads (ENTRY_PROPERTIES, via filter_properties),
+so memory stays at one response (100 pages) however long the history.
+
+--pipeline runs the stages concurrently instead: one fetch thread per
+database, a parse thread, the writer (which owns the connection) and a
+thread that marks committed batches Synced, linked by bounded queues
+(pipeline.py). The database sits idle less while Notion paginates and
+the other way round; throughput is set by the slowest stage. An error in
+any stage stops the others and fails the run; batches already committed
+stay committed.
+
+--all --shards N splits each database's history, from its oldest completed
+page to today, into --shard-days windows on created_time and runs N of
+them at once through the --pipeline stages. A single cursor chain cannot
+be parallelised; windows can. All shards share the client's rate limit,
+and a page id seen in two shards is written once.
+
+Progress is checkpointed after every committed batch (notion_sync_checkpoint):
+each database's, or shard's, next_cursor, or that it is done. If a run
+dies, --resume with the same options continues from there instead of
+paging through everything again; a finished run clears its checkpoints.
+
+--incremental keeps a per-database watermark (latest last_edited_time seen)
+in notion_sync_state and only asks Notion for pages edited since then, minus
+a small overlap, so late finishes and edits are caught without a full scan.
+
+Each kid has their own Notion database (no "Who" field needed), listed in
+the registry (registry.py) along with their subjects, workouts and aliases:
   - Yewoo Timer (child_id=1)
   - Yeseo Timer (child_id=2)
 
@@ -17,84 +54,177 @@ Usage:
     python notion_sync.py --dry-run             # preview without writing
     python notion_sync.py --date 2026-02-15     # sync entries for a specific date
     python notion_sync.py --all                 # sync ALL completed entries regardless of date
+    python notion_sync.py --all --batch-size 500   # larger INSERT batches for backfills
+    python notion_sync.py --incremental         # only pages edited since the last incremental run
+    python notion_sync.py --all --include-synced   # also re-read pages already marked Synced
+    python notion_sync.py --all --pipeline      # overlap Notion fetches, parsing and DB writes
+    python notion_sync.py --all --shards 4      # backfill 30-day created_time shards, 4 at a time
+    python notion_sync.py --all --shards 4 --resume   # continue an interrupted backfill
 """
 
 import argparse
+import itertools
 import json
-import os
+import queue
 import sys
-from datetime import datetime, date, timedelta
+import threading
+from datetime import datetime, date, timedelta, timezone
 
 import requests
-import psycopg2
+from psycopg2.extras import execute_values
 
-from config import DB_CONFIG, NOTION_DB_IDS, CHILDREN, MAX_DURATION
+import notion_client
+import registry
+from db import get_connection, release_connection
+from notion_client import NOTION_API_KEY
+from partition import drop_archived, ensure_future_partitions
+from pipeline import DONE, Pipeline
+from rollup import add_to_rollup
+from sync_state import (clear_checkpoints, clear_failed_marks, ensure_state_table,
+                        load_checkpoints, load_failed_marks, load_watermarks, queue_marks,
+                        save_checkpoints, save_failed_marks, save_watermark, start_checkpoints)
 
-NOTION_API_KEY = os.environ.get("NOTION_API_KEY", "")
-NOTION_VERSION = "2022-06-28"
-NOTION_BASE = "https://api.notion.com/v1"
-SUBJECTS_FILE = os.path.join(os.path.dirname(__file__), "subjects.json")
+DEFAULT_BATCH_SIZE = 200
+# Notion reports last_edited_time to the minute, so re-read a little before the mark
+DEFAULT_OVERLAP_MINUTES = 10
 
+DEFAULT_SHARD_DAYS = 30
 
-def load_subjects():
-    with open(SUBJECTS_FILE, "r") as f:
-        data = json.load(f)
-    subject_ids = {int(k): v for k, v in data["subject_ids"].items()}
-    workout_ids = {int(k): v for k, v in data["workout_ids"].items()}
-    aliases = data.get("activity_aliases", {})
-    return subject_ids, workout_ids, aliases
+# Query responses each fetch worker may get ahead of the writer
+PREFETCH_RESPONSES = 2
 
+# --pipeline queue bounds: pages waiting to be parsed, batches waiting to be marked
+PIPELINE_PAGES = 200  # two query responses
+PIPELINE_MARK_BATCHES = 2
+
+# Page properties parse_entry reads; the rest (formulas etc.) are not fetched
+ENTRY_PROPERTIES = ("Activity", "Subject", "Created", "Finished", "Notes")
+
+_property_ids = {}
+_property_ids_lock = threading.Lock()
 
-def notion_headers():
-    return {
-        "Authorization": f"Bearer {NOTION_API_KEY}",
-        "Notion-Version": NOTION_VERSION,
-        "Content-Type": "application/json",
-    }
 
+def parse_notion_time(value):
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
 
-def query_completed_entries(db_id, target_date=None):
-    """Query a Notion database for completed (Done=true) entries."""
-    url = f"{NOTION_BASE}/databases/{db_id}/query"
 
+def entry_property_ids(db_id):
+    """Ids of ENTRY_PROPERTIES in a database's schema (cached per database).
+
+    filter_properties takes property ids, which stay the same when a
+    property is renamed. Properties missing from the schema are left out.
+    """
+    with _property_ids_lock:
+        if db_id in _property_ids:
+            return _property_ids[db_id]
+    schema = notion_client.get_database(db_id).get("properties", {})
+    ids = [schema[name]["id"] for name in ENTRY_PROPERTIES if name in schema]
+    with _property_ids_lock:
+        _property_ids[db_id] = ids
+    return ids
+
+
+def completed_filters(include_synced=False):
+    """Filter conditions for completed (Done=true) pages, not yet Synced by default."""
     filters = [
         {"property": "Done", "checkbox": {"equals": True}},
     ]
+    if not include_synced:
+        filters.append({"property": "Synced", "checkbox": {"equals": False}})
+    return filters
+
+
+def query_completed_pages(db_id, target_date=None, edited_since=None, include_synced=False,
+                          created_range=None, start_cursor=None):
+    """Yield (pages, next_cursor) for each response of a query for completed
+    (Done=true) pages not yet Synced, as each response arrives.
+
+    Pages carry only ENTRY_PROPERTIES. target_date limits to pages created
+    that day and created_range (first_day, end_day) to pages created on or
+    after first_day and before end_day (UTC); edited_since (a datetime)
+    limits to pages last edited at or after it. include_synced also
+    returns pages already marked Synced. start_cursor continues from a
+    saved next_cursor; if Notion rejects it, the query starts over.
+    """
+    filters = completed_filters(include_synced)
 
     if target_date:
-        next_day = target_date + timedelta(days=1)
+        created_range = (target_date, target_date + timedelta(days=1))
+    if created_range:
+        first_day, end_day = created_range
         filters.append({
             "timestamp": "created_time",
-            "created_time": {"on_or_after": f"{target_date}T00:00:00"},
+            "created_time": {"on_or_after": f"{first_day}T00:00:00"},
         })
         filters.append({
             "timestamp": "created_time",
-            "created_time": {"before": f"{next_day}T00:00:00"},
+            "created_time": {"before": f"{end_day}T00:00:00"},
         })
 
-    body = {"filter": {"and": filters}}
-
-    entries = []
-    has_more = True
-    start_cursor = None
+    if edited_since:
+        filters.append({
+            "timestamp": "last_edited_time",
+            "last_edited_time": {"on_or_after": edited_since.isoformat()},
+        })
 
-    while has_more:
-        if start_cursor:
-            body["start_cursor"] = start_cursor
-        resp = requests.post(url, headers=notion_headers(), json=body)
-        resp.raise_for_status()
-        data = resp.json()
-        entries.extend(data.get("results", []))
-        has_more = data.get("has_more", False)
-        start_cursor = data.get("next_cursor")
+    body = {"filter": {"and": filters}}
+    property_ids = entry_property_ids(db_id)
+    responses = notion_client.iter_query(db_id, body, property_ids, start_cursor)
+    if start_cursor:
+        try:
+            first = next(responses)
+        except requests.HTTPError as e:
+            if e.response is None or e.response.status_code != 400:
+                raise
+            print(f"Saved cursor for {db_id} was rejected ({e}); reading from the start",
+                  file=sys.stderr)
+            responses = notion_client.iter_query(db_id, body, property_ids)
+        else:
+            responses = itertools.chain([first], responses)
+    yield from responses
+
+
+def query_completed_entries(db_id, *args, **kwargs):
+    """Yield the pages of query_completed_pages one at a time."""
+    for results, _ in query_completed_pages(db_id, *args, **kwargs):
+        yield from results
+
+
+def first_completed_day(db_id, include_synced=False):
+    """UTC creation day of the oldest page query_completed_entries would return, or None."""
+    body = {
+        "filter": {"and": completed_filters(include_synced)},
+        "sorts": [{"timestamp": "created_time", "direction": "ascending"}],
+        "page_size": 1,
+    }
+    results = notion_client.post(f"/databases/{db_id}/query", body).get("results", [])
+    if not results:
+        return None
+    return parse_notion_time(results[0]["created_time"]).astimezone(timezone.utc).date()
 
-    return entries
 
+def plan_shards(reg, shard_days, include_synced=False):
+    """Split each database's history, from its oldest completed page to
+    today (UTC), into shard_days-long created_time windows.
 
-def parse_entry(entry, child_id, subject_ids, workout_ids, aliases):
-    """Parse a Notion page into an activity_logs-ready dict."""
+    Returns [(child_id, db_id, (first_day, end_day))], oldest window first.
+    """
+    today = datetime.now(timezone.utc).date()
+    shards = []
+    for child_id, db_id in reg.notion_db_ids.items():
+        first_day = first_completed_day(db_id, include_synced)
+        while first_day and first_day <= today:
+            end_day = first_day + timedelta(days=shard_days)
+            shards.append((child_id, db_id, (first_day, end_day)))
+            first_day = end_day
+    shards.sort(key=lambda shard: shard[2])
+    return shards
+
+
+def parse_entry(entry, child_id, reg):
+    """Parse a Notion page into an activity_logs-ready dict using a registry.Registry."""
     props = entry["properties"]
-    who = CHILDREN[child_id]
+    who = reg.children[child_id]
 
     # Subject: prefer Subject select, fall back to Activity title
     subj_sel = props.get("Subject", {}).get("select")
@@ -103,31 +233,13 @@ def parse_entry(entry, child_id, subject_ids, workout_ids, aliases):
     if not subject_name:
         title_parts = props.get("Activity", {}).get("title", [])
         raw_title = "".join(p.get("plain_text", "") for p in title_parts).strip()
-        subject_name = aliases.get(raw_title, raw_title)
-
-    # Infer category from subject
-    category = None
-    if subject_name == "Rest":
-        category = "Rest"
-    elif subject_name in workout_ids.get(child_id, {}):
-        category = "Workout"
-    elif subject_name in subject_ids.get(child_id, {}):
-        category = "Study"
-
-    if not category:
-        return None, f"Cannot infer category for subject: {subject_name}"
+        subject_name = reg.resolve_alias(child_id, raw_title)
 
-    # Map subject → subject_id / workout_id
-    subject_id = None
-    workout_id = None
-    if category == "Study":
-        subject_id = subject_ids.get(child_id, {}).get(subject_name)
-        if subject_id is None:
-            return None, f"Unknown study subject for {who}: {subject_name}"
-    elif category == "Workout":
-        workout_id = workout_ids.get(child_id, {}).get(subject_name)
-        if workout_id is None:
-            return None, f"Unknown workout for {who}: {subject_name}"
+    # Infer category and subject_id / workout_id from the subject name
+    known = reg.lookup(child_id, subject_name)
+    if not known:
+        return None, f"Cannot infer category for subject: {subject_name}"
+    category, subject_id, workout_id = known
 
     # Created (auto-set, tamper-proof) and Finished (last_edited_time)
     start_str = props.get("Created", {}).get("created_time")
@@ -136,14 +248,14 @@ def parse_entry(entry, child_id, subject_ids, workout_ids, aliases):
     if not start_str or not end_str:
         return None, "Missing Created or Finished time"
 
-    start_dt = datetime.fromisoformat(start_str.replace("Z", "+00:00"))
-    end_dt = datetime.fromisoformat(end_str.replace("Z", "+00:00"))
+    start_dt = parse_notion_time(start_str)
+    end_dt = parse_notion_time(end_str)
     actual_minutes = int((end_dt - start_dt).total_seconds() / 60)
 
     if actual_minutes <= 0:
         return None, f"Invalid duration: {actual_minutes} minutes"
 
-    max_dur = MAX_DURATION.get(child_id, 120)
+    max_dur = reg.max_duration[child_id]
     if actual_minutes > max_dur:
         return None, f"Duration {actual_minutes}min exceeds max {max_dur}min for {who}"
 
@@ -172,40 +284,480 @@ def parse_entry(entry, child_id, subject_ids, workout_ids, aliases):
     }, None
 
 
-def insert_activity_log(conn, record):
-    """Insert one record into activity_logs. Skips duplicates via notion_page_id.
-    Returns the new log_id, or None if it was a duplicate."""
+def insert_activity_logs(conn, records):
+    """Insert a batch of records into activity_logs with one multi-row INSERT.
+    Skips duplicates via (notion_page_id, activity_date), which stays unique
+    when activity_logs is partitioned by date, and pages whose partition
+    was archived; new rows are also added to daily_rollup in the same
+    transaction. Does not commit.
+    Returns {page_id: log_id} for the rows that were new."""
+    unique = {}
+    for record in drop_archived(conn, records):
+        unique.setdefault(record["page_id"], record)
+    if not unique:
+        return {}
+
     sql = """
         INSERT INTO activity_logs
             (child_id, category, subject_id, workout_id,
              activity_date, actual_minutes, deviation_reason, notion_page_id)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-        ON CONFLICT (notion_page_id) DO NOTHING
-        RETURNING log_id
+        VALUES %s
+        ON CONFLICT (notion_page_id, activity_date) DO NOTHING
+        RETURNING notion_page_id, log_id
     """
+    rows = [(
+        r["child_id"],
+        r["category"],
+        r["subject_id"],
+        r["workout_id"],
+        r["activity_date"],
+        r["actual_minutes"],
+        r["deviation_reason"],
+        r["page_id"],
+    ) for r in unique.values()]
     with conn.cursor() as cur:
-        cur.execute(sql, (
-            record["child_id"],
-            record["category"],
-            record["subject_id"],
-            record["workout_id"],
-            record["activity_date"],
-            record["actual_minutes"],
-            record["deviation_reason"],
-            record["page_id"],
-        ))
-        row = cur.fetchone()
-        return row[0] if row else None
-
-
-def main():
+        inserted = dict(execute_values(cur, sql, rows, page_size=len(rows), fetch=True))
+    add_to_rollup(conn, [r for page_id, r in unique.items() if page_id in inserted])
+    return inserted
+
+
+def insert_activity_log(conn, record):
+    """Insert one record into activity_logs. Skips duplicates via notion_page_id.
+    New rows are also added to daily_rollup in the same transaction.
+    Returns the new log_id, or None if it was a duplicate."""
+    return insert_activity_logs(conn, [record]).get(record["page_id"])
+
+
+def write_batch(conn, batch, synced):
+    """Insert and commit one batch, logging each row as synced or duplicate."""
+    inserted = insert_activity_logs(conn, batch)
+    conn.commit()
+    for record in batch:
+        who = record["who"]
+        log_id = inserted.pop(record["page_id"], None)
+        if log_id:
+            print(f"  SYNCED {who} | {record['category']} | "
+                  f"{record['subject_name'] or 'N/A'} | "
+                  f"{record['actual_minutes']}min → log_id={log_id}")
+            synced.append({
+                "who": who,
+                "category": record["category"],
+                "subject": record["subject_name"],
+                "minutes": record["actual_minutes"],
+                "date": str(record["activity_date"]),
+                "log_id": log_id,
+            })
+        else:
+            print(f"  SKIP (duplicate) {who} | {record['category']} | "
+                  f"{record['subject_name'] or 'N/A'} | "
+                  f"{record['actual_minutes']}min")
+
+
+def mark_synced(page_ids, workers=notion_client.MAX_WORKERS):
+    """Set Synced=true on each page concurrently (within the client's rate limit).
+
+    Returns {page_id: error message} for the PATCHes that failed. A page
+    that no longer exists counts as done.
+    """
+    def patch(page_id):
+        try:
+            notion_client.update_page(page_id, {"Synced": {"checkbox": True}})
+        except requests.HTTPError as e:
+            if e.response is not None and e.response.status_code == 404:
+                return None
+            return str(e)
+        except requests.RequestException as e:
+            return str(e)
+        return None
+
+    results = notion_client.map_concurrently(patch, [(p, p) for p in page_ids], workers)
+    return {page_id: err for page_id, err in results.items() if err}
+
+
+def mark_batch_synced(conn, page_ids, marks, workers=notion_client.MAX_WORKERS, queued=False):
+    """mark_synced a committed batch; failures go to the retry table (committed).
+
+    queued: the pages were put in the retry table by queue_marks, so the
+    ones marked now are taken out again. Adds to marks["marked"] /
+    marks["mark_failed"].
+    """
+    page_ids = list(dict.fromkeys(page_ids))
+    failed = mark_synced(page_ids, workers)
+    if queued:
+        clear_failed_marks(conn, [p for p in page_ids if p not in failed])
+    if failed:
+        save_failed_marks(conn, failed)
+    if failed or queued:
+        conn.commit()
+        for page_id, err in failed.items():
+            print(f"  MARK FAILED {page_id[:8]}...: {err}", file=sys.stderr)
+    marks["marked"] += len(page_ids) - len(failed)
+    marks["mark_failed"] += len(failed)
+
+
+def retry_failed_marks(conn, marks, workers=notion_client.MAX_WORKERS):
+    """Re-send the Synced PATCHes left over from earlier runs."""
+    pending = load_failed_marks(conn)
+    if not pending:
+        return
+    print(f"Retrying {len(pending)} Synced update(s) from earlier runs...")
+    failed = mark_synced(pending, workers)
+    clear_failed_marks(conn, [p for p in pending if p not in failed])
+    if failed:
+        save_failed_marks(conn, failed)
+    conn.commit()
+    marks["marked"] += len(pending) - len(failed)
+    marks["mark_failed"] += len(failed)
+
+
+def preview_record(record, synced):
+    """--dry-run: print a parsed record and count it as synced."""
+    print(f"  [DRY RUN] {record['who']} | {record['category']} | "
+          f"{record['subject_name'] or 'N/A'} | "
+          f"{record['actual_minutes']}min | {record['activity_date']}")
+    synced.append({
+        "who": record["who"],
+        "category": record["category"],
+        "subject": record["subject_name"],
+        "minutes": record["actual_minutes"],
+        "date": str(record["activity_date"]),
+    })
+
+
+def skip_entry(page_id, who, err, errors):
+    errors.append({"page_id": page_id, "who": who, "error": err})
+    print(f"  SKIP {page_id[:8]}...: {err}")
+
+
+class Progress:
+    """Checkpoints of one run (--resume), saved after each committed batch.
+
+    read() and finished() note how far each source has been read; once
+    the rows read so far are committed, committed() saves that as the
+    source's next_cursor (or done), together with the batch's pages as
+    waiting for their Synced PATCH, so a resumed run neither re-reads
+    committed pages nor leaves them unmarked. Disabled for --dry-run.
+    """
+
+    def __init__(self, conn, run_key, enabled=True):
+        self.conn = conn
+        self.run_key = run_key
+        self.enabled = enabled
+        self.pending = {}
+
+    def read(self, source, next_cursor):
+        self.pending[source] = (next_cursor, False)
+
+    def finished(self, source):
+        self.pending[source] = (None, True)
+
+    def committed(self, page_ids):
+        if not self.enabled or not (self.pending or page_ids):
+            return
+        queue_marks(self.conn, page_ids)
+        save_checkpoints(self.conn, self.run_key, self.pending)
+        self.conn.commit()
+        self.pending.clear()
+
+
+def prefetch(pipe, sources, workers, depth=PREFETCH_RESPONSES):
+    """Yield (source, (entries, next_cursor)) for each query_completed_pages
+    response in the order they arrive, then (source, None) once a source
+    is finished.
+
+    workers threads take sources in order and fetch them concurrently,
+    at most depth responses per worker ahead of the consumer, so memory
+    stays at a few responses however large the databases are. A fetch
+    error stops the pipe and is re-raised when it is left.
+    """
+    pending = queue.Queue()
+    for source in sources:
+        pending.put(source)
+    workers = max(1, min(workers, len(sources)))
+    responses = pipe.queue(depth * workers)
+
+    def fetch():
+        while True:
+            try:
+                source = pending.get_nowait()
+            except queue.Empty:
+                break
+            _, _, db_id, query_args = source
+            for response in query_completed_pages(db_id, **query_args):
+                pipe.put(responses, (source, response))
+            pipe.put(responses, (source, None))
+        pipe.put(responses, DONE)
+
+    for i in range(workers):
+        pipe.spawn(f"prefetch-{i}", fetch)
+    remaining = workers
+    while remaining:
+        item = pipe.get(responses)
+        if item is DONE:
+            remaining -= 1
+        else:
+            yield item
+
+
+def sync_sequential(conn, reg, args, sources, synced, errors, marks, progress):
+    """Parse and write the query responses of every database on this thread.
+
+    sources is [(source, child_id, db_id, query_completed_pages kwargs)].
+    Up to args.workers sources are fetched concurrently (see prefetch).
+    """
+    batch = []
+    found = {}
+    latest_edit = {}
+
+    def flush():
+        if batch:
+            write_batch(conn, batch, synced)
+        page_ids = [r["page_id"] for r in batch]
+        progress.committed(page_ids)
+        if page_ids:
+            mark_batch_synced(conn, page_ids, marks, args.workers, progress.enabled)
+        batch.clear()
+
+    with Pipeline() as pipe:
+        for (source, child_id, db_id, _), response in prefetch(pipe, sources, args.workers):
+            who = reg.children[child_id]
+            if response is None:
+                progress.finished(source)
+                if not args.dry_run:
+                    flush()
+                print(f"{who}: found {found.get(source, 0)} completed entries.")
+
+                # Advance the watermark only once this database's rows are committed
+                if args.incremental and not args.dry_run and latest_edit.get(source):
+                    save_watermark(conn, db_id, latest_edit[source])
+                    conn.commit()
+                continue
+
+            entries, next_cursor = response
+            for entry in entries:
+                found[source] = found.get(source, 0) + 1
+                if entry.get("last_edited_time"):
+                    edited = parse_notion_time(entry["last_edited_time"])
+                    latest_edit[source] = max(latest_edit.get(source) or edited, edited)
+
+                record, err = parse_entry(entry, child_id, reg)
+                if err:
+                    skip_entry(entry["id"], who, err, errors)
+                    continue
+
+                if args.dry_run:
+                    preview_record(record, synced)
+                else:
+                    batch.append(record)
+                    if len(batch) >= args.batch_size:
+                        flush()
+            if next_cursor:
+                progress.read(source, next_cursor)
+
+
+# ---------------------------------------------------------------------------
+# Pipelined sync (--pipeline)
+# ---------------------------------------------------------------------------
+
+def fetch_stage(pipe, sources, pages):
+    """Take sources until none are left and stream each one into pages:
+    ("page", child_id, entry) for every page, ("cursor", child_id,
+    (source, next_cursor)) after each response but the last, then
+    ("done", child_id, (source, db_id, created_range, found, latest
+    last_edited_time))."""
+    while True:
+        try:
+            source, child_id, db_id, query_args = sources.get_nowait()
+        except queue.Empty:
+            return
+        found = 0
+        latest_edit = None
+        for entries, next_cursor in query_completed_pages(db_id, **query_args):
+            for entry in entries:
+                found += 1
+                if entry.get("last_edited_time"):
+                    edited = parse_notion_time(entry["last_edited_time"])
+                    latest_edit = max(latest_edit or edited, edited)
+                pipe.put(pages, ("page", child_id, entry))
+            if next_cursor:
+                pipe.put(pages, ("cursor", child_id, (source, next_cursor)))
+        pipe.put(pages, ("done", child_id, (source, db_id, query_args.get("created_range"),
+                                            found, latest_edit)))
+
+
+def parse_stage(pipe, pages, records, reg, sources, dedup=False):
+    """parse_entry each page into records as ("record", record) or
+    ("error", child_id, (page_id, message)); "cursor" and "done" items pass
+    through in order, and DONE follows the last of the sources. With
+    dedup, a page id already seen from another source is dropped."""
+    seen = set()
+    remaining = sources
+    while remaining:
+        kind, child_id, value = pipe.get(pages)
+        if kind != "page":
+            remaining -= kind == "done"
+            pipe.put(records, (kind, child_id, value))
+            continue
+        if dedup:
+            if value["id"] in seen:
+                continue
+            seen.add(value["id"])
+        record, err = parse_entry(value, child_id, reg)
+        if err:
+            pipe.put(records, ("error", child_id, (value["id"], err)))
+        else:
+            pipe.put(records, ("record", child_id, record))
+    pipe.put(records, DONE)
+
+
+def mark_stage(pipe, to_mark, marks, workers, queued):
+    """mark_batch_synced each committed batch of page ids, on its own connection."""
+    conn = get_connection()
+    try:
+        for page_ids in iter(lambda: pipe.get(to_mark), DONE):
+            mark_batch_synced(conn, page_ids, marks, workers, queued)
+    finally:
+        release_connection(conn)
+
+
+def sync_pipelined(conn, reg, args, sources, synced, errors, marks, progress, fetchers=None,
+                   dedup=False):
+    """Fetch, parse and write (this thread) concurrently.
+
+    sources is [(source, child_id, db_id, query_completed_pages kwargs)]:
+    whole databases, or date shards of them. fetchers threads (default
+    one per source) take sources in order; with dedup, a page returned by
+    more than one source is only written once. Committed batches are
+    marked Synced by a fourth stage. The queues between stages are
+    bounded, so a slow stage holds the others back instead of letting
+    pages pile up, and an error in any stage stops them all and is
+    re-raised here.
+    """
+    pending = queue.Queue()
+    for source in sources:
+        pending.put(source)
+    fetchers = max(1, min(fetchers or len(sources), len(sources)))
+
+    with Pipeline() as pipe:
+        pages = pipe.queue(PIPELINE_PAGES)
+        records = pipe.queue(args.batch_size)
+        to_mark = pipe.queue(PIPELINE_MARK_BATCHES)
+        for i in range(fetchers):
+            pipe.spawn(f"fetch-{i}", fetch_stage, pipe, pending, pages)
+        pipe.spawn("parse", parse_stage, pipe, pages, records, reg, len(sources), dedup)
+        if not args.dry_run:
+            pipe.spawn("mark", mark_stage, pipe, to_mark, marks, args.workers, progress.enabled)
+
+        batch = []
+
+        def flush():
+            if batch:
+                write_batch(conn, batch, synced)
+            page_ids = [r["page_id"] for r in batch]
+            progress.committed(page_ids)
+            if page_ids:
+                pipe.put(to_mark, page_ids)
+            batch.clear()
+
+        for kind, child_id, value in iter(lambda: pipe.get(records), DONE):
+            if kind == "record":
+                if args.dry_run:
+                    preview_record(value, synced)
+                    continue
+                batch.append(value)
+                if len(batch) >= args.batch_size:
+                    flush()
+            elif kind == "error":
+                skip_entry(value[0], reg.children[child_id], value[1], errors)
+            elif kind == "cursor":
+                progress.read(*value)
+            else:
+                source, db_id, created_range, found, latest_edit = value
+                progress.finished(source)
+                shard = f" created {created_range[0]}..{created_range[1]}" if created_range else ""
+                print(f"{reg.children[child_id]}: found {found} completed entries{shard}.")
+                # Advance the watermark only once this database's rows are committed
+                if args.incremental and not args.dry_run and latest_edit:
+                    flush()
+                    save_watermark(conn, db_id, latest_edit)
+                    conn.commit()
+
+        if not args.dry_run:
+            flush()
+            pipe.put(to_mark, DONE)
+
+
+def run_key(args, target_date):
+    """Names a run for its checkpoints: runs with the same key resume each other."""
+    if args.incremental:
+        key = "incremental"
+    elif args.shards:
+        key = f"all/shards:{args.shard_days}"
+    elif target_date:
+        key = f"date:{target_date}"
+    else:
+        key = "all"
+    return key + "/include-synced" if args.include_synced else key
+
+
+def resume_sources(reg, checkpoints, query_args):
+    """Sources left by an unfinished run, each continuing from its saved cursor."""
+    sources = []
+    for source, db_id, first_day, end_day, next_cursor, done in checkpoints:
+        child_id = reg.child_for_database(db_id)
+        if done or child_id is None:
+            continue
+        kwargs = dict(query_args(db_id), start_cursor=next_cursor)
+        if first_day:
+            kwargs["created_range"] = (first_day, end_day)
+        sources.append((source, child_id, db_id, kwargs))
+    return sources
+
+
+# ---------------------------------------------------------------------------
+# Main
+# ---------------------------------------------------------------------------
+
+def main(argv=None):
     parser = argparse.ArgumentParser(description="Sync Notion Activity Timer → PostgreSQL")
     parser.add_argument("--dry-run", action="store_true", help="Preview without writing")
     parser.add_argument("--date", type=str, default=None,
                         help="Sync entries for a specific date (YYYY-MM-DD)")
     parser.add_argument("--all", action="store_true",
                         help="Sync all completed entries regardless of date")
-    args = parser.parse_args()
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help=f"Rows per INSERT and commit. Default: {DEFAULT_BATCH_SIZE}.")
+    parser.add_argument("--workers", type=int, default=notion_client.MAX_WORKERS,
+                        help="Timer databases fetched concurrently, and "
+                             "concurrent Synced updates. "
+                             f"Default: {notion_client.MAX_WORKERS}.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Sync pages edited since each database's stored watermark")
+    parser.add_argument("--overlap-minutes", type=int, default=DEFAULT_OVERLAP_MINUTES,
+                        help="Minutes re-read before the watermark in --incremental mode. "
+                             f"Default: {DEFAULT_OVERLAP_MINUTES}.")
+    parser.add_argument("--include-synced", action="store_true",
+                        help="Also read pages already marked Synced. Their Finished time "
+                             "moved when they were marked, so only their page ids are "
+                             "reliable (existing rows are skipped as duplicates).")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="Fetch, parse and write concurrently through bounded queues")
+    parser.add_argument("--shards", type=int, default=0,
+                        help="With --all: split the history into created-date shards and "
+                             "fetch this many at once (implies --pipeline)")
+    parser.add_argument("--shard-days", type=int, default=DEFAULT_SHARD_DAYS,
+                        help=f"Days of history per shard. Default: {DEFAULT_SHARD_DAYS}.")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue an interrupted run with the same options from its "
+                             "last committed batch")
+    args = parser.parse_args(argv)
+
+    if args.incremental and (args.date or args.all):
+        parser.error("--incremental cannot be combined with --date or --all")
+    if args.shards and not args.all:
+        parser.error("--shards needs --all")
+    if args.shards < 0 or args.shard_days < 1:
+        parser.error("--shards and --shard-days must be positive")
 
     if not NOTION_API_KEY:
         print("Error: NOTION_API_KEY environment variable not set", file=sys.stderr)
@@ -215,75 +767,104 @@ def main():
     target_date = None
     if args.date:
         target_date = date.fromisoformat(args.date)
-    elif not args.all:
+    elif not args.all and not args.incremental:
         target_date = date.today()
 
-    date_label = str(target_date) if target_date else "all dates"
-
-    subject_ids, workout_ids, aliases = load_subjects()
+    if args.incremental:
+        date_label = "edited since last sync"
+    else:
+        date_label = str(target_date) if target_date else "all dates"
 
     synced = []
     errors = []
+    marks = {"marked": 0, "mark_failed": 0}
 
+    # A plain --dry-run only reads Notion, so it can run without a database
     conn = None
-    if not args.dry_run:
-        conn = psycopg2.connect(**DB_CONFIG)
-
     try:
-        for child_id, db_id in NOTION_DB_IDS.items():
-            who = CHILDREN[child_id]
-            print(f"Querying {who}'s timer for completed entries ({date_label})...")
+        conn = get_connection()
+    except Exception as e:
+        if not args.dry_run or args.incremental:
+            print(f"Database connection failed: {e}", file=sys.stderr)
+            sys.exit(1)
+        print(f"Database unavailable, using the registry in config.py: {e}", file=sys.stderr)
 
-            entries = query_completed_entries(db_id, target_date)
-            print(f"  Found {len(entries)} completed entries.")
-
-            for entry in entries:
-                record, err = parse_entry(entry, child_id, subject_ids, workout_ids, aliases)
-                if err:
-                    page_id = entry["id"]
-                    errors.append({"page_id": page_id, "who": who, "error": err})
-                    print(f"  SKIP {page_id[:8]}...: {err}")
-                    continue
-
-                if args.dry_run:
-                    print(f"  [DRY RUN] {who} | {record['category']} | "
-                          f"{record['subject_name'] or 'N/A'} | "
-                          f"{record['actual_minutes']}min | {record['activity_date']}")
-                    synced.append({
-                        "who": who,
-                        "category": record["category"],
-                        "subject": record["subject_name"],
-                        "minutes": record["actual_minutes"],
-                        "date": str(record["activity_date"]),
-                    })
-                else:
-                    log_id = insert_activity_log(conn, record)
-                    conn.commit()
-                    if log_id:
-                        print(f"  SYNCED {who} | {record['category']} | "
-                              f"{record['subject_name'] or 'N/A'} | "
-                              f"{record['actual_minutes']}min → log_id={log_id}")
-                        synced.append({
-                            "who": who,
-                            "category": record["category"],
-                            "subject": record["subject_name"],
-                            "minutes": record["actual_minutes"],
-                            "date": str(record["activity_date"]),
-                            "log_id": log_id,
-                        })
-                    else:
-                        print(f"  SKIP (duplicate) {who} | {record['category']} | "
-                              f"{record['subject_name'] or 'N/A'} | "
-                              f"{record['actual_minutes']}min")
+    try:
+        if conn:
+            reg = registry.load(conn)
+            conn.rollback()
+        else:
+            reg = registry.from_config()
+
+        # Fetcher threads and the Synced updates run at the same time
+        fetchers = args.shards or (len(reg.notion_db_ids) if args.pipeline else args.workers)
+        notion_client.set_max_connections(fetchers + args.workers)
+
+        if not args.dry_run:
+            ensure_future_partitions(conn)
+            ensure_state_table(conn)
+            conn.commit()
+            retry_failed_marks(conn, marks, args.workers)
+
+        edited_since = {}
+        if args.incremental:
+            overlap = timedelta(minutes=args.overlap_minutes)
+            edited_since = {db_id: mark - overlap
+                            for db_id, mark in load_watermarks(conn).items()}
+
+        print(f"Querying {len(reg.notion_db_ids)} timers for completed entries ({date_label})...")
+        def query_args(db_id):
+            return {"target_date": target_date, "edited_since": edited_since.get(db_id),
+                    "include_synced": args.include_synced}
+
+        key = run_key(args, target_date)
+        progress = Progress(conn, key, enabled=not args.dry_run)
+        checkpoints = load_checkpoints(conn, key) if args.resume and not args.dry_run else []
+        if checkpoints:
+            sources = resume_sources(reg, checkpoints, query_args)
+            print(f"Resuming {key}: {len(sources)} of {len(checkpoints)} sources left.")
+        else:
+            if args.resume:
+                print(f"No unfinished {key} run to resume; starting from the beginning.")
+            if args.shards:
+                shards = plan_shards(reg, args.shard_days, args.include_synced)
+                print(f"Backfilling in {len(shards)} shards of {args.shard_days} days, "
+                      f"{args.shards} at a time...")
+                sources = [(f"{db_id}/{created_range[0]}", child_id, db_id,
+                            dict(query_args(db_id), created_range=created_range))
+                           for child_id, db_id, created_range in shards]
+            else:
+                sources = [(db_id, child_id, db_id, query_args(db_id))
+                           for child_id, db_id in reg.notion_db_ids.items()]
+            if progress.enabled:
+                start_checkpoints(conn, key, [
+                    (source, db_id, *kwargs.get("created_range", (None, None)))
+                    for source, _, db_id, kwargs in sources])
+                conn.commit()
+
+        if args.shards:
+            sync_pipelined(conn, reg, args, sources, synced, errors, marks, progress,
+                           fetchers=args.shards, dedup=True)
+        elif args.pipeline:
+            sync_pipelined(conn, reg, args, sources, synced, errors, marks, progress)
+        else:
+            sync_sequential(conn, reg, args, sources, synced, errors, marks, progress)
+
+        if progress.enabled:
+            clear_checkpoints(conn, key)
+            conn.commit()
     finally:
         if conn:
-            conn.close()
+            release_connection(conn)
 
     result = {
         "synced": len(synced),
         "errors": len(errors),
         "details": synced,
         "error_details": errors if errors else None,
+        "marked_synced": marks["marked"],
+        "mark_failed": marks["mark_failed"],
+        "notion": notion_client.stats(),
     }
     print(json.dumps(result))
 
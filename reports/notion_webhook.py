@@ -0,0 +1,436 @@
+#!/usr/bin/env python3
+"""Notion webhook receiver: near-real-time activity_logs ingestion.
+
+serve runs a small HTTP server that accepts Notion page webhooks
+(page.created, page.properties_updated, page.undeleted) on /webhook. Each
+event only names the page, so the page id goes onto a bounded in-memory
+queue; repeated events for a page that is already queued are folded into
+one. A single writer thread takes up to --batch-size page ids (or what
+arrived within --flush-seconds), fetches those pages from Notion, runs
+Done pages through notion_sync.parse_entry and inserts them with
+notion_sync.write_batch: the same ON CONFLICT dedup, rollup update and one
+commit per batch as the nightly sync. Written pages are then marked
+Synced; the page event that PATCH triggers is fetched once and ignored,
+as are all pages already Synced. When the queue is full (or the writer
+thread has died) the server answers 503 and Notion redelivers later.
+
+Pages that fail to fetch or write are logged and dropped, as are pages
+still queued at shutdown; the nightly notion_sync.py run stays on as the
+reconciliation sweep and picks them up.
+
+If NOTION_WEBHOOK_SECRET (the subscription's verification_token) is set,
+requests must carry a valid X-Notion-Signature. The one-off verification
+request Notion sends when the subscription is created is logged so the
+token can be copied into the environment.
+
+GET /health returns queue depth, counters and the last error; it answers
+503 if the writer thread is no longer running.
+
+replay posts page events to a running server, signed like Notion's: either
+from a JSONL file of recorded events or, by default, one event per
+completed page in every registry database (point NOTION_BASE at
+notion_stub.py to replay synthetic pages locally).
+
+Usage:
+    python notion_webhook.py serve [--port 8080] [--batch-size 50] [--flush-seconds 2]
+    python notion_webhook.py replay [--url http://127.0.0.1:8080/webhook] [--file events.jsonl] [--rate 20]
+"""
+
+import argparse
+import hashlib
+import hmac
+import json
+import os
+import queue
+import signal
+import sys
+import threading
+import time
+import uuid
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import psycopg2
+import requests
+
+import notion_client
+import notion_sync
+import registry
+from db import get_connection, release_connection
+from partition import ensure_future_partitions
+
+WEBHOOK_SECRET = os.environ.get("NOTION_WEBHOOK_SECRET", "")
+WEBHOOK_PATH = "/webhook"
+DEFAULT_PORT = 8080
+DEFAULT_BATCH_SIZE = 50
+DEFAULT_FLUSH_SECONDS = 2.0
+DEFAULT_QUEUE_SIZE = 1000
+
+PAGE_EVENTS = {"page.created", "page.properties_updated", "page.undeleted"}
+
+
+def sign(body, secret):
+    return "sha256=" + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+
+def page_event(page, event_type="page.properties_updated"):
+    """A webhook event for a page, shaped like the ones Notion sends."""
+    return {
+        "id": str(uuid.uuid4()),
+        "timestamp": page.get("last_edited_time"),
+        "type": event_type,
+        "entity": {"id": page["id"], "type": "page"},
+        "data": {"parent": {"id": page.get("parent", {}).get("database_id"),
+                            "type": "database"}},
+    }
+
+
+# ---------------------------------------------------------------------------
+# Ingestion
+# ---------------------------------------------------------------------------
+
+class Ingestor:
+    """Bounded queue of page ids plus the writer loop that drains it."""
+
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE, flush_seconds=DEFAULT_FLUSH_SECONDS,
+                 queue_size=DEFAULT_QUEUE_SIZE):
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.pending = set()
+        self.registry = None
+        self.partitions_checked = None
+        self.stopping = threading.Event()
+        self.lock = threading.Lock()
+        self.writer = None
+        self.last_error = None
+        self.stats = {"received": 0, "ignored": 0, "rejected": 0, "batches": 0,
+                      "fetched": 0, "inserted": 0, "duplicates": 0, "marked": 0, "skipped": 0,
+                      "errors": 0}
+
+    def count(self, key, n=1):
+        with self.lock:
+            self.stats[key] += n
+
+    def snapshot(self):
+        with self.lock:
+            return {**self.stats, "queued": self.queue.qsize(),
+                    "writer_alive": self.writer_alive(), "last_error": self.last_error}
+
+    def writer_alive(self):
+        return self.writer is not None and self.writer.is_alive()
+
+    def failed(self, what, n, exc):
+        """Count n pages as errors and log why."""
+        message = f"{type(exc).__name__}: {exc}"
+        with self.lock:
+            self.stats["errors"] += n
+            self.last_error = f"{what}: {message}"
+        print(f"  {what} FAILED ({n} pages): {message}", file=sys.stderr)
+
+    def submit(self, page_id):
+        """Queue a page id. Returns False if the queue is full or nothing drains it."""
+        with self.lock:
+            self.stats["received"] += 1
+            if not self.writer_alive():
+                self.stats["rejected"] += 1
+                return False
+            if page_id in self.pending:
+                return True
+            try:
+                self.queue.put_nowait(page_id)
+            except queue.Full:
+                self.stats["rejected"] += 1
+                return False
+            self.pending.add(page_id)
+            return True
+
+    def known_database(self, database_id):
+        """False only when the parent is known not to be a timer database."""
+        reg = self.registry
+        return reg is None or not database_id or reg.child_for_database(database_id) is not None
+
+    def next_batch(self):
+        """Up to batch_size page ids, waiting at most flush_seconds after the first."""
+        try:
+            batch = [self.queue.get(timeout=0.5)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_seconds
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        with self.lock:
+            # A later event for these pages is queued again and re-fetched
+            self.pending.difference_update(batch)
+        return batch
+
+    def fetch(self, page_id):
+        try:
+            page = notion_client.get_page(page_id)
+        except requests.RequestException as e:
+            self.count("errors")
+            print(f"  FETCH FAILED {page_id[:8]}...: {e}", file=sys.stderr)
+            return None
+        self.count("fetched")
+        return page
+
+    def process(self, page_ids):
+        """Fetch, parse and write one batch of pages.
+
+        Any failure is counted and logged; the pages are left for the
+        nightly sweep and the writer carries on with the next batch.
+        """
+        conn = None
+        try:
+            pages = notion_client.map_concurrently(self.fetch, [(p, p) for p in page_ids])
+            conn = get_connection()
+            reg = self.registry = registry.load(conn)
+            if self.partitions_checked != date.today():
+                ensure_future_partitions(conn)
+                conn.commit()
+                self.partitions_checked = date.today()
+
+            records = []
+            for page_id, page in pages.items():
+                if page is None:
+                    continue
+                child_id = reg.child_for_database(page.get("parent", {}).get("database_id"))
+                props = page.get("properties", {})
+                done = props.get("Done", {}).get("checkbox")
+                synced = props.get("Synced", {}).get("checkbox")
+                if (child_id is None or not done or synced
+                        or page.get("archived") or page.get("in_trash")):
+                    self.count("ignored")
+                    continue
+                record, err = notion_sync.parse_entry(page, child_id, reg)
+                if err:
+                    self.count("skipped")
+                    print(f"  SKIP {page_id[:8]}...: {err}")
+                    continue
+                records.append(record)
+
+            if records:
+                synced = []
+                notion_sync.write_batch(conn, records, synced)
+                self.count("inserted", len(synced))
+                self.count("duplicates", len(records) - len(synced))
+                marks = {"marked": 0, "mark_failed": 0}
+                notion_sync.mark_batch_synced(conn, [r["page_id"] for r in records], marks)
+                self.count("marked", marks["marked"])
+            self.count("batches")
+        except Exception as e:
+            if conn is not None and not conn.closed:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    pass
+            self.failed("WRITE", len(page_ids), e)
+        finally:
+            if conn is not None:
+                release_connection(conn)
+        sys.stdout.flush()
+
+    def run(self):
+        """Writer loop; returns after the batch in progress when stop() is called.
+
+        Pages still queued then are left to the nightly sweep.
+        """
+        while not self.stopping.is_set():
+            batch = self.next_batch()
+            if not batch:
+                continue
+            try:
+                self.process(batch)
+            except Exception as e:  # keep the writer alive whatever happens
+                self.failed("BATCH", len(batch), e)
+
+    def start(self):
+        self.writer = threading.Thread(target=self.run, name="webhook-writer")
+        self.writer.start()
+
+    def stop(self):
+        self.stopping.set()
+
+
+# ---------------------------------------------------------------------------
+# HTTP server
+# ---------------------------------------------------------------------------
+
+class WebhookHandler(BaseHTTPRequestHandler):
+    ingestor = None
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True  # headers and body go out as separate writes
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path != "/health":
+            return self.send_json(404, {"error": "not found"})
+        health = self.ingestor.snapshot()
+        self.send_json(200 if health["writer_alive"] else 503, health)
+
+    def do_POST(self):
+        if self.path != WEBHOOK_PATH:
+            return self.send_json(404, {"error": "not found"})
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        try:
+            event = json.loads(raw or b"{}")
+        except ValueError:
+            return self.send_json(400, {"error": "invalid JSON"})
+
+        if "verification_token" in event:
+            print(f"Notion webhook verification_token: {event['verification_token']} "
+                  "(set NOTION_WEBHOOK_SECRET to it)", file=sys.stderr)
+            return self.send_json(200, {"ok": True})
+
+        if WEBHOOK_SECRET and not hmac.compare_digest(
+                sign(raw, WEBHOOK_SECRET), self.headers.get("X-Notion-Signature", "")):
+            return self.send_json(401, {"error": "bad signature"})
+
+        entity = event.get("entity") or {}
+        parent = (event.get("data") or {}).get("parent") or {}
+        if (event.get("type") not in PAGE_EVENTS or entity.get("type") != "page"
+                or not self.ingestor.known_database(parent.get("id"))):
+            self.ingestor.count("ignored")
+            return self.send_json(200, {"queued": False})
+
+        if not self.ingestor.submit(entity["id"]):
+            return self.send_json(503, {"error": "queue full"}, {"Retry-After": "5"})
+        self.send_json(200, {"queued": True})
+
+
+def serve(host, port, batch_size, flush_seconds, queue_size):
+    ingestor = Ingestor(batch_size, flush_seconds, queue_size)
+    WebhookHandler.ingestor = ingestor
+    server = ThreadingHTTPServer((host, port), WebhookHandler)
+    ingestor.start()
+
+    def shutdown(*_):
+        threading.Thread(target=server.shutdown).start()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    print(f"Notion webhook listening on http://{host}:{server.server_port}{WEBHOOK_PATH}",
+          file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        ingestor.stop()
+        ingestor.writer.join()
+    print(json.dumps(ingestor.snapshot()))
+
+
+# ---------------------------------------------------------------------------
+# Replay
+# ---------------------------------------------------------------------------
+
+def recorded_events(path):
+    with open(path, "r") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def stub_events():
+    """One event per completed page in every registry database."""
+    conn = get_connection()
+    try:
+        reg = registry.load(conn)
+        conn.rollback()
+    finally:
+        release_connection(conn)
+    entries = notion_client.map_concurrently(
+        lambda db_id: list(notion_sync.query_completed_entries(db_id)), reg.notion_db_ids.items())
+    events = [page_event(page) for pages in entries.values() for page in pages]
+    events.sort(key=lambda e: e["timestamp"] or "")
+    return events
+
+
+def replay(url, events, rate=0, secret=WEBHOOK_SECRET):
+    """POST events to url in order, at most rate per second (0 = no limit)."""
+    result = {"sent": 0, "accepted": 0, "rejected": 0, "failed": 0}
+    session = requests.Session()
+    start = time.perf_counter()
+    for i, event in enumerate(events):
+        if rate:
+            delay = start + i / rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        body = json.dumps(event).encode()
+        headers = {"Content-Type": "application/json"}
+        if secret:
+            headers["X-Notion-Signature"] = sign(body, secret)
+        result["sent"] += 1
+        try:
+            resp = session.post(url, data=body, headers=headers, timeout=10)
+        except requests.RequestException:
+            result["failed"] += 1
+            continue
+        if resp.status_code == 200:
+            result["accepted"] += 1
+        elif resp.status_code == 503:
+            result["rejected"] += 1
+        else:
+            result["failed"] += 1
+    result["seconds"] = round(time.perf_counter() - start, 3)
+    return result
+
+
+# ---------------------------------------------------------------------------
+# Main
+# ---------------------------------------------------------------------------
+
+def main():
+    parser = argparse.ArgumentParser(description="Notion webhook → PostgreSQL ingestion")
+    parser.add_argument("command", choices=["serve", "replay"])
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help=f"serve: pages per fetch/insert/commit. Default: {DEFAULT_BATCH_SIZE}.")
+    parser.add_argument("--flush-seconds", type=float, default=DEFAULT_FLUSH_SECONDS,
+                        help="serve: longest wait to fill a batch. "
+                             f"Default: {DEFAULT_FLUSH_SECONDS}.")
+    parser.add_argument("--queue-size", type=int, default=DEFAULT_QUEUE_SIZE,
+                        help=f"serve: queued pages before answering 503. "
+                             f"Default: {DEFAULT_QUEUE_SIZE}.")
+    parser.add_argument("--url", default=f"http://127.0.0.1:{DEFAULT_PORT}{WEBHOOK_PATH}",
+                        help="replay: webhook URL to post to.")
+    parser.add_argument("--file", type=str, default=None,
+                        help="replay: JSONL of recorded events. Default: one event per "
+                             "completed page in the registry databases.")
+    parser.add_argument("--rate", type=float, default=0,
+                        help="replay: events per second (0 = as fast as possible).")
+    args = parser.parse_args()
+
+    if not args.file and not notion_client.NOTION_API_KEY:
+        print("Error: NOTION_API_KEY environment variable not set", file=sys.stderr)
+        sys.exit(1)
+
+    if args.command == "serve":
+        serve(args.host, args.port, args.batch_size, args.flush_seconds, args.queue_size)
+        return
+
+    events = recorded_events(args.file) if args.file else stub_events()
+    print(json.dumps(replay(args.url, events, args.rate)))
+
+
+if __name__ == "__main__":
+    main()
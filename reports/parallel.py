@@ -0,0 +1,84 @@
+"""Spread per-child report work across a process pool.
+
+run_for_children splits the child ids into one chunk per worker process.
+Each worker checks out its own pooled connection (db keeps one pool per
+process) and calls task(conn, chunk, *args), which returns
+{child_id: result}. If the task raises, the chunk is retried one child at
+a time, so a bad child only loses its own report. Results come back in
+the order of child_ids.
+
+With workers=1 the task runs in this process on the caller's connection.
+Tasks must be module-level functions so they can be pickled.
+"""
+
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from db import get_connection, release_connection
+
+
+def _describe(exc):
+    return f"{type(exc).__name__}: {exc}"
+
+
+def _run_isolated(conn, task, chunk, args):
+    """Run task over chunk; on failure fall back to one child at a time."""
+    try:
+        return task(conn, chunk, *args), {}
+    except Exception as e:
+        conn.rollback()
+        if len(chunk) == 1:
+            return {}, {chunk[0]: _describe(e)}
+
+    results, errors = {}, {}
+    for child_id in chunk:
+        try:
+            results.update(task(conn, [child_id], *args))
+        except Exception as e:
+            conn.rollback()
+            errors[child_id] = _describe(e)
+    return results, errors
+
+
+def _worker(task, chunk, args):
+    conn = get_connection()
+    try:
+        return _run_isolated(conn, task, chunk, args)
+    finally:
+        release_connection(conn)
+
+
+def run_for_children(task, child_ids, args=(), workers=1, conn=None):
+    """Return ({child_id: result}, {child_id: error message}).
+
+    results is ordered like child_ids and only holds children that
+    succeeded.
+    """
+    child_ids = list(child_ids)
+    results, errors = {}, {}
+    workers = max(1, min(workers, len(child_ids)))
+
+    if workers == 1:
+        if conn is None:
+            results, errors = _worker(task, child_ids, args)
+        else:
+            results, errors = _run_isolated(conn, task, child_ids, args)
+    else:
+        chunks = [child_ids[i::workers] for i in range(workers)]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [(chunk, pool.submit(_worker, task, chunk, args)) for chunk in chunks]
+            for chunk, future in futures:
+                try:
+                    chunk_results, chunk_errors = future.result()
+                except Exception as e:  # worker died or could not start
+                    chunk_results, chunk_errors = {}, {c: _describe(e) for c in chunk}
+                results.update(chunk_results)
+                errors.update(chunk_errors)
+
+    return {c: results[c] for c in child_ids if c in results}, errors
+
+
+def print_errors(errors, names):
+    """Report failed children on stderr."""
+    for child_id, message in errors.items():
+        print(f"Report failed for {names.get(child_id, child_id)}: {message}", file=sys.stderr)
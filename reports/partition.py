@@ -0,0 +1,379 @@
+#!/usr/bin/env python3
+"""Monthly range partitioning of activity_logs on activity_date.
+
+convert rebuilds activity_logs as a table partitioned by month, copies
+every row across in one transaction and keeps the old table as
+activity_logs_unpartitioned (or drops it with --drop-old). The primary key
+becomes (log_id, activity_date) and notion_sync's dedup index
+(notion_page_id, activity_date) carries over; non-unique indexes such as
+the report covering index are recreated on the new parent, and foreign
+keys are copied. Rows outside every monthly partition land in
+activity_logs_default.
+
+ensure creates the partitions for the current month and the next
+--months-ahead months; notion_sync runs it before every write, and it
+does nothing until the table has been converted.
+
+archive detaches every partition that ends on or before --before and
+moves it to the archive schema. daily_rollup keeps its totals, so the
+reports are unaffected, but rollup.py --rebuild no longer sees those rows.
+The detached rows take their (notion_page_id, activity_date) uniqueness
+with them, so archive also records those keys in archive.archived_pages
+and notion_sync skips them (drop_archived): a page read again by
+--include-synced, a webhook or a failed Synced PATCH is not inserted, or
+added to daily_rollup, a second time. The cost is that archived pages can
+never be synced again, even after being restored by hand.
+
+convert refuses to run while migrate.py has pending migrations: 0002
+adds a unique index on notion_page_id alone, which a partitioned table
+cannot have.
+
+pruning EXPLAINs the rollup source query for one weekly window and lists
+the partitions it reads.
+
+Usage:
+    python partition.py status
+    python partition.py convert [--months-ahead 3] [--drop-old]
+    python partition.py ensure [--months-ahead 3]
+    python partition.py archive --before YYYY-MM-DD
+    python partition.py pruning [--week-ending YYYY-MM-DD] [--child_id N]
+"""
+
+import argparse
+import glob
+import json
+import os
+import re
+import sys
+from datetime import date, timedelta
+
+from db import get_connection, release_connection
+from rollup import ROLLUP_SOURCE
+
+PARENT = "activity_logs"
+LEGACY = "activity_logs_unpartitioned"
+DEFAULT_PARTITION = "activity_logs_default"
+ARCHIVE_SCHEMA = "archive"
+ARCHIVED_PAGES = f"{ARCHIVE_SCHEMA}.archived_pages"
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+MONTHS_AHEAD = 3
+
+_BOUNDS = re.compile(r"FROM \('([0-9-]+)'\) TO \('([0-9-]+)'\)")
+
+
+def add_months(d, months):
+    month = d.month - 1 + months
+    return date(d.year + month // 12, month % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f"{PARENT}_{month:%Y_%m}"
+
+
+def is_partitioned(conn):
+    with conn.cursor() as cur:
+        cur.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", (PARENT,))
+        row = cur.fetchone()
+    return row is not None and row[0] == "p"
+
+
+def list_partitions(conn):
+    """[{name, from, to, rows}] for every partition, oldest first; DEFAULT has no bounds."""
+    sql = """
+        SELECT c.relname, pg_get_expr(c.relpartbound, c.oid), c.reltuples::bigint
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = to_regclass(%s)
+        ORDER BY c.relname
+    """
+    with conn.cursor() as cur:
+        cur.execute(sql, (PARENT,))
+        rows = cur.fetchall()
+
+    partitions = []
+    for name, bound, estimate in rows:
+        match = _BOUNDS.search(bound)
+        partitions.append({
+            "name": name,
+            "from": match.group(1) if match else None,
+            "to": match.group(2) if match else None,
+            "rows": max(int(estimate), 0),
+        })
+    return partitions
+
+
+def create_partition(conn, month):
+    """Create the partition for the month starting at `month`. Returns False if it exists.
+
+    Rows already sitting in the default partition for that month are moved
+    into the new partition, which Postgres requires before it can attach.
+    Does not commit.
+    """
+    name = partition_name(month)
+    start, end = month, add_months(month, 1)
+    with conn.cursor() as cur:
+        cur.execute("SELECT to_regclass(%s) IS NOT NULL", (name,))
+        if cur.fetchone()[0]:
+            return False
+
+        cur.execute("SELECT to_regclass(%s) IS NOT NULL", (DEFAULT_PARTITION,))
+        has_default = cur.fetchone()[0]
+        stray = False
+        if has_default:
+            cur.execute(f"SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} "
+                        "WHERE activity_date >= %s AND activity_date < %s)", (start, end))
+            stray = cur.fetchone()[0]
+
+        if stray:
+            cur.execute(f"ALTER TABLE {PARENT} DETACH PARTITION {DEFAULT_PARTITION}")
+        cur.execute(f"CREATE TABLE {name} PARTITION OF {PARENT} "
+                    "FOR VALUES FROM (%s) TO (%s)", (start, end))
+        if stray:
+            cur.execute(f"""
+                WITH moved AS (
+                    DELETE FROM {DEFAULT_PARTITION}
+                    WHERE activity_date >= %s AND activity_date < %s
+                    RETURNING *
+                )
+                INSERT INTO {PARENT} SELECT * FROM moved
+            """, (start, end))
+            cur.execute(f"ALTER TABLE {PARENT} ATTACH PARTITION {DEFAULT_PARTITION} DEFAULT")
+    return True
+
+
+def ensure_future_partitions(conn, months_ahead=MONTHS_AHEAD, today=None):
+    """Create this month's and the next months_ahead months' partitions.
+
+    Returns the names created. No-op if activity_logs is not partitioned.
+    Does not commit.
+    """
+    if not is_partitioned(conn):
+        return []
+    first = (today or date.today()).replace(day=1)
+    created = []
+    for i in range(months_ahead + 1):
+        month = add_months(first, i)
+        if create_partition(conn, month):
+            created.append(partition_name(month))
+    return created
+
+
+def pending_migrations(conn):
+    """Versions in MIGRATIONS_DIR that schema_migrations does not list yet."""
+    versions = {os.path.basename(path).partition("_")[0]
+                for path in glob.glob(os.path.join(MIGRATIONS_DIR, "*.sql"))}
+    with conn.cursor() as cur:
+        cur.execute("SELECT to_regclass('schema_migrations') IS NOT NULL")
+        if cur.fetchone()[0]:
+            cur.execute("SELECT version FROM schema_migrations")
+            versions -= {row[0] for row in cur.fetchall()}
+    return sorted(versions)
+
+
+def convert(conn, months_ahead=MONTHS_AHEAD, drop_old=False):
+    """Rebuild activity_logs as a monthly-partitioned table. Commits on success."""
+    if is_partitioned(conn):
+        raise RuntimeError(f"{PARENT} is already partitioned")
+    pending = pending_migrations(conn)
+    if pending:
+        raise RuntimeError("run migrate.py up first; pending migrations: " + ", ".join(pending))
+
+    with conn.cursor() as cur:
+        cur.execute(f"LOCK TABLE {PARENT} IN ACCESS EXCLUSIVE MODE")
+
+        cur.execute("SELECT conname, conrelid::regclass::text FROM pg_constraint "
+                    "WHERE confrelid = to_regclass(%s)", (PARENT,))
+        referencing = cur.fetchall()
+        if referencing:
+            raise RuntimeError(f"{PARENT} is referenced by foreign keys: "
+                               + ", ".join(f"{table}.{name}" for name, table in referencing))
+
+        cur.execute("SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+                    "WHERE conrelid = to_regclass(%s) AND contype = 'f'", (PARENT,))
+        foreign_keys = cur.fetchall()
+        cur.execute("""
+            SELECT c.relname, pg_get_indexdef(i.indexrelid), i.indisunique
+            FROM pg_index i
+            JOIN pg_class c ON c.oid = i.indexrelid
+            WHERE i.indrelid = to_regclass(%s)
+        """, (PARENT,))
+        indexes = cur.fetchall()
+        cur.execute("SELECT attidentity <> '' FROM pg_attribute "
+                    "WHERE attrelid = to_regclass(%s) AND attname = 'log_id'", (PARENT,))
+        identity = cur.fetchone()[0]
+        cur.execute(f"SELECT pg_get_serial_sequence('{PARENT}', 'log_id')")
+        sequence = cur.fetchone()[0]
+        cur.execute(f"SELECT MIN(activity_date), MAX(activity_date), COUNT(*) FROM {PARENT}")
+        first_date, last_date, row_count = cur.fetchone()
+
+        # Free the table and index names for the new parent
+        cur.execute(f"ALTER TABLE {PARENT} RENAME TO {LEGACY}")
+        for name, _, _ in indexes:
+            cur.execute(f'ALTER INDEX "{name}" RENAME TO "{name[:50]}_unpartitioned"')
+
+        cur.execute(f"""
+            CREATE TABLE {PARENT} (
+                LIKE {LEGACY} INCLUDING DEFAULTS INCLUDING IDENTITY
+                              INCLUDING CONSTRAINTS INCLUDING STORAGE INCLUDING COMMENTS
+            ) PARTITION BY RANGE (activity_date)
+        """)
+        cur.execute(f"ALTER TABLE {PARENT} ADD CONSTRAINT {PARENT}_pkey "
+                    "PRIMARY KEY (log_id, activity_date)")
+        cur.execute(f"ALTER TABLE {PARENT} ADD CONSTRAINT {PARENT}_page_date_key "
+                    "UNIQUE (notion_page_id, activity_date)")
+        for name, definition in foreign_keys:
+            cur.execute(f'ALTER TABLE {PARENT} ADD CONSTRAINT "{name}" {definition}')
+        skipped = []
+        for name, definition, unique in indexes:
+            if unique:
+                skipped.append(name)  # replaced by the keys above, which include activity_date
+            else:
+                cur.execute(definition)
+        if sequence and not identity:
+            cur.execute(f"ALTER SEQUENCE {sequence} OWNED BY {PARENT}.log_id")
+
+        cur.execute(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {PARENT} DEFAULT")
+        today = date.today().replace(day=1)
+        month = min(first_date or today, today).replace(day=1)
+        last = add_months(max(last_date or today, today), months_ahead)
+        while month <= last:
+            create_partition(conn, month)
+            month = add_months(month, 1)
+
+        cur.execute(f"INSERT INTO {PARENT} SELECT * FROM {LEGACY}")
+        if cur.rowcount != row_count:
+            raise RuntimeError(f"copied {cur.rowcount} rows, expected {row_count}")
+        if identity:
+            cur.execute(f"SELECT setval(pg_get_serial_sequence('{PARENT}', 'log_id'), "
+                        f"(SELECT COALESCE(MAX(log_id), 0) + 1 FROM {PARENT}), false)")
+        if drop_old:
+            cur.execute(f"DROP TABLE {LEGACY}")
+    conn.commit()
+
+    # Set the visibility maps so the covering indexes give index-only scans
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"VACUUM (ANALYZE) {PARENT}")
+    finally:
+        conn.autocommit = False
+
+    return {
+        "rows": row_count,
+        "partitions": len(list_partitions(conn)),
+        "replaced_unique_indexes": [f"{name[:50]}_unpartitioned" for name in skipped],
+        "legacy_table": None if drop_old else LEGACY,
+    }
+
+
+def archive(conn, before):
+    """Detach partitions ending on or before `before` into ARCHIVE_SCHEMA and
+    record their pages in ARCHIVED_PAGES. Commits."""
+    archived = []
+    with conn.cursor() as cur:
+        cur.execute(f"CREATE SCHEMA IF NOT EXISTS {ARCHIVE_SCHEMA}")
+        cur.execute(f"""
+            CREATE TABLE IF NOT EXISTS {ARCHIVED_PAGES} (
+                notion_page_id  text NOT NULL,
+                activity_date   date NOT NULL,
+                PRIMARY KEY (notion_page_id, activity_date)
+            )
+        """)
+        for p in list_partitions(conn):
+            if p["to"] is None or date.fromisoformat(p["to"]) > before:
+                continue
+            cur.execute(f"INSERT INTO {ARCHIVED_PAGES} "
+                        f"SELECT DISTINCT notion_page_id, activity_date FROM {p['name']} "
+                        "WHERE notion_page_id IS NOT NULL ON CONFLICT DO NOTHING")
+            cur.execute(f"ALTER TABLE {PARENT} DETACH PARTITION {p['name']}")
+            cur.execute(f"ALTER TABLE {p['name']} SET SCHEMA {ARCHIVE_SCHEMA}")
+            archived.append(f"{ARCHIVE_SCHEMA}.{p['name']}")
+    conn.commit()
+    return archived
+
+
+def drop_archived(conn, records):
+    """records without those whose (page_id, activity_date) was archived."""
+    if not records:
+        return records
+    with conn.cursor() as cur:
+        cur.execute("SELECT to_regclass(%s) IS NOT NULL", (ARCHIVED_PAGES,))
+        if not cur.fetchone()[0]:
+            return records
+        cur.execute(f"SELECT notion_page_id, activity_date FROM {ARCHIVED_PAGES} "
+                    "WHERE notion_page_id = ANY(%s)", ([r["page_id"] for r in records],))
+        archived = set(cur.fetchall())
+    return [r for r in records if (r["page_id"], r["activity_date"]) not in archived]
+
+
+def pruning(conn, child_id, week_end):
+    """Partitions the rollup source query reads for one 35-day report window."""
+    sql = ROLLUP_SOURCE.format(where="child_id = %s AND activity_date BETWEEN %s AND %s")
+    with conn.cursor() as cur:
+        cur.execute("EXPLAIN (FORMAT JSON) " + sql,
+                    (child_id, week_end - timedelta(days=34), week_end))
+        plan = cur.fetchone()[0][0]
+    conn.rollback()
+
+    tables = set()
+
+    def walk(node):
+        if "Relation Name" in node:
+            tables.add(node["Relation Name"])
+        for child in node.get("Plans", []):
+            walk(child)
+
+    walk(plan["Plan"])
+    return sorted(tables)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage activity_logs date partitions")
+    parser.add_argument("command", choices=["status", "convert", "ensure", "archive", "pruning"])
+    parser.add_argument("--months-ahead", type=int, default=MONTHS_AHEAD,
+                        help=f"Future monthly partitions to keep ready. Default: {MONTHS_AHEAD}.")
+    parser.add_argument("--drop-old", action="store_true",
+                        help=f"convert: drop {LEGACY} instead of keeping it.")
+    parser.add_argument("--before", type=str, default=None,
+                        help="archive: detach partitions ending on or before this date (YYYY-MM-DD).")
+    parser.add_argument("--week-ending", type=str, default=None,
+                        help="pruning: report window to explain. Defaults to today.")
+    parser.add_argument("--child_id", type=int, default=1,
+                        help="pruning: child to explain for. Default: 1.")
+    args = parser.parse_args()
+
+    if args.command == "archive" and not args.before:
+        parser.error("archive needs --before")
+
+    try:
+        conn = get_connection()
+    except Exception as e:
+        print(f"Database connection failed: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    try:
+        if args.command == "status":
+            result = {"partitioned": is_partitioned(conn), "partitions": list_partitions(conn)}
+        elif args.command == "convert":
+            result = convert(conn, args.months_ahead, args.drop_old)
+        elif args.command == "ensure":
+            result = {"created": ensure_future_partitions(conn, args.months_ahead)}
+            conn.commit()
+        elif args.command == "archive":
+            result = {"archived": archive(conn, date.fromisoformat(args.before))}
+        else:
+            week_end = date.fromisoformat(args.week_ending) if args.week_ending else date.today()
+            result = {"week_ending": str(week_end),
+                      "partitions_read": pruning(conn, args.child_id, week_end)}
+    except RuntimeError as e:
+        conn.rollback()
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        release_connection(conn)
+
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
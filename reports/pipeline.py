@@ -0,0 +1,93 @@
+"""Run the stages of a job concurrently, linked by bounded queues.
+
+Each stage is a thread started with spawn(); stages pass work along
+queues from queue(maxsize), so a fast stage blocks on put() once the
+next one falls behind instead of piling work up in memory. Use put() and
+get() rather than the Queue methods: they give up with Cancelled as soon
+as any stage has failed, so one error stops the whole pipeline instead
+of leaving the other stages blocked.
+
+    with Pipeline() as pipe:
+        pages = pipe.queue(200)
+        pipe.spawn("fetch", fetch, pages)
+        for item in iter(lambda: pipe.get(pages), DONE):
+            ...
+
+Leaving the with-block waits for every stage. The first exception raised
+by a stage (or by the body of the with-block) is re-raised there.
+"""
+
+import queue
+import threading
+
+# Marks the end of a stage's output
+DONE = object()
+
+POLL_SECONDS = 0.1
+
+
+class Cancelled(Exception):
+    """Raised by put()/get() once another stage has failed."""
+
+
+class Pipeline:
+    def __init__(self):
+        self.stopping = threading.Event()
+        self.error = None
+        self.threads = []
+        self._lock = threading.Lock()
+
+    def queue(self, maxsize):
+        return queue.Queue(maxsize=max(1, maxsize))
+
+    def put(self, q, item):
+        while True:
+            if self.stopping.is_set():
+                raise Cancelled()
+            try:
+                return q.put(item, timeout=POLL_SECONDS)
+            except queue.Full:
+                pass
+
+    def get(self, q):
+        while True:
+            if self.stopping.is_set():
+                raise Cancelled()
+            try:
+                return q.get(timeout=POLL_SECONDS)
+            except queue.Empty:
+                pass
+
+    def fail(self, exc):
+        """Record the first error and stop every stage."""
+        with self._lock:
+            if self.error is None:
+                self.error = exc
+        self.stopping.set()
+
+    def spawn(self, name, fn, *args):
+        """Run fn(*args) in a stage thread; an exception fails the pipeline."""
+        def run():
+            try:
+                fn(*args)
+            except Cancelled:
+                pass
+            except BaseException as e:
+                self.fail(e)
+
+        thread = threading.Thread(target=run, name=name, daemon=True)
+        self.threads.append(thread)
+        thread.start()
+        return thread
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is not None and not isinstance(exc, Cancelled):
+            self.fail(exc)
+        for thread in self.threads:
+            thread.join()
+        if self.error is not None and self.error is not exc:
+            raise self.error
+        return False
@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+"""Children, Notion databases, subjects, workouts and aliases from PostgreSQL.
+
+child_registry holds each child (name, Korean name, Notion timer database,
+max session length), activity_aliases maps Activity titles to subject or
+workout names, and subjects / workout_types hold the per-child names and
+ids. See migrations/0005_registry.sql.
+
+load(conn) returns a Registry with every lookup prebuilt as a dict. It is
+cached in the process and re-read only when registry_version changes (a
+statement trigger bumps it on any write to the four tables); the version
+is probed at most every REGISTRY_CHECK_SECONDS. Until the migration has
+been applied, children and aliases come from config.py. load_or_config()
+falls back to from_config(), built from config.py alone, when no
+database is reachable, so notion_stub.py and notion_sync.py --dry-run
+still run without one.
+
+Usage:
+    python registry.py show
+    python registry.py seed                      # copy config.py children/aliases into the tables
+    python registry.py add-child --child_id 3 --name Jiwoo --notion-db <id> [--name-kr ...] [--max-duration 180]
+    python registry.py add-alias --alias Swim --target Swimming [--child_id 3]
+"""
+
+import argparse
+import json
+import sys
+import threading
+import time
+
+from config import (ACTIVITY_ALIASES, CHILDREN, CHILDREN_KR, MAX_DURATION, NOTION_DB_IDS,
+                    REGISTRY_CHECK_SECONDS, SUBJECT_IDS, WORKOUT_IDS)
+from db import get_connection, release_connection
+
+DEFAULT_MAX_DURATION = 120
+
+_cache = None
+_checked_at = 0.0
+_lock = threading.Lock()
+
+
+class Registry:
+    """One snapshot of the registry tables, indexed for per-child lookups."""
+
+    def __init__(self, version, children, subjects, workouts, aliases):
+        """children: [(child_id, name, name_kr, notion_db_id, max_duration)] of
+        active children; subjects / workouts: [(child_id, name, id)];
+        aliases: [(child_id or None, alias, target)]."""
+        self.version = version
+        self.children = {}
+        self.children_kr = {}
+        self.notion_db_ids = {}
+        self.max_duration = {}
+        for child_id, name, name_kr, notion_db_id, max_duration in sorted(children):
+            self.children[child_id] = name
+            self.children_kr[child_id] = name_kr or ""
+            self.max_duration[child_id] = max_duration or DEFAULT_MAX_DURATION
+            if notion_db_id:
+                self.notion_db_ids[child_id] = notion_db_id
+        self._database_children = {db_id.replace("-", ""): child_id
+                                   for child_id, db_id in self.notion_db_ids.items()}
+
+        self.subject_ids = self._per_child(subjects)
+        self.workout_ids = self._per_child(workouts)
+        self.aliases = self._per_child(aliases)
+
+        # name -> (category, subject_id, workout_id), in parse_entry's precedence
+        self._categories = {}
+        for child_id in self.children:
+            categories = {name: ("Study", subject_id, None)
+                          for name, subject_id in self.subject_ids[child_id].items()}
+            categories.update({name: ("Workout", None, workout_id)
+                               for name, workout_id in self.workout_ids[child_id].items()})
+            categories["Rest"] = ("Rest", None, None)
+            self._categories[child_id] = categories
+
+    def _per_child(self, rows):
+        """{child_id: {name: value}}; rows with child_id None apply to every child."""
+        shared = {name: value for child_id, name, value in rows if child_id is None}
+        result = {child_id: dict(shared) for child_id in self.children}
+        for child_id, name, value in rows:
+            if child_id in result:
+                result[child_id][name] = value
+        return result
+
+    def child_for_database(self, database_id):
+        """child_id owning a Notion timer database (dashed or not), or None."""
+        return self._database_children.get((database_id or "").replace("-", ""))
+
+    def resolve_alias(self, child_id, title):
+        """Canonical subject/workout name for an Activity title."""
+        return self.aliases.get(child_id, {}).get(title, title)
+
+    def lookup(self, child_id, name):
+        """(category, subject_id, workout_id) for a subject/workout name, or None."""
+        return self._categories.get(child_id, {}).get(name)
+
+    def known_names(self, child_id):
+        return set(self._categories.get(child_id, {}))
+
+    def as_dict(self):
+        return {
+            "version": self.version,
+            "children": [{"child_id": child_id, "name": name,
+                          "name_kr": self.children_kr[child_id],
+                          "notion_db_id": self.notion_db_ids.get(child_id),
+                          "max_duration": self.max_duration[child_id],
+                          "subjects": self.subject_ids[child_id],
+                          "workouts": self.workout_ids[child_id],
+                          "aliases": self.aliases[child_id]}
+                         for child_id, name in self.children.items()],
+        }
+
+
+# ---------------------------------------------------------------------------
+# Loading
+# ---------------------------------------------------------------------------
+
+def current_version(conn):
+    """registry_version, or None if the registry migration has not been applied."""
+    with conn.cursor() as cur:
+        cur.execute("SELECT to_regclass('registry_version') IS NOT NULL")
+        if not cur.fetchone()[0]:
+            return None
+        cur.execute("SELECT version FROM registry_version")
+        row = cur.fetchone()
+        return row[0] if row else 0
+
+
+def _config_children():
+    return [(child_id, name, CHILDREN_KR.get(child_id, ""), NOTION_DB_IDS.get(child_id),
+             MAX_DURATION.get(child_id, DEFAULT_MAX_DURATION))
+            for child_id, name in CHILDREN.items()]
+
+
+def _config_aliases():
+    return [(None, alias, target) for alias, target in ACTIVITY_ALIASES.items()]
+
+
+def read_registry(conn, version):
+    """Build a Registry from the tables (children/aliases from config if version is None)."""
+    with conn.cursor() as cur:
+        if version is None:
+            children = _config_children()
+            aliases = _config_aliases()
+        else:
+            cur.execute("""
+                SELECT child_id, name, name_kr, notion_db_id, max_duration_minutes
+                FROM child_registry
+                WHERE active
+            """)
+            children = cur.fetchall()
+            cur.execute("SELECT child_id, alias, target FROM activity_aliases")
+            aliases = cur.fetchall()
+        cur.execute("SELECT child_id, subject_name, subject_id FROM subjects ORDER BY subject_id")
+        subjects = cur.fetchall()
+        cur.execute("SELECT child_id, workout_name, workout_id FROM workout_types ORDER BY workout_id")
+        workouts = cur.fetchall()
+    return Registry(version, children, subjects, workouts, aliases)
+
+
+def load(conn, max_age=None):
+    """The cached Registry, re-read if registry_version has moved on.
+
+    The version is probed at most every max_age seconds (default
+    REGISTRY_CHECK_SECONDS); pass 0 to always probe.
+    """
+    global _cache, _checked_at
+    if max_age is None:
+        max_age = REGISTRY_CHECK_SECONDS
+    with _lock:
+        now = time.monotonic()
+        if _cache is not None and now - _checked_at < max_age:
+            return _cache
+        version = current_version(conn)
+        if _cache is None or version != _cache.version or version is None:
+            _cache = read_registry(conn, version)
+        _checked_at = now
+        return _cache
+
+
+def from_config():
+    """A Registry built from config.py alone, for running without a database."""
+    subjects = [(child_id, name, subject_id)
+                for child_id, names in SUBJECT_IDS.items() for name, subject_id in names.items()]
+    workouts = [(child_id, name, workout_id)
+                for child_id, names in WORKOUT_IDS.items() for name, workout_id in names.items()]
+    return Registry(None, _config_children(), subjects, workouts, _config_aliases())
+
+
+def load_or_config():
+    """load() from the database, or from_config() if it cannot be reached."""
+    try:
+        conn = get_connection()
+    except Exception as e:
+        print(f"Database unavailable, using the registry in config.py: {e}", file=sys.stderr)
+        return from_config()
+    try:
+        return load(conn)
+    finally:
+        release_connection(conn)
+
+
+def invalidate():
+    """Drop the cached Registry so the next load() re-reads it."""
+    global _cache
+    with _lock:
+        _cache = None
+
+
+# ---------------------------------------------------------------------------
+# Writes
+# ---------------------------------------------------------------------------
+
+def add_child(conn, child_id, name, name_kr="", notion_db_id=None,
+              max_duration=DEFAULT_MAX_DURATION):
+    """Insert or update a child. Does not commit."""
+    sql = """
+        INSERT INTO child_registry
+            (child_id, name, name_kr, notion_db_id, max_duration_minutes)
+        VALUES (%s, %s, %s, %s, %s)
+        ON CONFLICT (child_id) DO UPDATE
+        SET name = EXCLUDED.name,
+            name_kr = EXCLUDED.name_kr,
+            notion_db_id = EXCLUDED.notion_db_id,
+            max_duration_minutes = EXCLUDED.max_duration_minutes,
+            active = true
+    """
+    with conn.cursor() as cur:
+        cur.execute(sql, (child_id, name, name_kr or "", notion_db_id, max_duration))
+
+
+def add_alias(conn, alias, target, child_id=None):
+    """Insert or update an Activity title alias. Does not commit."""
+    with conn.cursor() as cur:
+        cur.execute("""
+            DELETE FROM activity_aliases
+            WHERE COALESCE(child_id, 0) = COALESCE(%s, 0) AND alias = %s
+        """, (child_id, alias))
+        cur.execute("INSERT INTO activity_aliases (child_id, alias, target) VALUES (%s, %s, %s)",
+                    (child_id, alias, target))
+
+
+def seed(conn):
+    """Copy config.py's children and aliases into empty slots. Does not commit.
+
+    Existing rows are left alone, so re-running is safe. Returns the
+    number of children and aliases added.
+    """
+    added = {"children": 0, "aliases": 0}
+    with conn.cursor() as cur:
+        for child_id, name in CHILDREN.items():
+            cur.execute("""
+                INSERT INTO child_registry
+                    (child_id, name, name_kr, notion_db_id, max_duration_minutes)
+                VALUES (%s, %s, %s, %s, %s)
+                ON CONFLICT DO NOTHING
+            """, (child_id, name, CHILDREN_KR.get(child_id, ""), NOTION_DB_IDS.get(child_id),
+                  MAX_DURATION.get(child_id, DEFAULT_MAX_DURATION)))
+            added["children"] += cur.rowcount
+        for alias, target in ACTIVITY_ALIASES.items():
+            cur.execute("""
+                INSERT INTO activity_aliases (child_id, alias, target)
+                VALUES (NULL, %s, %s)
+                ON CONFLICT DO NOTHING
+            """, (alias, target))
+            added["aliases"] += cur.rowcount
+    return added
+
+
+# ---------------------------------------------------------------------------
+# Main
+# ---------------------------------------------------------------------------
+
+def main():
+    parser = argparse.ArgumentParser(description="Show and edit the child/subject registry")
+    parser.add_argument("command", choices=["show", "seed", "add-child", "add-alias"])
+    parser.add_argument("--child_id", type=int, default=None)
+    parser.add_argument("--name", type=str, default=None, help="add-child: display name.")
+    parser.add_argument("--name-kr", type=str, default="", help="add-child: Korean name.")
+    parser.add_argument("--notion-db", type=str, default=None,
+                        help="add-child: Notion timer database id.")
+    parser.add_argument("--max-duration", type=int, default=DEFAULT_MAX_DURATION,
+                        help=f"add-child: longest valid session in minutes. "
+                             f"Default: {DEFAULT_MAX_DURATION}.")
+    parser.add_argument("--alias", type=str, default=None, help="add-alias: Activity title.")
+    parser.add_argument("--target", type=str, default=None,
+                        help="add-alias: subject/workout name (or Rest). Applies to every "
+                             "child unless --child_id is given.")
+    args = parser.parse_args()
+
+    if args.command == "add-child" and (args.child_id is None or not args.name):
+        parser.error("add-child needs --child_id and --name")
+    if args.command == "add-alias" and not (args.alias and args.target):
+        parser.error("add-alias needs --alias and --target")
+
+    try:
+        conn = get_connection()
+    except Exception as e:
+        print(f"Database connection failed: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    try:
+        if args.command != "show" and current_version(conn) is None:
+            print("Registry tables are missing; run `python migrate.py up` first", file=sys.stderr)
+            sys.exit(1)
+        if args.command == "seed":
+            result = seed(conn)
+        elif args.command == "add-child":
+            add_child(conn, args.child_id, args.name, args.name_kr, args.notion_db,
+                      args.max_duration)
+            result = {"child_id": args.child_id}
+        elif args.command == "add-alias":
+            add_alias(conn, args.alias, args.target, args.child_id)
+            result = {"alias": args.alias, "target": args.target}
+        else:
+            result = load(conn, max_age=0).as_dict()
+        conn.commit()
+    finally:
+        release_connection(conn)
+    print(json.dumps(result, indent=2 if args.command == "show" else None, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""On-disk cache of computed report results.
+
+Entries are keyed by (report type, child_id, date) and hold every output
+format's parts, so text, html and json runs share one entry. Each is
+stamped with a data version for that report and child: the row count and
+minute/session totals of the daily_rollup rows the report reads, the
+child's name and Korean name from the registry, plus a digest of the
+subject and workout names. add_to_rollup and rollup --rebuild change
+those totals in the same transaction as the activity_logs write, so a
+sync that lands data in the report's window invalidates the entry. A hit
+costs one small probe query instead of the report aggregation.
+
+Each entry is a JSON file under REPORT_CACHE_DIR. Reads touch the file,
+and writes evict the least recently used files beyond REPORT_CACHE_MAX.
+Cache errors are treated as misses; they never fail a report.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+
+import registry
+from config import REPORT_CACHE_DIR, REPORT_CACHE_MAX
+
+CACHE_VERSION = 1  # bump when report wording or layout changes
+
+
+def data_versions(conn, report, child_ids, start, end):
+    """{child_id: version} of report for the daily_rollup rows between start and end.
+
+    The child's names are part of the version, so a rename in the
+    registry invalidates the reports that print them.
+    """
+    sql = """
+        WITH names AS (
+            SELECT md5(
+                COALESCE((SELECT string_agg(subject_id || ':' || subject_name, ',' ORDER BY subject_id)
+                          FROM subjects), '') || '|' ||
+                COALESCE((SELECT string_agg(workout_id || ':' || workout_name, ',' ORDER BY workout_id)
+                          FROM workout_types), '')
+            ) as digest
+        )
+        SELECT c.child_id, names.digest,
+               COUNT(r.child_id), COALESCE(SUM(r.minutes), 0), COALESCE(SUM(r.sessions), 0)
+        FROM unnest(%s::int[]) as c(child_id)
+        CROSS JOIN names
+        LEFT JOIN daily_rollup r
+               ON r.child_id = c.child_id
+              AND r.activity_date BETWEEN %s AND %s
+        GROUP BY c.child_id, names.digest;
+    """
+    reg = registry.load(conn)
+    with conn.cursor() as cur:
+        cur.execute(sql, (list(child_ids), start, end))
+        rows = cur.fetchall()
+    return {child_id: (f"{CACHE_VERSION}:{report}:{reg.children.get(child_id, '')}"
+                       f"|{reg.children_kr.get(child_id, '')}:{digest}:{count}:{minutes}:{sessions}")
+            for child_id, digest, count, minutes, sessions in rows}
+
+
+def _path(key):
+    digest = hashlib.sha256(json.dumps(key).encode()).hexdigest()
+    return os.path.join(REPORT_CACHE_DIR, f"{digest}.json")
+
+
+def get(key, version):
+    """Cached value for key if it was stored at this version, else None."""
+    if not REPORT_CACHE_DIR:
+        return None
+    path = _path(key)
+    try:
+        with open(path, encoding="utf-8") as f:
+            entry = json.load(f)
+        if entry.get("key") != list(key) or entry.get("version") != version:
+            return None
+        os.utime(path)  # mark as recently used
+        return entry["value"]
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def put(key, version, value):
+    """Store value for key at this version, then trim the cache to REPORT_CACHE_MAX."""
+    if not REPORT_CACHE_DIR:
+        return
+    tmp = None
+    try:
+        os.makedirs(REPORT_CACHE_DIR, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=REPORT_CACHE_DIR, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"key": list(key), "version": version, "value": value}, f, ensure_ascii=False)
+        os.replace(tmp, _path(key))
+        tmp = None
+        evict(REPORT_CACHE_MAX)
+    except (OSError, TypeError, ValueError):
+        pass
+    finally:
+        if tmp:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+
+
+def evict(max_entries):
+    """Delete the least recently used entries beyond max_entries."""
+    try:
+        entries = []
+        for entry in os.scandir(REPORT_CACHE_DIR):
+            if entry.name.endswith(".json"):
+                entries.append((entry.stat().st_mtime, entry.path))
+    except OSError:
+        return
+    entries.sort()
+    for _, path in entries[:max(0, len(entries) - max_entries)]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def cached_reports(conn, report, child_ids, report_date, window_start, generate):
+    """Return {child_id: value}, calling generate(missing_child_ids) only for misses.
+
+    window_start..report_date is the span of daily_rollup the report reads.
+    generate must return {child_id: value} with JSON-serialisable values,
+    the same for every output format.
+    """
+    versions = data_versions(conn, report, child_ids, window_start, report_date)
+    keys = {child_id: (report, child_id, report_date.isoformat()) for child_id in child_ids}
+    results = {child_id: get(keys[child_id], versions[child_id]) for child_id in child_ids}
+
+    missing = [child_id for child_id in child_ids if results[child_id] is None]
+    if missing:
+        for child_id, value in generate(missing).items():
+            put(keys[child_id], versions[child_id], value)
+            results[child_id] = value
+    return results
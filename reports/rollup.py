@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""daily_rollup maintenance.
+
+daily_rollup holds per-day minutes and session counts keyed by
+(child_id, activity_date, category, subject_id, workout_id). The report
+queries read it instead of re-aggregating activity_logs, and
+notion_sync.insert_activity_log keeps it current inside the same
+transaction as the activity_logs insert.
+
+Run --rebuild once to create and backfill the table, and again whenever
+activity_logs is edited by anything other than notion_sync. A rebuild
+locks both tables until it commits, so syncs wait for it.
+
+Usage:
+    python rollup.py --rebuild                               # rebuild everything
+    python rollup.py --rebuild --child_id 1 --since 2026-01-01
+"""
+
+import argparse
+import json
+import sys
+from datetime import date
+
+from psycopg2.extras import execute_values
+
+from db import get_connection, release_connection
+
+ROLLUP_DDL = """
+    CREATE TABLE IF NOT EXISTS daily_rollup (
+        child_id       integer NOT NULL,
+        activity_date  date    NOT NULL,
+        category       text    NOT NULL,
+        subject_id     integer,
+        workout_id     integer,
+        minutes        bigint  NOT NULL DEFAULT 0,
+        sessions       integer NOT NULL DEFAULT 0
+    );
+    CREATE UNIQUE INDEX IF NOT EXISTS daily_rollup_key
+        ON daily_rollup (child_id, activity_date, category,
+                         COALESCE(subject_id, 0), COALESCE(workout_id, 0));
+    CREATE INDEX IF NOT EXISTS daily_rollup_report
+        ON daily_rollup (child_id, activity_date, category)
+        INCLUDE (subject_id, workout_id, minutes, sessions);
+"""
+
+
+# What daily_rollup holds, computed from activity_logs for the rows matching {where}
+ROLLUP_SOURCE = """
+    SELECT child_id, activity_date, category::text, subject_id, workout_id,
+           SUM(actual_minutes), COUNT(*)
+    FROM activity_logs
+    WHERE {where}
+    GROUP BY child_id, activity_date, category, subject_id, workout_id
+"""
+
+
+def ensure_rollup_table(conn):
+    with conn.cursor() as cur:
+        cur.execute(ROLLUP_DDL)
+
+
+def add_to_rollup(conn, records):
+    """Add newly inserted activity_logs records to daily_rollup.
+
+    Runs on the caller's connection and does not commit, so the rollup
+    moves together with the activity_logs insert.
+    """
+    totals = {}
+    for r in records:
+        key = (r["child_id"], r["activity_date"], r["category"], r["subject_id"], r["workout_id"])
+        minutes, sessions = totals.get(key, (0, 0))
+        totals[key] = (minutes + r["actual_minutes"], sessions + 1)
+    if not totals:
+        return
+
+    sql = """
+        INSERT INTO daily_rollup
+            (child_id, activity_date, category, subject_id, workout_id, minutes, sessions)
+        VALUES %s
+        ON CONFLICT (child_id, activity_date, category,
+                     COALESCE(subject_id, 0), COALESCE(workout_id, 0))
+        DO UPDATE SET minutes = daily_rollup.minutes + EXCLUDED.minutes,
+                      sessions = daily_rollup.sessions + EXCLUDED.sessions
+    """
+    rows = [key + value for key, value in totals.items()]
+    with conn.cursor() as cur:
+        execute_values(cur, sql, rows, page_size=len(rows))
+
+
+def rebuild_rollup(conn, child_id=None, since=None):
+    """Recompute daily_rollup from activity_logs. Returns rows written.
+
+    Locks activity_logs against writes, then daily_rollup against
+    add_to_rollup, until the caller commits, so a sync running at the same
+    time waits instead of having its rows counted twice or lost. The
+    order matches a sync's, which inserts into activity_logs first.
+    """
+    where = ["TRUE"]
+    params = []
+    if child_id is not None:
+        where.append("child_id = %s")
+        params.append(child_id)
+    if since is not None:
+        where.append("activity_date >= %s")
+        params.append(since)
+    where_sql = " AND ".join(where)
+
+    with conn.cursor() as cur:
+        cur.execute("LOCK TABLE activity_logs IN SHARE MODE")
+        cur.execute("LOCK TABLE daily_rollup IN SHARE ROW EXCLUSIVE MODE")
+        cur.execute(f"DELETE FROM daily_rollup WHERE {where_sql}", params)
+        cur.execute("""
+            INSERT INTO daily_rollup
+                (child_id, activity_date, category, subject_id, workout_id, minutes, sessions)
+        """ + ROLLUP_SOURCE.format(where=where_sql), params)
+        return cur.rowcount
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the daily_rollup table")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="Create daily_rollup if needed and backfill it from activity_logs")
+    parser.add_argument("--child_id", type=int, default=None,
+                        help="Only rebuild this child. Default: all.")
+    parser.add_argument("--since", type=str, default=None,
+                        help="Only rebuild dates on or after this date (YYYY-MM-DD).")
+    args = parser.parse_args()
+
+    if not args.rebuild:
+        parser.print_help()
+        sys.exit(1)
+
+    since = date.fromisoformat(args.since) if args.since else None
+
+    try:
+        conn = get_connection()
+    except Exception as e:
+        print(f"Database connection failed: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    try:
+        ensure_rollup_table(conn)
+        conn.commit()  # release the DDL's lock before rebuild_rollup takes its own
+        rows = rebuild_rollup(conn, args.child_id, since)
+        conn.commit()
+    finally:
+        release_connection(conn)
+
+    print(json.dumps({"rollup_rows": rows}))
+
+
+if __name__ == "__main__":
+    main()
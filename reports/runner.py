@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+"""Resident job runner: one warm process for the sync and report jobs.
+
+serve keeps one Python process up that runs sync_subjects, notion_sync,
+daily_report and weekly_report by calling their main(argv) in process.
+Imports, the database pool (db.py), the Notion session and the registry
+cache (registry.py) stay warm between jobs, so a trigger costs only the
+job's own work instead of a container start and a cold interpreter.
+
+Jobs run one at a time; their stdout and stderr are captured and returned
+with the exit code. Triggers:
+
+    POST /run/<job>    body {"args": [...]}; waits for the job and returns
+                       {"job", "args", "exit_code", "output", "errors", "seconds"}
+    GET  /jobs         jobs, schedule and the last result of each job
+
+The server binds 127.0.0.1 by default, so only processes in the same
+container (docker compose exec) can reach it. If RUNNER_TOKEN is set,
+every request must carry it in an X-Runner-Token header; set it before
+binding anything wider with --host.
+
+runner.py run <job> [args...] does the same from the command line against
+a running runner (sending RUNNER_TOKEN), prints the job's output and exits
+with its exit code; runner.py jobs prints GET /jobs. The job modules (and
+numpy, psycopg2) are only imported by serve, so these clients start in
+the time it takes to import requests.
+
+SCHEDULE is a cron-style list evaluated in Australia/Melbourne
+(config.TIMEZONE): minute hour day-of-month month day-of-week, each field
+*, */n, a-b, a-b/n or a comma list; day-of-week 0 (or 7) is Sunday.
+It only runs with serve --schedule, which replaces the nightly n8n sync;
+turn that trigger off first, or the sync runs twice. Scheduled runs go
+through the same queue as triggered ones.
+
+Usage:
+    python runner.py serve [--port 8090] [--schedule]
+    python runner.py run daily-report --format json
+    python runner.py run notion-sync --incremental
+    python runner.py jobs
+"""
+
+import argparse
+import hmac
+import importlib
+import io
+import json
+import os
+import signal
+import sys
+import threading
+import time
+import traceback
+from contextlib import redirect_stderr, redirect_stdout
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from zoneinfo import ZoneInfo
+
+import requests
+
+import notion_client
+from config import TIMEZONE
+
+DEFAULT_PORT = 8090
+RUNNER_URL = os.environ.get("RUNNER_URL", f"http://127.0.0.1:{DEFAULT_PORT}")
+RUNNER_TOKEN = os.environ.get("RUNNER_TOKEN", "")
+
+# job -> module whose main(argv) runs it; imported by load_jobs() in serve only
+JOBS = {
+    "sync-subjects": "sync_subjects",
+    "notion-sync": "notion_sync",
+    "daily-report": "daily_report",
+    "weekly-report": "weekly_report",
+}
+
+# (cron expression, job, args), used with serve --schedule; the reports are
+# triggered by n8n, which sends their output on
+SCHEDULE = [
+    ("45 23 * * *", "sync-subjects", []),
+    ("50 23 * * *", "notion-sync", []),
+]
+
+
+# ---------------------------------------------------------------------------
+# Cron expressions
+# ---------------------------------------------------------------------------
+
+# (low, high) of each cron field
+CRON_FIELDS = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+
+
+def parse_cron_field(field, low, high):
+    """The set of values a single cron field matches."""
+    values = set()
+    for part in field.split(","):
+        part, _, step = part.partition("/")
+        step = int(step) if step else 1
+        if part == "*":
+            start, end = low, high
+        elif "-" in part:
+            start, end = (int(v) for v in part.split("-", 1))
+        else:
+            start = end = int(part)
+            if step > 1:
+                end = high
+        if not (low <= start <= end <= high) or step < 1:
+            raise ValueError(f"cron field {field!r} out of range {low}-{high}")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class CronSchedule:
+    """A parsed five-field cron expression."""
+
+    def __init__(self, expr):
+        fields = expr.split()
+        if len(fields) != 5:
+            raise ValueError(f"cron expression {expr!r} needs 5 fields")
+        self.expr = expr
+        (self.minutes, self.hours, self.days, self.months,
+         weekdays) = (parse_cron_field(f, low, high) for f, (low, high) in zip(fields, CRON_FIELDS))
+        self.weekdays = {d % 7 for d in weekdays}
+        # Like cron: if both day fields are restricted, either may match
+        self.any_day = fields[2] == "*" or fields[4] == "*"
+
+    def matches(self, t):
+        """Whether local datetime t falls on this schedule (to the minute)."""
+        if t.minute not in self.minutes or t.hour not in self.hours or t.month not in self.months:
+            return False
+        day = t.day in self.days
+        weekday = (t.weekday() + 1) % 7 in self.weekdays  # cron: Sunday = 0
+        return day and weekday if self.any_day else day or weekday
+
+
+# ---------------------------------------------------------------------------
+# Jobs
+# ---------------------------------------------------------------------------
+
+def load_jobs():
+    """{job: main} with every job module imported."""
+    return {job: importlib.import_module(module).main for job, module in JOBS.items()}
+
+
+class Runner:
+    """Runs jobs one at a time and remembers the last result of each."""
+
+    def __init__(self, schedule=(), tz=TIMEZONE):
+        self.jobs = load_jobs()
+        self.tz = ZoneInfo(tz)
+        self.schedule = [(CronSchedule(expr), job, list(args)) for expr, job, args in schedule]
+        self.job_lock = threading.Lock()
+        self.last = {}
+        self.stopping = threading.Event()
+
+    def run(self, job, args=()):
+        """Run one job in process and return its result dict."""
+        if job not in self.jobs:
+            raise KeyError(job)
+        args = [str(a) for a in args]
+        with self.job_lock:
+            out, err = io.StringIO(), io.StringIO()
+            notion_client.reset_stats()
+            start = time.perf_counter()
+            exit_code = 0
+            with redirect_stdout(out), redirect_stderr(err):
+                try:
+                    self.jobs[job](args)
+                except SystemExit as e:
+                    if e.code is None:
+                        exit_code = 0
+                    elif isinstance(e.code, int):
+                        exit_code = e.code
+                    else:
+                        print(e.code, file=sys.stderr)
+                        exit_code = 1
+                except Exception:
+                    traceback.print_exc()
+                    exit_code = 1
+            result = {
+                "job": job,
+                "args": args,
+                "exit_code": exit_code,
+                "output": out.getvalue(),
+                "errors": err.getvalue(),
+                "seconds": round(time.perf_counter() - start, 3),
+                "finished_at": datetime.now(self.tz).isoformat(timespec="seconds"),
+            }
+            self.last[job] = result
+        return result
+
+    def due(self, t):
+        return [(job, args) for cron, job, args in self.schedule if cron.matches(t)]
+
+    def scheduler(self):
+        """Check the schedule once a minute until stop(); missed minutes are caught up."""
+        checked = datetime.now(self.tz).replace(second=0, microsecond=0)
+        while not self.stopping.wait(60 - time.time() % 60 + 0.05):
+            now = datetime.now(self.tz).replace(second=0, microsecond=0)
+            while checked < now:
+                checked += timedelta(minutes=1)
+                for job, args in self.due(checked):
+                    threading.Thread(target=self.run_scheduled, args=(job, args)).start()
+
+    def run_scheduled(self, job, args):
+        result = self.run(job, args)
+        print(f"{result['finished_at']} {job} {' '.join(args)} → exit {result['exit_code']} "
+              f"in {result['seconds']}s", file=sys.__stderr__)
+        if result["exit_code"]:
+            print(result["errors"], file=sys.__stderr__)
+
+    def stop(self):
+        self.stopping.set()
+
+    def describe(self):
+        return {
+            "jobs": sorted(JOBS),
+            "timezone": str(self.tz),
+            "schedule": [{"cron": cron.expr, "job": job, "args": args}
+                         for cron, job, args in self.schedule],
+            "last": self.last,
+        }
+
+
+# ---------------------------------------------------------------------------
+# HTTP trigger
+# ---------------------------------------------------------------------------
+
+class RunnerHandler(BaseHTTPRequestHandler):
+    runner = None
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def authorized(self):
+        """Check X-Runner-Token when RUNNER_TOKEN is set; answers 401 if it is wrong."""
+        if not RUNNER_TOKEN:
+            return True
+        token = self.headers.get("X-Runner-Token", "")
+        if hmac.compare_digest(token.encode(), RUNNER_TOKEN.encode()):
+            return True
+        self.send_json(401, {"error": "missing or wrong X-Runner-Token"})
+        return False
+
+    def do_GET(self):
+        if not self.authorized():
+            return
+        if self.path != "/jobs":
+            return self.send_json(404, {"error": "not found"})
+        self.send_json(200, self.runner.describe())
+
+    def do_POST(self):
+        if not self.authorized():
+            return
+        if not self.path.startswith("/run/"):
+            return self.send_json(404, {"error": "not found"})
+        job = self.path[len("/run/"):]
+        if job not in JOBS:
+            return self.send_json(404, {"error": f"unknown job {job!r}", "jobs": sorted(JOBS)})
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}") if length else {}
+        except ValueError:
+            return self.send_json(400, {"error": "invalid JSON"})
+        if not isinstance(body, dict):
+            return self.send_json(400, {"error": "body must be a JSON object"})
+        args = body.get("args", [])
+        if not isinstance(args, list) or not all(isinstance(a, str) for a in args):
+            return self.send_json(400, {"error": "args must be a list of strings"})
+        self.send_json(200, self.runner.run(job, args))
+
+
+def serve(host, port, schedule):
+    runner = Runner(schedule)
+    RunnerHandler.runner = runner
+    server = ThreadingHTTPServer((host, port), RunnerHandler)
+    threading.Thread(target=runner.scheduler, name="scheduler", daemon=True).start()
+
+    def shutdown(*_):
+        threading.Thread(target=server.shutdown).start()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    print(f"Job runner listening on http://{host}:{server.server_port} "
+          f"({len(runner.schedule)} scheduled jobs, {runner.tz})", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        runner.stop()
+        server.server_close()
+        with runner.job_lock:  # let a running job finish
+            pass
+
+
+def auth_headers():
+    return {"X-Runner-Token": RUNNER_TOKEN} if RUNNER_TOKEN else {}
+
+
+def trigger(url, job, args):
+    """Run a job on a resident runner; returns its result dict."""
+    resp = requests.post(f"{url}/run/{job}", json={"args": args}, headers=auth_headers(),
+                         timeout=None)
+    if resp.status_code == 404:
+        raise KeyError(job)
+    resp.raise_for_status()
+    return resp.json()
+
+
+# ---------------------------------------------------------------------------
+# Main
+# ---------------------------------------------------------------------------
+
+def main():
+    parser = argparse.ArgumentParser(description="Resident runner for sync and report jobs",
+                                     allow_abbrev=False)
+    parser.add_argument("command", choices=["serve", "run", "jobs"])
+    parser.add_argument("job", nargs="?", choices=sorted(JOBS), help="run: job to trigger.")
+    parser.add_argument("--host", default="127.0.0.1",
+                        help="serve: address to bind. Default: 127.0.0.1 (set RUNNER_TOKEN "
+                             "before binding a wider address).")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="serve: port to bind.")
+    parser.add_argument("--schedule", action="store_true",
+                        help="serve: also run SCHEDULE (nightly sync-subjects and "
+                             "notion-sync); turn off the n8n sync first.")
+    parser.add_argument("--url", default=RUNNER_URL,
+                        help=f"run: runner to trigger. Default: {RUNNER_URL}.")
+    args, job_args = parser.parse_known_args()
+
+    if args.command == "serve":
+        if job_args:
+            parser.error(f"unrecognized arguments: {' '.join(job_args)}")
+        if args.host not in ("127.0.0.1", "localhost", "::1") and not RUNNER_TOKEN:
+            print(f"Warning: serving on {args.host} without RUNNER_TOKEN; anyone who can "
+                  f"reach the port can run jobs", file=sys.stderr)
+        serve(args.host, args.port, SCHEDULE if args.schedule else [])
+        return
+
+    if args.command == "jobs":
+        try:
+            resp = requests.get(f"{args.url}/jobs", headers=auth_headers(), timeout=10)
+            resp.raise_for_status()
+        except requests.RequestException as e:
+            print(f"Runner request to {args.url} failed: {e}", file=sys.stderr)
+            sys.exit(1)
+        print(json.dumps(resp.json(), indent=2, ensure_ascii=False))
+        return
+
+    if not args.job:
+        parser.error("run needs a job")
+    try:
+        result = trigger(args.url, args.job, job_args)
+    except requests.RequestException as e:
+        print(f"Runner request to {args.url} failed: {e}", file=sys.stderr)
+        sys.exit(1)
+    sys.stdout.write(result["output"])
+    sys.stderr.write(result["errors"])
+    sys.exit(result["exit_code"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+"""Shared report statistics: rolling windows, trends and bars.
+
+Both reports load a dense child x item x day ActivityMatrix from
+daily_rollup with NumPy. Any rolling window (7-day daily average, 4-week
+or 12-week weekly average) is computed for every cell at once, and so
+are the trend classification and bar length against that average
+(trend_codes, bar_fills). The formatters only look the results up and
+draw them with TREND_ARROWS, TREND_COLORS and draw_bar.
+
+Items are (kind, name) pairs: ("cat", "Study"), ("subject", "Chemistry"),
+("workout", "Jogging") and ("total", None) for the whole day.
+"""
+
+from datetime import timedelta
+
+import numpy as np
+
+TREND_THRESHOLD_PCT = 10
+BAR_WIDTH = 10
+
+# Trend codes returned by trend_codes()
+TREND_NONE, TREND_NEW, TREND_UP, TREND_DOWN, TREND_FLAT = range(5)
+TREND_ARROWS = ("", "NEW", "↑", "↓", "→")
+TREND_COLORS = ("#888", "#888", "green", "red", "#888")
+
+# (trend code, bar fill) of an item with no minutes and no average
+NO_TREND = (TREND_NONE, 0)
+
+
+# ---------------------------------------------------------------------------
+# Formatting
+# ---------------------------------------------------------------------------
+
+def format_minutes(minutes):
+    if minutes is None or minutes == 0:
+        return "0m"
+    minutes = int(minutes)
+    hours = minutes // 60
+    mins = minutes % 60
+    if hours > 0 and mins > 0:
+        return f"{hours}h{mins}m"
+    elif hours > 0:
+        return f"{hours}h"
+    else:
+        return f"{mins}m"
+
+
+def draw_bar(fill, width=BAR_WIDTH):
+    """Draw a bar of `fill` cells (see bar_fills) with ║ fixed at the midpoint."""
+    mid = width // 2  # ║ position (5 for width=10)
+    bar = "█" * fill + "·" * (width - fill)
+    return f"[{bar[:mid]}║{bar[mid + 1:]}]"
+
+
+# ---------------------------------------------------------------------------
+# Vectorized helpers
+# ---------------------------------------------------------------------------
+
+def trend_codes(current, avg):
+    """TREND_* code of current against avg, for whole arrays at once.
+
+    More than TREND_THRESHOLD_PCT above the average is up, as far below
+    is down; with no average, any minutes are NEW.
+    """
+    current = np.asarray(current)
+    avg = np.asarray(avg)
+    pct = np.divide((current - avg) * 1.0, avg, out=np.zeros(np.broadcast(current, avg).shape),
+                    where=avg != 0) * 100
+    codes = np.full(pct.shape, TREND_FLAT, dtype=np.int8)
+    codes[pct > TREND_THRESHOLD_PCT] = TREND_UP
+    codes[pct < -TREND_THRESHOLD_PCT] = TREND_DOWN
+    codes[(avg == 0) & (current > 0)] = TREND_NEW
+    codes[(avg == 0) & (current <= 0)] = TREND_NONE
+    return codes
+
+
+def bar_fills(actual, average, width=BAR_WIDTH):
+    """Filled cells of each bar, for whole arrays at once.
+
+    The average always maps to the midpoint. Actual fills proportionally:
+      actual=0      → no fill
+      actual=avg    → fills to ║
+      actual=2*avg  → fills entire bar (capped)
+    With no average, any minutes fill to the midpoint (NEW).
+    """
+    actual = np.asarray(actual)
+    average = np.asarray(average)
+    mid = width // 2
+    ratio = np.divide(actual * 1.0, average, out=np.zeros(np.broadcast(actual, average).shape),
+                      where=average > 0)
+    fill = np.where(average > 0, np.round(ratio * mid), np.where(actual > 0, mid, 0))
+    return np.clip(fill, 0, width).astype(np.int64)
+
+
+def round_half_up(numerator, denominator):
+    """numerator / max(denominator, 1) rounded like Postgres ROUND(numeric, 0)."""
+    denominator = np.maximum(denominator, 1)
+    return (2 * numerator + denominator) // (2 * denominator)
+
+
+# ---------------------------------------------------------------------------
+# Activity matrix
+# ---------------------------------------------------------------------------
+
+class ActivityMatrix:
+    """Dense minutes / sessions / presence arrays shaped (child, item, day).
+
+    present is True where daily_rollup had a row for that cell, even with
+    zero minutes, which is what COUNT(DISTINCT activity_date) counts.
+    """
+
+    def __init__(self, child_ids, items, start, end, academic=None):
+        self.child_ids = list(child_ids)
+        self.items = list(items)
+        self.start = start
+        self.end = end
+        self.academic = academic or {}
+        self.child_index = {c: i for i, c in enumerate(self.child_ids)}
+        self.item_index = {item: i for i, item in enumerate(self.items)}
+        shape = (len(self.child_ids), len(self.items), (end - start).days + 1)
+        self.minutes = np.zeros(shape, dtype=np.int64)
+        self.sessions = np.zeros(shape, dtype=np.int64)
+        self.present = np.zeros(shape, dtype=bool)
+
+    @property
+    def days(self):
+        return self.minutes.shape[2]
+
+    def day_index(self, d):
+        return (d - self.start).days
+
+    def date_at(self, index):
+        return self.start + timedelta(days=int(index))
+
+    # -- windows -----------------------------------------------------------
+
+    def _bounds(self, lo, hi):
+        """Half-open [a, b) day ranges for a window of lo..hi days around every day."""
+        t = np.arange(self.days)
+        a = np.clip(t + lo, 0, self.days)
+        b = np.clip(t + hi + 1, 0, self.days)
+        return a, b
+
+    def window_sum(self, values, lo, hi):
+        """Sum of values over days t+lo .. t+hi for every day t (zero outside the matrix)."""
+        cum = np.concatenate([np.zeros(values.shape[:-1] + (1,), dtype=np.int64),
+                              np.cumsum(values, axis=-1, dtype=np.int64)], axis=-1)
+        a, b = self._bounds(lo, hi)
+        return cum[..., b] - cum[..., a]
+
+    def window_weeks(self, lo, hi):
+        """Distinct Monday-starting weeks with activity in days t+lo .. t+hi.
+
+        Matches COUNT(DISTINCT DATE_TRUNC('week', activity_date)): partial
+        weeks at either edge count if the window covers an active day in them.
+        """
+        offset = self.start.weekday()
+        days = self.days
+        week_of = (np.arange(days) + offset) // 7
+        weeks = week_of[-1] + 1 if days else 0
+
+        present = self.present.astype(np.int64)
+        cum = np.concatenate([np.zeros(present.shape[:-1] + (1,), dtype=np.int64),
+                              np.cumsum(present, axis=-1)], axis=-1)
+        week_start = np.clip(np.arange(weeks) * 7 - offset, 0, days)
+        week_end = np.clip(np.arange(1, weeks + 1) * 7 - offset, 0, days)
+        week_active = (cum[..., week_end] - cum[..., week_start]) > 0
+        cum_weeks = np.concatenate([np.zeros(week_active.shape[:-1] + (1,), dtype=np.int64),
+                                    np.cumsum(week_active, axis=-1)], axis=-1)
+
+        def any_between(a, b):
+            return (cum[..., b] - cum[..., a]) > 0
+
+        a, b = self._bounds(lo, hi)
+        empty = a >= b
+        last = np.clip(b - 1, 0, max(days - 1, 0))
+        first = np.clip(a, 0, max(days - 1, 0))
+        wa, wb = week_of[first], week_of[last]
+
+        same_week = any_between(a, b)
+        head = any_between(a, np.maximum(a, week_end[wa]))
+        tail = any_between(np.minimum(b, week_start[wb]), b)
+        middle = cum_weeks[..., wb] - cum_weeks[..., np.minimum(wa + 1, wb)]
+        count = np.where(wa == wb, same_week, head.astype(np.int64) + tail + middle)
+        return np.where(empty, 0, count)
+
+    def daily_average(self, lo=-7, hi=-1):
+        """Minutes per active day over t+lo .. t+hi (7-day daily average by default)."""
+        return round_half_up(self.window_sum(self.minutes, lo, hi),
+                             self.window_sum(self.present, lo, hi))
+
+    def weekly_average(self, weeks=4):
+        """Minutes per active calendar week over the `weeks` weeks before the one ending t."""
+        lo, hi = -(7 * weeks + 6), -7
+        return round_half_up(self.window_sum(self.minutes, lo, hi), self.window_weeks(lo, hi))
+
+    def item_values(self, array, child_id, day, kind, where=None):
+        """{name: value} of one item kind for one child and day index.
+
+        Items are included where `where` (default: the array itself) is
+        non-zero for that cell.
+        """
+        c = self.child_index[child_id]
+        row = array[c, :, day]
+        mask = row if where is None else where[c, :, day]
+        return {name: int(row[i]) for (k, name), i in self.item_index.items()
+                if k == kind and mask[i]}
+
+    def item_trends(self, codes, fills, child_id, day):
+        """{(kind, name): (trend code, bar fill)} of every item for one child and day."""
+        c = self.child_index[child_id]
+        return {item: (int(codes[c, i, day]), int(fills[c, i, day]))
+                for item, i in self.item_index.items()}
+
+
+def load_matrix(conn, child_ids, start, end):
+    """Read daily_rollup for start..end into an ActivityMatrix.
+
+    Routine is merged into Rest; subjects and workouts are resolved to
+    their names like the report queries.
+    """
+    sql = """
+        WITH logs AS (
+            SELECT r.child_id,
+                   r.activity_date,
+                   CASE WHEN r.category = 'Routine' THEN 'Rest' ELSE r.category::text END as cat,
+                   s.subject_name,
+                   s.is_academic,
+                   w.workout_name,
+                   r.minutes,
+                   r.sessions
+            FROM daily_rollup r
+            LEFT JOIN subjects s
+                   ON r.category = 'Study' AND r.subject_id = s.subject_id
+            LEFT JOIN workout_types w
+                   ON r.category = 'Workout' AND r.workout_id = w.workout_id
+            WHERE r.child_id = ANY(%s)
+              AND r.activity_date BETWEEN %s AND %s
+        )
+        SELECT child_id, activity_date,
+               GROUPING(cat, subject_name, workout_name) as grp,
+               cat, subject_name, is_academic, workout_name,
+               SUM(minutes), SUM(sessions)
+        FROM logs
+        GROUP BY child_id, activity_date, GROUPING SETS (
+            (cat), (subject_name, is_academic), (workout_name), ()
+        );
+    """
+    kinds = {3: "cat", 5: "subject", 6: "workout", 7: "total"}
+    with conn.cursor() as cur:
+        cur.execute(sql, (list(child_ids), start, end))
+        rows = cur.fetchall()
+
+    cells = []
+    academic = {}
+    for child_id, activity_date, grp, cat, subject_name, is_academic, workout_name, minutes, sessions in rows:
+        kind = kinds[grp]
+        name = {"cat": cat, "subject": subject_name, "workout": workout_name, "total": None}[kind]
+        if kind != "total" and name is None:
+            continue  # study/workout rows without a known subject/workout
+        if kind == "subject":
+            academic[name] = is_academic
+        cells.append((child_id, activity_date, (kind, name), int(minutes), int(sessions)))
+
+    items = sorted({cell[2] for cell in cells} | {("total", None)},
+                   key=lambda item: (item[0], item[1] or ""))
+    matrix = ActivityMatrix(child_ids, items, start, end, academic)
+    if cells:
+        c = np.array([matrix.child_index[cell[0]] for cell in cells])
+        i = np.array([matrix.item_index[cell[2]] for cell in cells])
+        d = np.array([(cell[1] - start).days for cell in cells])
+        matrix.minutes[c, i, d] = [cell[3] for cell in cells]
+        matrix.sessions[c, i, d] = [cell[4] for cell in cells]
+        matrix.present[c, i, d] = True
+    return matrix
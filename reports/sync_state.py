@@ -0,0 +1,173 @@
+"""Notion sync progress stored in PostgreSQL.
+
+notion_sync_state keeps one high-water mark per Notion database: the
+latest page last_edited_time seen by a completed incremental sync. The
+next incremental run only asks Notion for pages edited since then.
+
+notion_sync_retry holds pages whose rows were committed but whose
+Synced=true PATCH has not gone through yet (attempts 0 while it is
+pending, more once it has failed); the next sync retries them.
+
+notion_sync_checkpoint holds the progress of a sync that has not
+finished: for each source (a database, or a created_time shard of one)
+of a run, the next_cursor to continue from once the rows before it are
+committed, or done. notion_sync --resume continues from there. Runs that
+are never resumed (a failed nightly date:<day> run, say) are dropped once
+they have not moved for CHECKPOINT_MAX_AGE_DAYS.
+"""
+
+# Unfinished runs untouched for this long are dropped by start_checkpoints
+CHECKPOINT_MAX_AGE_DAYS = 7
+
+STATE_DDL = """
+    CREATE TABLE IF NOT EXISTS notion_sync_state (
+        database_id       text        PRIMARY KEY,
+        last_edited_time  timestamptz NOT NULL,
+        updated_at        timestamptz NOT NULL DEFAULT now()
+    );
+    CREATE TABLE IF NOT EXISTS notion_sync_retry (
+        page_id     text        PRIMARY KEY,
+        attempts    integer     NOT NULL DEFAULT 1,
+        last_error  text,
+        updated_at  timestamptz NOT NULL DEFAULT now()
+    );
+    CREATE TABLE IF NOT EXISTS notion_sync_checkpoint (
+        run_key      text        NOT NULL,
+        source       text        NOT NULL,
+        database_id  text        NOT NULL,
+        first_day    date,
+        end_day      date,
+        next_cursor  text,
+        done         boolean     NOT NULL DEFAULT false,
+        updated_at   timestamptz NOT NULL DEFAULT now(),
+        PRIMARY KEY (run_key, source)
+    );
+"""
+
+
+def ensure_state_table(conn):
+    with conn.cursor() as cur:
+        cur.execute(STATE_DDL)
+
+
+def load_watermarks(conn):
+    """Return {database_id: last_edited_time}, empty if no state exists yet."""
+    with conn.cursor() as cur:
+        cur.execute("SELECT to_regclass('notion_sync_state') IS NOT NULL")
+        if not cur.fetchone()[0]:
+            return {}
+        cur.execute("SELECT database_id, last_edited_time FROM notion_sync_state")
+        return {row[0]: row[1] for row in cur.fetchall()}
+
+
+def save_watermark(conn, database_id, last_edited_time):
+    """Advance a database's watermark. Never moves it backwards. Does not commit."""
+    sql = """
+        INSERT INTO notion_sync_state (database_id, last_edited_time)
+        VALUES (%s, %s)
+        ON CONFLICT (database_id) DO UPDATE
+        SET last_edited_time = GREATEST(notion_sync_state.last_edited_time,
+                                        EXCLUDED.last_edited_time),
+            updated_at = now()
+    """
+    with conn.cursor() as cur:
+        cur.execute(sql, (database_id, last_edited_time))
+
+
+def load_failed_marks(conn):
+    """Page ids still waiting for their Synced PATCH, oldest first."""
+    with conn.cursor() as cur:
+        cur.execute("SELECT to_regclass('notion_sync_retry') IS NOT NULL")
+        if not cur.fetchone()[0]:
+            return []
+        cur.execute("SELECT page_id FROM notion_sync_retry ORDER BY updated_at")
+        return [row[0] for row in cur.fetchall()]
+
+
+def queue_marks(conn, page_ids):
+    """Record committed pages as waiting for their Synced PATCH. Does not commit."""
+    if not page_ids:
+        return
+    sql = """
+        INSERT INTO notion_sync_retry (page_id, attempts)
+        SELECT unnest(%s::text[]), 0
+        ON CONFLICT (page_id) DO NOTHING
+    """
+    with conn.cursor() as cur:
+        cur.execute(sql, (list(page_ids),))
+
+
+def save_failed_marks(conn, failures):
+    """Record {page_id: error} for retry, counting attempts. Does not commit."""
+    sql = """
+        INSERT INTO notion_sync_retry (page_id, last_error)
+        VALUES (%s, %s)
+        ON CONFLICT (page_id) DO UPDATE
+        SET attempts = notion_sync_retry.attempts + 1,
+            last_error = EXCLUDED.last_error,
+            updated_at = now()
+    """
+    with conn.cursor() as cur:
+        cur.executemany(sql, list(failures.items()))
+
+
+def clear_failed_marks(conn, page_ids):
+    """Forget pages whose Synced PATCH went through. Does not commit."""
+    if not page_ids:
+        return
+    with conn.cursor() as cur:
+        cur.execute("DELETE FROM notion_sync_retry WHERE page_id = ANY(%s)", (list(page_ids),))
+
+
+def start_checkpoints(conn, run_key, sources, max_age_days=CHECKPOINT_MAX_AGE_DAYS):
+    """Replace run_key's checkpoints with one unstarted row per source, and
+    drop every other run that has not moved for max_age_days.
+
+    sources: [(source, database_id, first_day, end_day)]. Does not commit.
+    """
+    with conn.cursor() as cur:
+        cur.execute("""
+            DELETE FROM notion_sync_checkpoint
+            WHERE run_key = %s
+               OR run_key IN (SELECT run_key FROM notion_sync_checkpoint
+                              GROUP BY run_key
+                              HAVING MAX(updated_at) < now() - make_interval(days => %s))
+        """, (run_key, max_age_days))
+        cur.executemany("""
+            INSERT INTO notion_sync_checkpoint (run_key, source, database_id, first_day, end_day)
+            VALUES (%s, %s, %s, %s, %s)
+        """, [(run_key, *source) for source in sources])
+
+
+def load_checkpoints(conn, run_key):
+    """[(source, database_id, first_day, end_day, next_cursor, done)] of an
+    unfinished run, in the order they were started; empty if there is none."""
+    with conn.cursor() as cur:
+        cur.execute("SELECT to_regclass('notion_sync_checkpoint') IS NOT NULL")
+        if not cur.fetchone()[0]:
+            return []
+        cur.execute("""
+            SELECT source, database_id, first_day, end_day, next_cursor, done
+            FROM notion_sync_checkpoint
+            WHERE run_key = %s
+            ORDER BY first_day NULLS FIRST, source
+        """, (run_key,))
+        return cur.fetchall()
+
+
+def save_checkpoints(conn, run_key, progress):
+    """Record {source: (next_cursor, done)}. Does not commit."""
+    sql = """
+        UPDATE notion_sync_checkpoint
+        SET next_cursor = %s, done = %s, updated_at = now()
+        WHERE run_key = %s AND source = %s
+    """
+    with conn.cursor() as cur:
+        cur.executemany(sql, [(cursor, done, run_key, source)
+                              for source, (cursor, done) in progress.items()])
+
+
+def clear_checkpoints(conn, run_key):
+    """Forget a run once it has finished. Does not commit."""
+    with conn.cursor() as cur:
+        cur.execute("DELETE FROM notion_sync_checkpoint WHERE run_key = %s", (run_key,))
@@ -1,74 +1,43 @@
 #!/usr/bin/env python3
-"""Sync Notion timer Subject options → subjects.json + PostgreSQL.
+"""Sync Notion timer Subject options → the subjects table.
 
 Reads Subject select options from each kid's Notion timer database,
-compares with subjects.json, inserts any new subjects into PostgreSQL,
-and updates subjects.json.
+compares them with the registry (registry.py) and inserts any new subjects
+into PostgreSQL. The insert bumps registry_version, so running syncs pick
+the new subject up on their next registry load.
 
 Run before notion_sync.py (e.g. 11:45pm, 5 min before the 11:50pm sync).
 
 Usage:
     python sync_subjects.py              # sync subjects
-    python sync_subjects.py --dry-run    # preview without writing
+    python sync_subjects.py --dry-run    # preview without writing (no database needed)
 """
 
 import argparse
 import json
-import os
 import sys
 
-import requests
-import psycopg2
-
-from config import DB_CONFIG, NOTION_DB_IDS, CHILDREN, WORKOUT_IDS
-
-NOTION_API_KEY = os.environ.get("NOTION_API_KEY", "")
-NOTION_VERSION = "2022-06-28"
-NOTION_BASE = "https://api.notion.com/v1"
-SUBJECTS_FILE = os.path.join(os.path.dirname(__file__), "subjects.json")
-
-WORKOUT_NAMES = set()
-for wmap in WORKOUT_IDS.values():
-    WORKOUT_NAMES.update(wmap.keys())
-
-REST_NAMES = {"Rest", "Dinner", "Sleep", "Break"}
-
-
-def notion_headers():
-    return {
-        "Authorization": f"Bearer {NOTION_API_KEY}",
-        "Notion-Version": NOTION_VERSION,
-        "Content-Type": "application/json",
-    }
-
-
-def load_subjects():
-    with open(SUBJECTS_FILE, "r") as f:
-        return json.load(f)
-
-
-def save_subjects(data):
-    with open(SUBJECTS_FILE, "w") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
-        f.write("\n")
+import notion_client
+import registry
+from db import get_connection, release_connection
+from notion_client import NOTION_API_KEY
 
 
 def get_notion_subjects(db_id):
     """Fetch Subject select options from a Notion database."""
-    url = f"{NOTION_BASE}/databases/{db_id}"
-    resp = requests.get(url, headers=notion_headers())
-    resp.raise_for_status()
-    db = resp.json()
+    db = notion_client.get_database(db_id)
     subject_prop = db.get("properties", {}).get("Subject", {})
     options = subject_prop.get("select", {}).get("options", [])
     return [opt["name"] for opt in options]
 
 
 def insert_subject(conn, child_id, subject_name):
-    """Insert a new subject into PostgreSQL and return the subject_id."""
+    """Insert a subject into PostgreSQL and return its subject_id (the existing
+    one if a concurrent run added it first)."""
     sql = """
         INSERT INTO subjects (child_id, subject_name, is_academic)
         VALUES (%s, %s, true)
+        ON CONFLICT (child_id, subject_name) DO UPDATE SET subject_name = EXCLUDED.subject_name
         RETURNING subject_id
     """
     with conn.cursor() as cur:
@@ -76,36 +45,47 @@ def insert_subject(conn, child_id, subject_name):
         return cur.fetchone()[0]
 
 
-def main():
-    parser = argparse.ArgumentParser(description="Sync Notion subjects → subjects.json + DB")
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sync Notion subjects → DB")
     parser.add_argument("--dry-run", action="store_true", help="Preview without writing")
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
     if not NOTION_API_KEY:
         print("Error: NOTION_API_KEY environment variable not set", file=sys.stderr)
         sys.exit(1)
 
-    data = load_subjects()
     new_count = 0
 
+    # A dry run only reads the registry, so it can fall back to config.py
     conn = None
-    if not args.dry_run:
-        conn = psycopg2.connect(**DB_CONFIG)
+    if args.dry_run:
+        reg = registry.load_or_config()
+    else:
+        try:
+            conn = get_connection()
+        except Exception as e:
+            print(f"Database connection failed: {e}", file=sys.stderr)
+            sys.exit(1)
 
     try:
-        for child_id, db_id in NOTION_DB_IDS.items():
-            who = CHILDREN[child_id]
-            cid = str(child_id)
-            notion_subjects = get_notion_subjects(db_id)
-            known_subjects = set(data["subject_ids"].get(cid, {}).keys())
-            known_workouts = set(data["workout_ids"].get(cid, {}).keys())
-            all_known = known_subjects | known_workouts | REST_NAMES
+        if conn is not None:
+            reg = registry.load(conn, max_age=0)
+            conn.rollback()
+        workout_names = set().union(*reg.workout_ids.values())
+        subjects_by_child = notion_client.map_concurrently(get_notion_subjects,
+                                                           reg.notion_db_ids.items())
+
+        for child_id, notion_subjects in subjects_by_child.items():
+            who = reg.children[child_id]
+            rest_names = {alias for alias, target in reg.aliases[child_id].items()
+                          if target == "Rest"}
+            all_known = reg.known_names(child_id) | rest_names
 
             for subj in notion_subjects:
                 if subj in all_known:
                     continue
 
-                if subj in WORKOUT_NAMES:
+                if subj in workout_names:
                     print(f"  SKIP {who} | {subj} (workout, add manually)")
                     continue
 
@@ -114,24 +94,18 @@ def main():
                 else:
                     subject_id = insert_subject(conn, child_id, subj)
                     conn.commit()
-                    if cid not in data["subject_ids"]:
-                        data["subject_ids"][cid] = {}
-                    data["subject_ids"][cid][subj] = subject_id
                     print(f"  ADDED {who} | {subj} → subject_id={subject_id}")
 
                 new_count += 1
 
     finally:
-        if conn:
-            conn.close()
+        if conn is not None:
+            release_connection(conn)
 
-    if new_count > 0 and not args.dry_run:
-        save_subjects(data)
-        print(f"Updated subjects.json with {new_count} new subject(s)")
-    elif new_count == 0:
+    if new_count == 0:
         print("No new subjects found")
 
-    print(json.dumps({"new_subjects": new_count}))
+    print(json.dumps({"new_subjects": new_count, "notion": notion_client.stats()}))
 
 
 if __name__ == "__main__":
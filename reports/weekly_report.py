@@ -7,71 +7,24 @@ Designed to be called by n8n Saturday at 9pm AEST.
 
 Usage:
     python weekly_report.py [--week-ending YYYY-MM-DD] [--child_id N] [--format text|html|json]
+    python weekly_report.py --from YYYY-MM-DD --to YYYY-MM-DD [--child_id N] [--format ...]
+
+--from/--to regenerates every week ending on --from, --from + 7 days, ...
+up to --to from a single read of daily_rollup (see stats.ActivityMatrix);
+--format html then prints one document with a section per week.
 """
 
 import argparse
 import json
 import sys
 from datetime import date, timedelta
-from zoneinfo import ZoneInfo
-
-from config import CHILDREN, CHILDREN_KR, TIMEZONE
-from db import get_connection
-
-
-def trend_indicator(current, avg):
-    if avg == 0:
-        return "NEW" if current > 0 else ""
-    pct = (current - avg) / avg * 100
-    if pct > 10:
-        return "\u2191"
-    elif pct < -10:
-        return "\u2193"
-    else:
-        return "\u2192"
-
-
-def trend_color(current, avg):
-    if avg == 0:
-        return "#888"
-    pct = (current - avg) / avg * 100
-    if pct > 10:
-        return "green"
-    elif pct < -10:
-        return "red"
-    else:
-        return "#888"
-
-
-def format_minutes(minutes):
-    if minutes is None or minutes == 0:
-        return "0m"
-    minutes = int(minutes)
-    hours = minutes // 60
-    mins = minutes % 60
-    if hours > 0 and mins > 0:
-        return f"{hours}h{mins}m"
-    elif hours > 0:
-        return f"{hours}h"
-    else:
-        return f"{mins}m"
 
-
-def make_bar(actual, average, width=10):
-    """Build a visual bar with ║ fixed at the midpoint (position width//2)."""
-    mid = width // 2
-    if average > 0:
-        fill = round((actual / average) * mid)
-    elif actual > 0:
-        fill = mid
-    else:
-        fill = 0
-    fill = max(0, min(fill, width))
-    filled = "█" * fill
-    dots = "·" * (width - fill)
-    bar = filled + dots
-    bar = bar[:mid] + "║" + bar[mid + 1:]
-    return f"[{bar}]"
+import parallel
+import registry
+import report_cache
+from db import get_connection, release_connection
+from stats import (NO_TREND, TREND_ARROWS, TREND_COLORS, bar_fills, draw_bar, format_minutes,
+                   load_matrix, trend_codes)
 
 
 # ---------------------------------------------------------------------------
@@ -84,9 +37,9 @@ def query_week_categories(conn, child_id, week_end):
     sql = """
         SELECT
             CASE WHEN category = 'Routine' THEN 'Rest' ELSE category::text END as cat,
-            SUM(actual_minutes) as total_minutes,
-            COUNT(*) as sessions
-        FROM activity_logs
+            SUM(minutes) as total_minutes,
+            SUM(sessions) as sessions
+        FROM daily_rollup
         WHERE child_id = %s
           AND activity_date BETWEEN %s AND %s
         GROUP BY cat;
@@ -101,14 +54,14 @@ def query_week_subjects(conn, child_id, week_end):
     week_start = week_end - timedelta(days=6)
     sql = """
         SELECT s.subject_name, s.is_academic,
-               SUM(al.actual_minutes) as total_minutes,
-               COUNT(*) as sessions,
-               COUNT(DISTINCT al.activity_date) as days_studied
-        FROM activity_logs al
-        JOIN subjects s ON al.subject_id = s.subject_id
-        WHERE al.child_id = %s
-          AND al.activity_date BETWEEN %s AND %s
-          AND al.category = 'Study'
+               SUM(r.minutes) as total_minutes,
+               SUM(r.sessions) as sessions,
+               COUNT(DISTINCT r.activity_date) as days_studied
+        FROM daily_rollup r
+        JOIN subjects s ON r.subject_id = s.subject_id
+        WHERE r.child_id = %s
+          AND r.activity_date BETWEEN %s AND %s
+          AND r.category = 'Study'
         GROUP BY s.subject_name, s.is_academic
         ORDER BY total_minutes DESC;
     """
@@ -123,13 +76,13 @@ def query_week_workouts(conn, child_id, week_end):
     week_start = week_end - timedelta(days=6)
     sql = """
         SELECT w.workout_name,
-               SUM(al.actual_minutes) as total_minutes,
-               COUNT(*) as sessions
-        FROM activity_logs al
-        JOIN workout_types w ON al.workout_id = w.workout_id
-        WHERE al.child_id = %s
-          AND al.activity_date BETWEEN %s AND %s
-          AND al.category = 'Workout'
+               SUM(r.minutes) as total_minutes,
+               SUM(r.sessions) as sessions
+        FROM daily_rollup r
+        JOIN workout_types w ON r.workout_id = w.workout_id
+        WHERE r.child_id = %s
+          AND r.activity_date BETWEEN %s AND %s
+          AND r.category = 'Workout'
         GROUP BY w.workout_name
         ORDER BY total_minutes DESC;
     """
@@ -144,8 +97,8 @@ def query_daily_breakdown(conn, child_id, week_end):
     sql = """
         SELECT activity_date,
                CASE WHEN category = 'Routine' THEN 'Rest' ELSE category::text END as cat,
-               SUM(actual_minutes) as total_minutes
-        FROM activity_logs
+               SUM(minutes) as total_minutes
+        FROM daily_rollup
         WHERE child_id = %s
           AND activity_date BETWEEN %s AND %s
         GROUP BY activity_date, cat
@@ -167,7 +120,7 @@ def query_days_active(conn, child_id, week_end):
     week_start = week_end - timedelta(days=6)
     sql = """
         SELECT COUNT(DISTINCT activity_date)
-        FROM activity_logs
+        FROM daily_rollup
         WHERE child_id = %s
           AND activity_date BETWEEN %s AND %s;
     """
@@ -183,9 +136,9 @@ def query_4week_avg_categories(conn, child_id, week_end):
     sql = """
         SELECT
             CASE WHEN category = 'Routine' THEN 'Rest' ELSE category::text END as cat,
-            ROUND(SUM(actual_minutes)::numeric /
+            ROUND(SUM(minutes)::numeric /
                   GREATEST(COUNT(DISTINCT DATE_TRUNC('week', activity_date)), 1), 0) as avg_weekly_minutes
-        FROM activity_logs
+        FROM daily_rollup
         WHERE child_id = %s
           AND activity_date BETWEEN %s AND %s
         GROUP BY cat;
@@ -201,13 +154,13 @@ def query_4week_avg_subjects(conn, child_id, week_end):
     avg_start = week_end - timedelta(days=34)
     sql = """
         SELECT s.subject_name,
-               ROUND(SUM(al.actual_minutes)::numeric /
-                     GREATEST(COUNT(DISTINCT DATE_TRUNC('week', al.activity_date)), 1), 0) as avg_weekly_minutes
-        FROM activity_logs al
-        JOIN subjects s ON al.subject_id = s.subject_id
-        WHERE al.child_id = %s
-          AND al.activity_date BETWEEN %s AND %s
-          AND al.category = 'Study'
+               ROUND(SUM(r.minutes)::numeric /
+                     GREATEST(COUNT(DISTINCT DATE_TRUNC('week', r.activity_date)), 1), 0) as avg_weekly_minutes
+        FROM daily_rollup r
+        JOIN subjects s ON r.subject_id = s.subject_id
+        WHERE r.child_id = %s
+          AND r.activity_date BETWEEN %s AND %s
+          AND r.category = 'Study'
         GROUP BY s.subject_name
         ORDER BY avg_weekly_minutes DESC;
     """
@@ -222,13 +175,13 @@ def query_4week_avg_workouts(conn, child_id, week_end):
     avg_start = week_end - timedelta(days=34)
     sql = """
         SELECT w.workout_name,
-               ROUND(SUM(al.actual_minutes)::numeric /
-                     GREATEST(COUNT(DISTINCT DATE_TRUNC('week', al.activity_date)), 1), 0) as avg_weekly_minutes
-        FROM activity_logs al
-        JOIN workout_types w ON al.workout_id = w.workout_id
-        WHERE al.child_id = %s
-          AND al.activity_date BETWEEN %s AND %s
-          AND al.category = 'Workout'
+               ROUND(SUM(r.minutes)::numeric /
+                     GREATEST(COUNT(DISTINCT DATE_TRUNC('week', r.activity_date)), 1), 0) as avg_weekly_minutes
+        FROM daily_rollup r
+        JOIN workout_types w ON r.workout_id = w.workout_id
+        WHERE r.child_id = %s
+          AND r.activity_date BETWEEN %s AND %s
+          AND r.category = 'Workout'
         GROUP BY w.workout_name
         ORDER BY avg_weekly_minutes DESC;
     """
@@ -244,7 +197,7 @@ def query_4week_avg_days_active(conn, child_id, week_end):
     sql = """
         SELECT COUNT(DISTINCT activity_date)::numeric /
                GREATEST(COUNT(DISTINCT DATE_TRUNC('week', activity_date)), 1)
-        FROM activity_logs
+        FROM daily_rollup
         WHERE child_id = %s
           AND activity_date BETWEEN %s AND %s;
     """
@@ -270,13 +223,194 @@ def query_weekly_goals(conn, child_id, week_end):
         return None
 
 
+# Row kinds returned by query_week_figures, from
+# GROUPING(cat, subject_name, workout_name, activity_date).
+_GROUP_DAILY = 6       # (activity_date, cat)
+_GROUP_CATEGORY = 7    # (cat)
+_GROUP_SUBJECT = 11    # (subject_name, is_academic)
+_GROUP_WORKOUT = 13    # (workout_name)
+_GROUP_TOTAL = 15      # ()
+
+
+def query_week_figures(conn, child_ids, week_end):
+    """Every weekly and 4-week figure for several children in one scan.
+
+    Returns {child_id: figures} where figures holds the same values the
+    query_week_* / query_daily_breakdown / query_days_active /
+    query_4week_avg_* functions return, under those names minus the prefix.
+    """
+    week_start = week_end - timedelta(days=6)
+    avg_start = week_end - timedelta(days=34)
+    sql = """
+        WITH logs AS (
+            SELECT r.child_id,
+                   r.activity_date,
+                   CASE WHEN r.activity_date >= %(week_start)s THEN 'week' ELSE 'avg' END as period,
+                   CASE WHEN r.category = 'Routine' THEN 'Rest' ELSE r.category::text END as cat,
+                   s.subject_name,
+                   s.is_academic,
+                   w.workout_name,
+                   r.minutes,
+                   r.sessions
+            FROM daily_rollup r
+            LEFT JOIN subjects s
+                   ON r.category = 'Study' AND r.subject_id = s.subject_id
+            LEFT JOIN workout_types w
+                   ON r.category = 'Workout' AND r.workout_id = w.workout_id
+            WHERE r.child_id = ANY(%(child_ids)s)
+              AND r.activity_date BETWEEN %(avg_start)s AND %(week_end)s
+        )
+        SELECT child_id, period,
+               GROUPING(cat, subject_name, workout_name, activity_date) as grp,
+               cat, subject_name, is_academic, workout_name, activity_date,
+               SUM(minutes) as total_minutes,
+               SUM(sessions) as sessions,
+               COUNT(DISTINCT activity_date) as days,
+               ROUND(SUM(minutes)::numeric /
+                     GREATEST(COUNT(DISTINCT DATE_TRUNC('week', activity_date)), 1), 0) as avg_weekly_minutes,
+               COUNT(DISTINCT activity_date)::numeric /
+                     GREATEST(COUNT(DISTINCT DATE_TRUNC('week', activity_date)), 1) as avg_weekly_days
+        FROM logs
+        GROUP BY child_id, period, GROUPING SETS (
+            (cat),
+            (subject_name, is_academic),
+            (workout_name),
+            (activity_date, cat),
+            ()
+        );
+    """
+    params = {
+        "child_ids": list(child_ids),
+        "week_start": week_start,
+        "avg_start": avg_start,
+        "week_end": week_end,
+    }
+    with conn.cursor() as cur:
+        cur.execute(sql, params)
+        rows = cur.fetchall()
+
+    figures = {
+        child_id: {
+            "week_cats": {}, "week_subjects": [], "week_workouts": [],
+            "daily_breakdown": {}, "days_active": 0,
+            "avg_cats": {}, "avg_subjects": {}, "avg_workouts": {},
+            "avg_days_active": 0,
+        }
+        for child_id in child_ids
+    }
+    for (child_id, period, grp, cat, subject_name, is_academic, workout_name,
+         activity_date, minutes, sessions, days, avg_minutes, avg_days) in rows:
+        f = figures[child_id]
+        if period == "week":
+            if grp == _GROUP_CATEGORY:
+                f["week_cats"][cat] = {"minutes": int(minutes), "sessions": int(sessions)}
+            elif grp == _GROUP_SUBJECT and subject_name is not None:
+                f["week_subjects"].append({"name": subject_name, "academic": is_academic,
+                                           "minutes": int(minutes), "sessions": int(sessions),
+                                           "days": int(days)})
+            elif grp == _GROUP_WORKOUT and workout_name is not None:
+                f["week_workouts"].append({"name": workout_name, "minutes": int(minutes),
+                                           "sessions": int(sessions)})
+            elif grp == _GROUP_DAILY:
+                f["daily_breakdown"].setdefault(activity_date, {})[cat] = int(minutes)
+            elif grp == _GROUP_TOTAL:
+                f["days_active"] = int(days)
+        else:
+            if grp == _GROUP_CATEGORY:
+                f["avg_cats"][cat] = int(avg_minutes)
+            elif grp == _GROUP_SUBJECT and subject_name is not None:
+                f["avg_subjects"][subject_name] = int(avg_minutes)
+            elif grp == _GROUP_WORKOUT and workout_name is not None:
+                f["avg_workouts"][workout_name] = int(avg_minutes)
+            elif grp == _GROUP_TOTAL:
+                f["avg_days_active"] = round(float(avg_days), 1) if avg_days else 0
+
+    # Match the ORDER BY ... DESC of the per-query functions
+    for f in figures.values():
+        f["week_subjects"].sort(key=lambda s: s["minutes"], reverse=True)
+        f["week_workouts"].sort(key=lambda w: w["minutes"], reverse=True)
+        for key in ("avg_subjects", "avg_workouts"):
+            f[key] = dict(sorted(f[key].items(), key=lambda kv: kv[1], reverse=True))
+    return figures
+
+
+# ---------------------------------------------------------------------------
+# Multi-week range
+# ---------------------------------------------------------------------------
+
+def iter_week_figures(conn, child_ids, first_week_end, last_week_end, avg_weeks=4):
+    """Yield (week_end, {child_id: figures}) for each week in the range.
+
+    Loads the whole span (plus the averaging lead-in) into one
+    ActivityMatrix and computes every week's totals and trailing
+    avg_weeks-week averages as rolling windows over it. With the default
+    of 4 the figures match query_week_figures for each week. The trend
+    and bar of every item's week against its average come with them,
+    under "trends".
+    """
+    child_ids = list(child_ids)
+    lo, hi = -(7 * avg_weeks + 6), -7
+    matrix = load_matrix(conn, child_ids, first_week_end + timedelta(days=lo), last_week_end)
+
+    week_minutes = matrix.window_sum(matrix.minutes, -6, 0)
+    week_sessions = matrix.window_sum(matrix.sessions, -6, 0)
+    week_days = matrix.window_sum(matrix.present, -6, 0)
+    avg_minutes = matrix.weekly_average(avg_weeks)
+    avg_days = matrix.window_sum(matrix.present, lo, hi)
+    avg_active_weeks = matrix.window_weeks(lo, hi)
+    codes = trend_codes(week_minutes, avg_minutes)
+    fills = bar_fills(week_minutes, avg_minutes)
+    total = matrix.item_index[("total", None)]
+
+    def by_minutes(values):
+        return dict(sorted(values.items(), key=lambda kv: kv[1], reverse=True))
+
+    week_end = first_week_end
+    while week_end <= last_week_end:
+        t = matrix.day_index(week_end)
+        figures = {}
+        for child_id in child_ids:
+            c = matrix.child_index[child_id]
+            cells = {}
+            for kind in ("cat", "subject", "workout"):
+                cells[kind] = (matrix.item_values(week_minutes, child_id, t, kind, week_days),
+                               matrix.item_values(week_sessions, child_id, t, kind, week_days))
+            days = matrix.item_values(week_days, child_id, t, "subject")
+            weeks = int(avg_active_weeks[c, total, t])
+            figures[child_id] = {
+                "week_cats": {name: {"minutes": m, "sessions": cells["cat"][1][name]}
+                              for name, m in cells["cat"][0].items()},
+                "week_subjects": [{"name": name, "academic": matrix.academic.get(name),
+                                   "minutes": m, "sessions": cells["subject"][1][name],
+                                   "days": days[name]}
+                                  for name, m in by_minutes(cells["subject"][0]).items()],
+                "week_workouts": [{"name": name, "minutes": m, "sessions": cells["workout"][1][name]}
+                                  for name, m in by_minutes(cells["workout"][0]).items()],
+                "daily_breakdown": {
+                    matrix.date_at(d): matrix.item_values(matrix.minutes, child_id, d, "cat",
+                                                          matrix.present)
+                    for d in range(max(t - 6, 0), t + 1) if matrix.present[c, total, d]
+                },
+                "days_active": int(week_days[c, total, t]),
+                "avg_cats": matrix.item_values(avg_minutes, child_id, t, "cat", avg_active_weeks),
+                "avg_subjects": by_minutes(matrix.item_values(avg_minutes, child_id, t, "subject",
+                                                              avg_active_weeks)),
+                "avg_workouts": by_minutes(matrix.item_values(avg_minutes, child_id, t, "workout",
+                                                              avg_active_weeks)),
+                "avg_days_active": round(int(avg_days[c, total, t]) / weeks, 1) if weeks else 0,
+                "trends": matrix.item_trends(codes, fills, child_id, t),
+            }
+        yield week_end, figures
+        week_end += timedelta(days=7)
+
+
 # ---------------------------------------------------------------------------
 # SMS Formatter
 # ---------------------------------------------------------------------------
 
 def format_weekly_sms(name, week_end, week_cats, week_subjects, week_workouts,
                       days_active, avg_cats, avg_subjects, avg_workouts,
-                      avg_days_active):
+                      avg_days_active, trends):
     sep_double = "══════════════════════════════════════"
     sep_single = "──────────────────────────────────────"
     week_start = week_end - timedelta(days=6)
@@ -286,8 +420,9 @@ def format_weekly_sms(name, week_end, week_cats, week_subjects, week_workouts,
     # --- Study section ---
     study = week_cats.get("Study", {}).get("minutes", 0)
     study_avg = avg_cats.get("Study", 0)
-    arrow = trend_indicator(study, study_avg)
-    study_bar = make_bar(study, study_avg)
+    code, fill = trends.get(("cat", "Study"), NO_TREND)
+    arrow = TREND_ARROWS[code]
+    study_bar = draw_bar(fill)
     avg_note = f"4wk avg {format_minutes(study_avg)}" if study_avg > 0 else "NEW"
     lines.append("")
     lines.append(f"\U0001f4da Study  {format_minutes(study)} {study_bar} {arrow} ({avg_note})")
@@ -308,9 +443,10 @@ def format_weekly_sms(name, week_end, week_cats, week_subjects, week_workouts,
             week_val = vals.get("week", 0)
             avg_val = vals.get("avg", 0)
             time_str = format_minutes(week_val) if week_val > 0 else "\u2014"
-            bar = make_bar(week_val, avg_val)
+            code, fill = trends.get(("subject", subj), NO_TREND)
+            bar = draw_bar(fill)
             if avg_val > 0:
-                subj_arrow = trend_indicator(week_val, avg_val)
+                subj_arrow = TREND_ARROWS[code]
                 avg_str = f"{subj_arrow} avg {format_minutes(avg_val)}"
             else:
                 avg_str = "NEW"
@@ -319,8 +455,9 @@ def format_weekly_sms(name, week_end, week_cats, week_subjects, week_workouts,
     # --- Workout section ---
     workout = week_cats.get("Workout", {}).get("minutes", 0)
     workout_avg = avg_cats.get("Workout", 0)
-    arrow = trend_indicator(workout, workout_avg)
-    workout_bar = make_bar(workout, workout_avg)
+    code, fill = trends.get(("cat", "Workout"), NO_TREND)
+    arrow = TREND_ARROWS[code]
+    workout_bar = draw_bar(fill)
     avg_note = f"4wk avg {format_minutes(workout_avg)}" if workout_avg > 0 else "NEW"
     lines.append("")
     lines.append(f"\U0001f3c3 Workout  {format_minutes(workout)} {workout_bar} {arrow} ({avg_note})")
@@ -343,9 +480,10 @@ def format_weekly_sms(name, week_end, week_cats, week_subjects, week_workouts,
             sessions = vals.get("sessions", 0)
             time_str = format_minutes(week_val) if week_val > 0 else "\u2014"
             sess_str = f"{sessions}x" if sessions > 0 else ""
-            bar = make_bar(week_val, avg_val)
+            code, fill = trends.get(("workout", wname), NO_TREND)
+            bar = draw_bar(fill)
             if avg_val > 0:
-                w_arrow = trend_indicator(week_val, avg_val)
+                w_arrow = TREND_ARROWS[code]
                 avg_str = f"{w_arrow} avg {format_minutes(avg_val)}"
             else:
                 avg_str = "NEW"
@@ -360,7 +498,7 @@ def format_weekly_sms(name, week_end, week_cats, week_subjects, week_workouts,
     if rest == 0 and rest_avg == 0:
         lines.append("\U0001f634 Rest  not logged")
     else:
-        arrow = trend_indicator(rest, rest_avg)
+        arrow = TREND_ARROWS[trends.get(("cat", "Rest"), NO_TREND)[0]]
         lines.append(f"\U0001f634 Rest  {format_minutes(rest)} {arrow}  (4wk avg {format_minutes(rest_avg)})")
 
     # --- Days active ---
@@ -375,9 +513,9 @@ def format_weekly_sms(name, week_end, week_cats, week_subjects, week_workouts,
 # ---------------------------------------------------------------------------
 
 def format_weekly_html(name, child_id, week_end, week_cats, week_subjects,
-                       week_workouts, daily_breakdown, avg_cats, avg_subjects):
+                       week_workouts, daily_breakdown, avg_cats, avg_subjects, trends,
+                       kr_name=""):
     week_start = week_end - timedelta(days=6)
-    kr_name = CHILDREN_KR.get(child_id, "")
 
     study = week_cats.get("Study", {}).get("minutes", 0)
     study_avg = avg_cats.get("Study", 0)
@@ -386,11 +524,11 @@ def format_weekly_html(name, child_id, week_end, week_cats, week_subjects,
     rest = week_cats.get("Rest", {}).get("minutes", 0)
     rest_avg = avg_cats.get("Rest", 0)
 
-    def trend_html(current, avg):
-        arrow = trend_indicator(current, avg)
-        color = trend_color(current, avg)
+    def trend_html(category, current, avg):
+        code = trends.get(("cat", category), NO_TREND)[0]
         if avg > 0:
-            return f'<div style="color: {color}; font-size: 14px;">{arrow} vs {format_minutes(avg)} avg</div>'
+            return (f'<div style="color: {TREND_COLORS[code]}; font-size: 14px;">'
+                    f'{TREND_ARROWS[code]} vs {format_minutes(avg)} avg</div>')
         elif current > 0:
             return '<div style="color: #888; font-size: 14px;">NEW</div>'
         return '<div style="font-size: 14px;">-</div>'
@@ -399,8 +537,9 @@ def format_weekly_html(name, child_id, week_end, week_cats, week_subjects,
     study_rows = ""
     for s in week_subjects:
         avg = avg_subjects.get(s["name"], 0)
-        arrow = trend_indicator(s["minutes"], avg)
-        color = trend_color(s["minutes"], avg)
+        code = trends.get(("subject", s["name"]), NO_TREND)[0]
+        arrow = TREND_ARROWS[code]
+        color = TREND_COLORS[code]
         study_rows += f"""    <tr>
       <td style="padding: 4px 8px;">{s['name']}</td>
       <td style="text-align: right; padding: 4px 8px;">{format_minutes(s['minutes'])}</td>
@@ -437,17 +576,17 @@ def format_weekly_html(name, child_id, week_end, week_cats, week_subjects,
       <td style="text-align: center; padding: 8px; background: #E3F2FD; border-radius: 4px;">
         <div style="font-size: 24px; font-weight: bold;">{format_minutes(study)}</div>
         <div style="font-size: 12px; color: #666;">Study</div>
-        {trend_html(study, study_avg)}
+        {trend_html("Study", study, study_avg)}
       </td>
       <td style="text-align: center; padding: 8px; background: #E8F5E9; border-radius: 4px;">
         <div style="font-size: 24px; font-weight: bold;">{format_minutes(workout)}</div>
         <div style="font-size: 12px; color: #666;">Workout</div>
-        {trend_html(workout, workout_avg)}
+        {trend_html("Workout", workout, workout_avg)}
       </td>
       <td style="text-align: center; padding: 8px; background: #FFF3E0; border-radius: 4px;">
         <div style="font-size: 24px; font-weight: bold;">{format_minutes(rest)}</div>
         <div style="font-size: 12px; color: #666;">Rest</div>
-        {trend_html(rest, rest_avg)}
+        {trend_html("Rest", rest, rest_avg)}
       </td>
     </tr>
   </table>
@@ -487,40 +626,112 @@ def format_weekly_html(name, child_id, week_end, week_cats, week_subjects,
 # Main
 # ---------------------------------------------------------------------------
 
-def generate_child_report(conn, child_id, name, week_end):
-    week_cats = query_week_categories(conn, child_id, week_end)
-    week_subjects = query_week_subjects(conn, child_id, week_end)
-    week_workouts = query_week_workouts(conn, child_id, week_end)
-    daily_breakdown = query_daily_breakdown(conn, child_id, week_end)
-    days_active = query_days_active(conn, child_id, week_end)
-    avg_cats = query_4week_avg_categories(conn, child_id, week_end)
-    avg_subjects = query_4week_avg_subjects(conn, child_id, week_end)
-    avg_workouts = query_4week_avg_workouts(conn, child_id, week_end)
-    avg_days_active = query_4week_avg_days_active(conn, child_id, week_end)
+def generate_child_report(conn, child_id, name, week_end, figures=None, name_kr=""):
+    if figures is None:
+        _, by_child = next(iter_week_figures(conn, [child_id], week_end, week_end))
+        figures = by_child[child_id]
+    week_cats = figures["week_cats"]
+    week_subjects = figures["week_subjects"]
+    week_workouts = figures["week_workouts"]
+    daily_breakdown = figures["daily_breakdown"]
+    days_active = figures["days_active"]
+    avg_cats = figures["avg_cats"]
+    avg_subjects = figures["avg_subjects"]
+    avg_workouts = figures["avg_workouts"]
+    avg_days_active = figures["avg_days_active"]
+    trends = figures["trends"]
 
     sms = format_weekly_sms(name, week_end, week_cats, week_subjects,
                             week_workouts, days_active, avg_cats, avg_subjects,
-                            avg_workouts, avg_days_active)
+                            avg_workouts, avg_days_active, trends)
     html = format_weekly_html(name, child_id, week_end, week_cats, week_subjects,
-                              week_workouts, daily_breakdown, avg_cats, avg_subjects)
+                              week_workouts, daily_breakdown, avg_cats, avg_subjects,
+                              trends, name_kr)
 
     return {"sms": sms, "html": html}
 
 
-def main():
+# Which parts of generate_child_report's result each output format uses
+FORMAT_PARTS = {"text": ("sms",), "html": ("html",), "json": ("sms", "html")}
+
+
+def week_reports(conn, child_ids, names, names_kr, week_end):
+    """{child_id: {"sms", "html"}} for one week (a parallel task)."""
+    _, figures = next(iter_week_figures(conn, child_ids, week_end, week_end))
+    return {child_id: generate_child_report(conn, child_id, names[child_id], week_end,
+                                            figures[child_id], names_kr.get(child_id, ""))
+            for child_id in child_ids}
+
+
+def range_reports(conn, child_ids, names, names_kr, first_week_end, last_week_end):
+    """{child_id: [report per week]} for a --from/--to range (a parallel task)."""
+    reports = {child_id: [] for child_id in child_ids}
+    for week_end, figures in iter_week_figures(conn, child_ids, first_week_end, last_week_end):
+        for child_id in child_ids:
+            reports[child_id].append(generate_child_report(conn, child_id, names[child_id],
+                                                           week_end, figures[child_id],
+                                                           names_kr.get(child_id, "")))
+    return reports
+
+
+def html_section(results, week_end):
+    """One week's heading and child cards, for html_document."""
+    week_start = week_end - timedelta(days=6)
+    header = f"<h2 style=\"color: #333;\">Weekly Report: {week_start.strftime('%b %d')} - {week_end.strftime('%b %d')}</h2>"
+    body = "\n".join(r["html"] for r in results.values())
+    return f"{header}\n{body}"
+
+
+def html_document(sections):
+    """Wrap the html_section of one or more weeks in a single email document."""
+    content = "\n".join(sections)
+    return f'<html>\n<body style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto;">\n{content}\n</body>\n</html>'
+
+
+def render(results, week_end, fmt):
+    """Render {name: {"sms", "html"}} for one week in the requested format."""
+    if fmt == "json":
+        return json.dumps(results, ensure_ascii=False)
+    elif fmt == "html":
+        return html_document([html_section(results, week_end)])
+    else:
+        return "\n\n".join(r["sms"] for r in results.values())
+
+
+def main(argv=None):
     parser = argparse.ArgumentParser(description="Generate weekly activity report")
     parser.add_argument("--week-ending", type=str, default=None,
                         help="Week ending date, should be Saturday (YYYY-MM-DD). Defaults to today.")
+    parser.add_argument("--from", dest="range_from", type=str, default=None,
+                        help="First week ending date of a backfill range (YYYY-MM-DD). Needs --to.")
+    parser.add_argument("--to", dest="range_to", type=str, default=None,
+                        help="Last week ending date of a backfill range (YYYY-MM-DD). "
+                             "Weeks step by 7 days from --from.")
     parser.add_argument("--child_id", type=int, default=None,
                         help="Generate for specific child (1=Yewoo, 2=Yeseo). Default: both.")
     parser.add_argument("--format", dest="fmt", choices=["text", "html", "json"], default="text",
                         help="Output format. Default: text.")
-    args = parser.parse_args()
-
-    if args.week_ending:
-        week_end = date.fromisoformat(args.week_ending)
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Recompute even if a cached report is still current.")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Processes to spread children across, each with its own "
+                             "connection. Default: 1 (in this process).")
+    args = parser.parse_args(argv)
+
+    if bool(args.range_from) != bool(args.range_to):
+        parser.error("--from and --to must be given together")
+    if args.range_from and args.week_ending:
+        parser.error("--week-ending cannot be combined with --from/--to")
+
+    if args.range_from:
+        first_week_end = date.fromisoformat(args.range_from)
+        last_week_end = date.fromisoformat(args.range_to)
+        if last_week_end < first_week_end:
+            parser.error("--to is before --from")
+    elif args.week_ending:
+        first_week_end = last_week_end = date.fromisoformat(args.week_ending)
     else:
-        week_end = date.today()
+        first_week_end = last_week_end = date.today()
 
     try:
         conn = get_connection()
@@ -528,25 +739,62 @@ def main():
         print(f"Database connection failed: {e}", file=sys.stderr)
         sys.exit(1)
 
-    results = {}
+    weeks = []
+    failed = {}
     try:
-        for child_id, name in CHILDREN.items():
-            if args.child_id and args.child_id != child_id:
-                continue
-            results[name.lower()] = generate_child_report(conn, child_id, name, week_end)
+        reg = registry.load(conn)
+        children = {child_id: name for child_id, name in reg.children.items()
+                    if not args.child_id or args.child_id == child_id}
+        if not children:
+            reason = (f"child_id {args.child_id} is not in the registry" if args.child_id
+                      else "the registry has no active children")
+            print(f"No children selected: {reason}", file=sys.stderr)
+            sys.exit(1)
+
+        if args.range_from:
+            reports, failed = parallel.run_for_children(
+                range_reports, list(children),
+                (children, reg.children_kr, first_week_end, last_week_end),
+                args.workers, conn)
+            week_ends = [first_week_end + timedelta(days=7 * i)
+                         for i in range((last_week_end - first_week_end).days // 7 + 1)]
+            for i, week_end in enumerate(week_ends):
+                weeks.append((week_end, {children[child_id].lower(): weekly[i]
+                                         for child_id, weekly in reports.items()}))
+        else:
+            week_end = first_week_end
+
+            def generate(child_ids):
+                reports, errors = parallel.run_for_children(
+                    week_reports, child_ids, (children, reg.children_kr, week_end), args.workers,
+                    conn)
+                failed.update(errors)
+                return reports
+
+            if args.no_cache:
+                reports = generate(list(children))
+            else:
+                reports = report_cache.cached_reports(conn, "weekly", list(children), week_end,
+                                                      week_end - timedelta(days=34), generate)
+            weeks.append((week_end, {name.lower(): {part: reports[child_id][part]
+                                                    for part in FORMAT_PARTS[args.fmt]}
+                                     for child_id, name in children.items()
+                                     if reports.get(child_id) is not None}))
     finally:
-        conn.close()
+        release_connection(conn)
 
-    week_start = week_end - timedelta(days=6)
+    parallel.print_errors(failed, children)
+    if len(failed) == len(children):
+        sys.exit(1)
 
-    if args.fmt == "json":
-        print(json.dumps(results, ensure_ascii=False))
+    if args.range_from and args.fmt == "json":
+        print(json.dumps({week_end.isoformat(): results for week_end, results in weeks},
+                         ensure_ascii=False))
     elif args.fmt == "html":
-        header = f"<h2 style=\"color: #333;\">Weekly Report: {week_start.strftime('%b %d')} - {week_end.strftime('%b %d')}</h2>"
-        body = "\n".join(r["html"] for r in results.values())
-        print(f'<html>\n<body style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto;">\n{header}\n{body}\n</body>\n</html>')
+        # One document with a section per week, not one document per week
+        print(html_document([html_section(results, week_end) for week_end, results in weeks]))
     else:
-        print("\n\n".join(r["sms"] for r in results.values()))
+        print("\n\n".join(render(results, week_end, args.fmt) for week_end, results in weeks))
 
 
 if __name__ == "__main__":